@@ -0,0 +1,151 @@
+import sys
+
+class InputInfo:
+    """A single analyzed input. Treated as immutable so analyses can share it."""
+    __slots__ = ('amount', 'script_type', 'address', 'address_type', 'estimated_input_vbytes', 'weight', 'weight_source')
+
+    def __init__(self, amount, script_type, address, address_type, estimated_input_vbytes, weight=None, weight_source=None):
+        self.amount = amount
+        self.script_type = sys.intern(script_type)
+        self.address = address
+        self.address_type = sys.intern(address_type)
+        self.estimated_input_vbytes = estimated_input_vbytes
+        self.weight = weight
+        self.weight_source = weight_source
+
+    def to_dict(self) -> dict:
+        data = {
+            "amount": self.amount,
+            "script_type": self.script_type,
+            "address": self.address,
+            "address_type": self.address_type,
+            "estimated_input_vbytes": self.estimated_input_vbytes,
+        }
+        if self.weight is not None:
+            data["weight"] = self.weight
+            data["weight_source"] = self.weight_source
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['amount'], data['script_type'], data['address'], data['address_type'], data['estimated_input_vbytes'], data.get('weight'), data.get('weight_source'))
+
+class OutputInfo:
+    """A single analyzed output. Treated as immutable so analyses can share it."""
+    __slots__ = ('amount', 'script_type', 'address', 'address_type', 'estimated_output_vb', 'reason')
+
+    def __init__(self, amount, script_type, address, address_type, estimated_output_vb, reason=None):
+        self.amount = amount
+        self.script_type = sys.intern(script_type)
+        self.address = address
+        self.address_type = sys.intern(address_type)
+        self.estimated_output_vb = estimated_output_vb
+        self.reason = reason
+
+    def replace(self, **changes):
+        """Returns a copy of the output with some fields changed."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return OutputInfo(**fields)
+
+    def to_dict(self) -> dict:
+        data = {
+            "amount": self.amount,
+            "script_type": self.script_type,
+            "address": self.address,
+            "address_type": self.address_type,
+            "estimated_output_vb": self.estimated_output_vb,
+        }
+        if self.reason is not None:
+            data["reason"] = self.reason
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['amount'], data['script_type'], data['address'], data['address_type'], data['estimated_output_vb'], data.get('reason'))
+
+class Analysis:
+    """
+    Compact representation of a PSBT analysis. Inputs and outputs are tuples of
+    immutable records, so copy() is O(1) in their number and edits only
+    replace what they touch. to_dict() produces the same structure
+    parse_psbt_input has always returned.
+    """
+    __slots__ = ('version', 'inputs', 'outputs', 'inferred_fee', 'inferred_fee_rate', 'vsize', 'change_index',
+                 'fee_suggestion', 'total_input_value', 'total_output_value', 'script_summary', 'confirmation', 'change_candidates')
+
+    def __init__(self, version, inputs, outputs, inferred_fee=0, inferred_fee_rate=0, vsize=None, change_index=-1,
+                 fee_suggestion="", total_input_value=0, total_output_value=0, script_summary="", confirmation=None, change_candidates=None):
+        self.version = version
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.inferred_fee = inferred_fee
+        self.inferred_fee_rate = inferred_fee_rate
+        self.vsize = vsize
+        self.change_index = change_index
+        self.fee_suggestion = fee_suggestion
+        self.total_input_value = total_input_value
+        self.total_output_value = total_output_value
+        self.script_summary = script_summary
+        self.confirmation = confirmation
+        self.change_candidates = change_candidates
+
+    @property
+    def change_output(self):
+        return self.outputs[self.change_index] if self.change_index != -1 else None
+
+    def copy(self):
+        """Shallow copy that shares the input and output records with the original."""
+        clone = Analysis.__new__(Analysis)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def to_dict(self) -> dict:
+        outputs = [out.to_dict() for out in self.outputs]
+        data = {
+            "version": self.version,
+            "inputs": [inp.to_dict() for inp in self.inputs],
+            "outputs": outputs,
+            "inferred_fee": self.inferred_fee,
+            "inferred_fee_rate": self.inferred_fee_rate,
+        }
+        if self.vsize is not None:
+            data["vsize"] = self.vsize
+        # The change output is the same dict as its entry in outputs, as it has always been
+        data["change_output"] = outputs[self.change_index] if self.change_index != -1 else {}
+        data["fee_reasonableness"] = {"suggestion": self.fee_suggestion}
+        if self.confirmation is not None:
+            # Only present when a mempool snapshot was loaded
+            data["fee_reasonableness"].update(self.confirmation)
+        data["total_input_value"] = self.total_input_value
+        data["total_output_value"] = self.total_output_value
+        data["script_summary"] = self.script_summary
+        if self.change_candidates is not None:
+            # Every output's change score, see change_heuristics
+            data["change_candidates"] = self.change_candidates
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        outputs = data['outputs']
+        change_index = -1
+        if data.get('change_output'):
+            change_index = next((i for i, out in enumerate(outputs) if out is data['change_output']), -1)
+            if change_index == -1:
+                change_index = next((i for i, out in enumerate(outputs) if out == data['change_output']), -1)
+        return cls(
+            data['version'],
+            [InputInfo.from_dict(inp) for inp in data['inputs']],
+            [OutputInfo.from_dict(out) for out in outputs],
+            data['inferred_fee'],
+            data['inferred_fee_rate'],
+            data.get('vsize'),
+            change_index,
+            data['fee_reasonableness']['suggestion'],
+            data['total_input_value'],
+            data['total_output_value'],
+            data['script_summary'],
+            {key: data['fee_reasonableness'][key] for key in ('expected_blocks', 'mempool_percentile')} if 'expected_blocks' in data['fee_reasonableness'] else None,
+            data.get('change_candidates'),
+        )
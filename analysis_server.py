@@ -0,0 +1,307 @@
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import bitcointx
+import analysis_model
+import edit_session
+import fee_service
+import instrumentation
+import psbt_analyzer
+
+# Number of recent latencies kept per route for the percentiles in /metrics
+LATENCY_WINDOW = 1024
+
+# Largest request body accepted, PSBTs are small so anything bigger is a mistake
+MAX_BODY_SIZE = 4 * 1024 * 1024
+
+EDIT_OPERATIONS = {
+    'add_input': ('amount', 'script_type'),
+    'remove_input': ('index',),
+    'add_output': ('amount', 'script_type'),
+    'remove_output': ('index',),
+    'set_output_amount': ('index', 'amount'),
+    'undo': (),
+    'redo': (),
+}
+
+class RequestError(Exception):
+    """A client error, reported back with a 400 status."""
+
+class LatencyMetrics:
+    """Thread-safe per-route request counters and a sliding window of latencies."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.routes = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, route, elapsed, failed):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {"count": 0, "errors": 0, "total": 0.0, "max": 0.0, "recent": deque(maxlen=self.window)}
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            stats["recent"].append(elapsed)
+
+    def snapshot(self):
+        """Returns the metrics with latencies in milliseconds."""
+        with self.lock:
+            routes = {}
+            for route, stats in self.routes.items():
+                recent = sorted(stats["recent"])
+                routes[route] = {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "mean_ms": stats["total"] / stats["count"] * 1000,
+                    "p50_ms": percentile(recent, 0.50) * 1000,
+                    "p95_ms": percentile(recent, 0.95) * 1000,
+                    "p99_ms": percentile(recent, 0.99) * 1000,
+                    "max_ms": stats["max"] * 1000,
+                }
+            return {"uptime": time.time() - self.started_at, "routes": routes}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def require(body, key):
+    if key not in body:
+        raise RequestError(f"Missing field: {key}")
+    return body[key]
+
+def is_int(value):
+    # bool is an int subclass, but true isn't a valid amount or index
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def is_rate(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+def check_seed(body):
+    seed = body.get("seed")
+    if seed is not None and not is_int(seed):
+        raise RequestError("seed must be an integer")
+    return seed
+
+def analysis_from_body(body, fee_rates):
+    """Accepts either a base64 "psbt" or a previously returned "analysis"."""
+    if "analysis" in body:
+        try:
+            return analysis_model.Analysis.from_dict(body["analysis"])
+        except (KeyError, TypeError) as e:
+            raise RequestError(f"Invalid analysis: {e}")
+    psbt_base64 = require(body, "psbt")
+    try:
+        return psbt_analyzer.parse_psbt_analysis(psbt_base64, raise_errors=True, fee_rates=fee_rates)
+    except Exception as e:
+        raise RequestError(f"Invalid PSBT: {e}")
+
+def handle_analyze(body, fee_rates):
+    analysis = analysis_from_body(body, fee_rates)
+    return {"analysis": analysis.to_dict()}
+
+def handle_simulate(body, fee_rates):
+    """Runs every strategy at "fee_rate", or the vectorized sweep when a list of "fee_rates" is given."""
+    parsed_data = analysis_from_body(body, fee_rates).to_dict()
+    seed = check_seed(body)
+    if "fee_rates" in body:
+        rates = body["fee_rates"]
+        if not isinstance(rates, list) or not rates or not all(is_rate(rate) for rate in rates):
+            raise RequestError("fee_rates must be a non-empty list of positive fee rates")
+        import coin_simulator  # numpy is only needed for fee rate sweeps
+        sweep = psbt_analyzer.simulate_coin_selection_sweep(parsed_data, rates, seed=seed)
+        return {"sweep": coin_simulator.table_rows(sweep)}
+    fee_rate = body.get("fee_rate")
+    if fee_rate is None:
+        fee_rate = parsed_data['inferred_fee_rate'] if parsed_data['inferred_fee_rate'] > 0 else fee_rates['fastestFee']
+    elif not is_rate(fee_rate):
+        raise RequestError("fee_rate must be a positive number")
+    return {"fee_rate": fee_rate, "results": psbt_analyzer.simulate_coin_selection(parsed_data, fee_rate, seed=seed)}
+
+def handle_edit(body, fee_rates):
+    """Applies a list of edit operations, e.g. [{"op": "add_input", "amount": 1000, "script_type": "witness_v0_keyhash"}]."""
+    session = edit_session.EditSession(analysis_from_body(body, fee_rates), fee_rates)
+    operations = body.get("operations", [])
+    if not isinstance(operations, list):
+        raise RequestError("operations must be a list")
+    for operation in operations:
+        op = operation.get("op") if isinstance(operation, dict) else None
+        if op not in EDIT_OPERATIONS:
+            raise RequestError(f"Unknown edit operation: {op}")
+        args = [require(operation, name) for name in EDIT_OPERATIONS[op]]
+        # Checked before the session is touched, a failing operation would leave its totals half-updated
+        for name, value in zip(EDIT_OPERATIONS[op], args):
+            if name in ('amount', 'index') and not is_int(value):
+                raise RequestError(f"{name} must be an integer")
+            if name == 'amount' and value < 0:
+                raise RequestError("amount must not be negative")
+            if name == 'script_type' and value not in psbt_analyzer.script_types:
+                raise RequestError(f"Unknown script type: {value}")
+        try:
+            getattr(session, op)(*args)
+        except IndexError as e:
+            raise RequestError(str(e))
+    analysis = session.finalize()
+    return {"analysis": analysis.to_dict(), "warning": session.warning}
+
+def handle_bump(body, fee_rates):
+    """Plans RBF and CPFP fee bumps for a list of "target_rates", with optional "utxos", "ancestors" and "descendants"."""
+    import fee_bump
+    analysis = analysis_from_body(body, fee_rates)
+    target_rates = require(body, "target_rates")
+    if not isinstance(target_rates, list) or not all(is_rate(rate) for rate in target_rates):
+        raise RequestError("target_rates must be a list of positive fee rates")
+    try:
+        plans = fee_bump.plan_fee_bumps(analysis, target_rates, body.get("utxos", ()), body.get("ancestors", ()), body.get("descendants", ()), body.get("cpfp_output"))
+    except (KeyError, TypeError) as e:
+        raise RequestError(f"Invalid fee bump context: {e}")
+    return {"bumps": plans}
+
+POST_ROUTES = {
+    '/analyze': handle_analyze,
+    '/simulate': handle_simulate,
+    '/edit': handle_edit,
+    '/bump': handle_bump,
+}
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """JSON API over the analyzer. The server object carries the shared metrics."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # bitcointx keeps the chain params per thread, so each request thread has to select them again
+        bitcointx.select_chain_params(self.server.chain_params)
+        super().setup()
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path == '/health':
+            self.send_json(200, {"status": "ok"})
+        elif url.path == '/metrics':
+            metrics_format = parse_qs(url.query).get("format", [None])[0]
+            if metrics_format is None and 'application/openmetrics-text' in self.headers.get('Accept', ''):
+                metrics_format = 'openmetrics'
+            if metrics_format in ('prometheus', 'openmetrics'):
+                openmetrics = metrics_format == 'openmetrics'
+                content_type = instrumentation.OPENMETRICS_CONTENT_TYPE if openmetrics else instrumentation.PROMETHEUS_CONTENT_TYPE
+                self.send_body(200, instrumentation.default_registry.render(openmetrics).encode(), content_type)
+            else:
+                metrics = self.server.metrics.snapshot()
+                metrics["script_cache"] = psbt_analyzer.script_info_cache.stats()
+                metrics["fees"] = self.server.fee_rates or fee_service.get_recommended_fees()
+                self.send_json(200, metrics)
+        else:
+            self.send_json(404, {"error": "Not found"})
+        self.server.metrics.record(f"GET {url.path}" if url.path in ('/health', '/metrics') else "GET other", time.perf_counter() - start, False)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        route = POST_ROUTES.get(self.path)
+        failed = True
+        try:
+            if route is None:
+                self.send_json(404, {"error": "Not found"})
+                return
+            body = self.read_json()
+            # Every request is traced into the /metrics totals, the breakdown is only returned when asked for
+            with instrumentation.tracing() as trace:
+                # Every request shares the provider's cached fees instead of fetching its own
+                with instrumentation.stage("fee_fetch"):
+                    fee_rates = self.server.fee_rates or fee_service.get_recommended_fees()
+                response = route(body, fee_rates)
+            if body.get("timings"):
+                response["timings"] = trace.to_dict()
+            self.send_json(200, response)
+            failed = False
+        except RequestError as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+        finally:
+            self.server.metrics.record(f"POST {self.path}" if route else "POST other", time.perf_counter() - start, failed)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_SIZE:
+            raise RequestError("Request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise RequestError("Request body must be JSON")
+        if not isinstance(body, dict):
+            raise RequestError("Request body must be a JSON object")
+        return body
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode(), 'application/json')
+
+    def send_body(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # Unix sockets have no peer address, BaseHTTPRequestHandler expects a (host, port) pair
+        request, _ = super().get_request()
+        return (request, ('local', 0))
+
+def create_server(host='127.0.0.1', port=8335, socket_path=None, fee_rates=None):
+    """
+    Builds a threaded server on a TCP port, or on a Unix socket when socket_path is given.
+    With fee_rates every request uses those fees and the fee service is never called.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, AnalysisRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), AnalysisRequestHandler)
+    server.metrics = LatencyMetrics()
+    server.chain_params = bitcointx.get_current_chain_params()
+    server.fee_rates = fee_rates
+    return server
+
+def start_server(host='127.0.0.1', port=0, socket_path=None, fee_rates=None):
+    """
+    Starts the server on a background thread, mainly for tests. Returns the server and
+    its base URL (or socket path); call server.shutdown() when done.
+    """
+    server = create_server(host, port, socket_path, fee_rates)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address = socket_path or f"http://{host}:{server.server_address[1]}"
+    return (server, address)
+
+def serve(host='127.0.0.1', port=8335, socket_path=None, fee_rates=None):
+    """Runs the analysis daemon until interrupted, on fixed fee_rates (e.g. --offline) if given."""
+    server = create_server(host, port, socket_path, fee_rates)
+    if fee_rates is None:
+        # Warm the fee cache so the first request doesn't pay for the fetch
+        fee_service.get_recommended_fees()
+    address = socket_path or f"http://{host}:{server.server_address[1]}"
+    psbt_analyzer.console.print(f"Serving PSBT analysis on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,267 @@
+import asyncio
+import concurrent.futures
+import inspect
+import json
+import time
+import bitcointx
+import fee_service
+import psbt_analyzer
+import psbt_io
+
+# Items each queue between two stages holds before the stage feeding it waits
+DEFAULT_QUEUE_SIZE = 64
+
+STAGES = ('decode', 'analyze', 'sink')
+
+def run_with_chain_params(chain_params_name, fn, *args):
+    """Runs fn in an executor thread with the pipeline's chain params, bitcointx keeps them per thread."""
+    bitcointx.select_chain_params(chain_params_name)
+    return fn(*args)
+
+def decode_psbt(psbt_data, parser):
+    return psbt_io.load_psbt(psbt_data, parser)
+
+def analyze_decoded(psbt_obj, fee_rates):
+    return psbt_analyzer.analyze_psbt_object(psbt_obj, fee_rates).to_dict()
+
+class CoalescedFees:
+    """
+    Non-blocking access to a fee_service.FeeProvider from asyncio. Cached fees
+    are returned straight away; when a fetch is needed it runs in a thread and
+    every caller waiting meanwhile shares that one in-flight request.
+    """
+
+    def __init__(self, provider=None):
+        self.provider = provider
+        self.inflight = None
+
+    async def get(self):
+        provider = self.provider or fee_service.default_provider
+        fees = provider.usable_fees()
+        if fees is not None:
+            return fees
+        if self.inflight is None:
+            self.inflight = asyncio.ensure_future(asyncio.to_thread(provider.get_recommended_fees))
+            self.inflight.add_done_callback(self.clear_inflight)
+        # Shielded so one cancelled caller doesn't cancel the fetch for the others
+        return await asyncio.shield(self.inflight)
+
+    def clear_inflight(self, future):
+        if self.inflight is future:
+            self.inflight = None
+
+class JsonLinesSink:
+    """Writes records as JSON Lines to a path or an open text file, in a thread so the loop never blocks on disk."""
+
+    def __init__(self, target):
+        self.target = target
+        self.file = None
+
+    def write_record(self, record):
+        if self.file is None:
+            self.file = open(self.target, 'w') if isinstance(self.target, str) else self.target
+        self.file.write(json.dumps(record) + "\n")
+
+    async def write(self, record):
+        await asyncio.to_thread(self.write_record, record)
+
+    async def close(self):
+        if self.file is not None:
+            if isinstance(self.target, str):
+                await asyncio.to_thread(self.file.close)
+            else:
+                await asyncio.to_thread(self.file.flush)
+
+class CallbackSink:
+    """Hands every record to a function or coroutine function."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    async def write(self, record):
+        result = self.callback(record)
+        if inspect.isawaitable(result):
+            await result
+
+    async def close(self):
+        pass
+
+async def queue_source(queue, prefix="queue"):
+    """Yields (psbt_id, psbt) from an asyncio.Queue until it yields None. Bare PSBTs get numbered ids."""
+    count = 0
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        count += 1
+        yield item if isinstance(item, tuple) else (f"{prefix}:{count}", item)
+
+async def stream_source(reader, prefix="stream"):
+    """Yields newline-delimited base64 or hex PSBTs read from an asyncio.StreamReader, e.g. a socket."""
+    line_number = 0
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        line_number += 1
+        line = line.strip()
+        if line:
+            yield (f"{prefix}:{line_number}", line.decode('ascii', errors='replace'))
+
+async def iterate_source(source):
+    """Turns an async iterable, or a blocking iterable (e.g. batch_analyzer.iter_psbt_sources) read in a thread, into an async one."""
+    if hasattr(source, '__aiter__'):
+        async for item in source:
+            yield item
+        return
+    iterator = iter(source)
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+class Pipeline:
+    """
+    Asyncio pipeline analyzing PSBTs from any number of sources
+    (source -> decode -> analyze -> sink). Stages are joined by bounded queues,
+    so fast sources wait for slow stages instead of buffering everything.
+    Decoding and analysis run on an executor with the chain params of the
+    thread that built the pipeline, and fee lookups go through CoalescedFees.
+    Records have the same {"id", "analysis", "error"} form as batch analysis
+    and reach the sinks in completion order.
+    """
+
+    def __init__(self, sinks, executor=None, queue_size=DEFAULT_QUEUE_SIZE, decoders=2, analyzers=2, fee_rates=None, parser=None, fees=None):
+        self.sinks = list(sinks)
+        self.executor = executor
+        self.queue_size = queue_size
+        self.decoders = decoders
+        self.analyzers = analyzers
+        self.fee_rates = fee_rates
+        self.parser = parser or psbt_analyzer.default_parser
+        self.fees = fees or CoalescedFees()
+        self.chain_params_name = bitcointx.get_current_chain_params().NAME
+        self.queues = None
+        self.max_depths = dict.fromkeys(STAGES, 0)
+        self.processed = 0
+        self.failed = 0
+
+    def queue_depths(self) -> dict:
+        """Returns how many items wait in front of each stage right now."""
+        if self.queues is None:
+            return dict.fromkeys(STAGES, 0)
+        return {stage: queue.qsize() for stage, queue in self.queues.items()}
+
+    async def put(self, stage, item):
+        queue = self.queues[stage]
+        await queue.put(item)
+        self.max_depths[stage] = max(self.max_depths[stage], queue.qsize())
+
+    async def run_in_executor(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, run_with_chain_params, self.chain_params_name, fn, *args)
+
+    async def feed(self, source):
+        async for item in iterate_source(source):
+            await self.put('decode', item)
+
+    async def decode_worker(self):
+        queue = self.queues['decode']
+        while True:
+            psbt_id, psbt_data = await queue.get()
+            try:
+                psbt_obj = await self.run_in_executor(decode_psbt, psbt_data, self.parser)
+                await self.put('analyze', (psbt_id, psbt_obj))
+            except Exception as e:
+                await self.put('sink', {"id": psbt_id, "analysis": None, "error": str(e)})
+            finally:
+                queue.task_done()
+
+    async def analyze_worker(self):
+        queue = self.queues['analyze']
+        while True:
+            psbt_id, psbt_obj = await queue.get()
+            try:
+                fee_rates = self.fee_rates or await self.fees.get()
+                analysis = await self.run_in_executor(analyze_decoded, psbt_obj, fee_rates)
+                record = {"id": psbt_id, "analysis": analysis, "error": None}
+            except Exception as e:
+                record = {"id": psbt_id, "analysis": None, "error": str(e)}
+            await self.put('sink', record)
+            queue.task_done()
+
+    async def sink_worker(self):
+        # A single writer, so sinks see one record at a time
+        queue = self.queues['sink']
+        while True:
+            record = await queue.get()
+            try:
+                for sink in self.sinks:
+                    await sink.write(record)
+                self.processed += 1
+                if record["error"] is not None:
+                    self.failed += 1
+            finally:
+                queue.task_done()
+
+    async def monitor(self, interval, callback):
+        while True:
+            await asyncio.sleep(interval)
+            callback(self.queue_depths())
+
+    async def drain(self, sources):
+        await asyncio.gather(*(self.feed(source) for source in sources))
+        # Each stage is drained before the next, as items still flow downstream until then
+        for stage in STAGES:
+            await self.queues[stage].join()
+
+    async def run(self, *sources, report_interval=None, on_report=None):
+        """
+        Runs every source to exhaustion through the pipeline and returns the
+        counts, the elapsed time and the deepest each queue got. With
+        report_interval, on_report gets the queue depths every that many seconds.
+        An exception from a source, a sink or on_report stops the run and is raised.
+        """
+        self.queues = {stage: asyncio.Queue(self.queue_size) for stage in STAGES}
+        start = time.perf_counter()
+        workers = ([asyncio.create_task(self.decode_worker()) for _ in range(self.decoders)]
+                   + [asyncio.create_task(self.analyze_worker()) for _ in range(self.analyzers)]
+                   + [asyncio.create_task(self.sink_worker())])
+        if report_interval and on_report:
+            workers.append(asyncio.create_task(self.monitor(report_interval, on_report)))
+        drained = asyncio.create_task(self.drain(sources))
+        try:
+            # Workers only ever stop by raising, after which the queues behind them would block forever
+            done, _ = await asyncio.wait([drained, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in [drained, *workers]:
+                task.cancel()
+            await asyncio.gather(drained, *workers, return_exceptions=True)
+            for sink in self.sinks:
+                await sink.close()
+        elapsed = time.perf_counter() - start
+        return {
+            "count": self.processed,
+            "failed": self.failed,
+            "elapsed": elapsed,
+            "psbts_per_sec": self.processed / elapsed if elapsed > 0 else 0,
+            "max_queue_depths": dict(self.max_depths),
+        }
+
+def analyze_sources(sources, output=None, callback=None, workers=None, **options):
+    """
+    Blocking convenience wrapper: runs a Pipeline over sources with a JSON
+    Lines sink (output path or file) and/or a callback sink on a thread pool
+    of workers threads. Returns the run's stats.
+    """
+    sinks = []
+    if output is not None:
+        sinks.append(JsonLinesSink(output))
+    if callback is not None:
+        sinks.append(CallbackSink(callback))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return asyncio.run(Pipeline(sinks, executor=executor, **options).run(*sources))
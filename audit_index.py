@@ -0,0 +1,260 @@
+import hashlib
+import sqlite3
+import fast_psbt_parser
+import psbt_io
+
+# Scripts are stored as truncated SHA256 hashes, collisions at 128 bits are not a concern
+SCRIPT_HASH_BYTES = 16
+
+# Keys looked up per query, well under SQLite's limit on bound parameters
+LOOKUP_CHUNK = 500
+
+# Page cache in KiB, enough to keep the upper B-tree levels of millions of entries in memory
+CACHE_KIB = 16384
+
+# Adds are committed in batches of this many PSBTs, as a commit per PSBT would dominate large audits
+COMMIT_EVERY = 1000
+
+# Stored as the database's user_version, see AuditIndex.migrate
+SCHEMA_VERSION = 1
+
+SCHEMA = (
+    # One row per unsigned transaction, named after the first PSBT seen with it. Names such as
+    # stdin:1 repeat between runs, so they never identify a transaction
+    "CREATE TABLE IF NOT EXISTS psbts (id INTEGER PRIMARY KEY, txid BLOB UNIQUE NOT NULL, name TEXT NOT NULL)",
+    # outpoint is the 32 byte txid (internal byte order) followed by the 4 byte little endian vout
+    "CREATE TABLE IF NOT EXISTS spends (outpoint BLOB NOT NULL, psbt INTEGER NOT NULL, PRIMARY KEY (outpoint, psbt)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS payments (script_hash BLOB NOT NULL, psbt INTEGER NOT NULL, vout INTEGER NOT NULL, PRIMARY KEY (script_hash, psbt, vout)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS flagged_scripts (script_hash BLOB PRIMARY KEY, label TEXT NOT NULL) WITHOUT ROWID",
+)
+
+# Version 0 indexes keyed PSBTs by name and replaced a name's rows when it was added again
+MIGRATE_FROM_V0 = (
+    "ALTER TABLE psbts RENAME TO psbts_v0",
+    SCHEMA[0],
+    "INSERT INTO psbts (id, txid, name) SELECT MIN(id), txid, name FROM psbts_v0 GROUP BY txid",
+    # PSBTs sharing a transaction are merged into the row kept for it
+    "UPDATE OR IGNORE spends SET psbt = (SELECT p.id FROM psbts p JOIN psbts_v0 v ON v.txid = p.txid WHERE v.id = spends.psbt)",
+    "UPDATE OR IGNORE payments SET psbt = (SELECT p.id FROM psbts p JOIN psbts_v0 v ON v.txid = p.txid WHERE v.id = payments.psbt)",
+    "DELETE FROM spends WHERE psbt NOT IN (SELECT id FROM psbts)",
+    "DELETE FROM payments WHERE psbt NOT IN (SELECT id FROM psbts)",
+    "DROP TABLE psbts_v0",
+    "DROP INDEX IF EXISTS spends_psbt",
+    "DROP INDEX IF EXISTS payments_psbt",
+)
+
+def script_hash(script):
+    return hashlib.sha256(script).digest()[:SCRIPT_HASH_BYTES]
+
+def encode_outpoint(txid, vout):
+    """Packs an outpoint given as the txid in internal byte order and the output index."""
+    return bytes(txid) + vout.to_bytes(4, 'little')
+
+def format_outpoint(outpoint):
+    """Formats a packed outpoint as "txid:n" with the txid as block explorers show it."""
+    return f"{outpoint[:32][::-1].hex()}:{int.from_bytes(outpoint[32:], 'little')}"
+
+def parse_outpoint(text):
+    """Packs an outpoint given as "txid:n"."""
+    txid, vout = text.rsplit(':', 1)
+    return encode_outpoint(bytes.fromhex(txid)[::-1], int(vout))
+
+def psbt_references(data):
+    """
+    Returns (txid, outpoints, output scripts) of a PSBT's unsigned transaction,
+    as bytes, reading only the global map. PSBTs the fast parser can't walk
+    are fully decoded with python-bitcointx instead.
+    """
+    try:
+        reader = fast_psbt_parser.Reader(memoryview(psbt_io.binary_view(data)))
+        if bytes(reader.read(len(fast_psbt_parser.PSBT_MAGIC))) != fast_psbt_parser.PSBT_MAGIC:
+            raise fast_psbt_parser.FastParseError("Missing PSBT magic bytes")
+        for key_type, key_data, value in fast_psbt_parser.iter_map(reader):
+            if key_type == fast_psbt_parser.PSBT_GLOBAL_UNSIGNED_TX and not key_data:
+                tx = fast_psbt_parser.parse_unsigned_tx(value)
+                txid = hashlib.sha256(hashlib.sha256(value).digest()).digest()
+                break
+        else:
+            raise fast_psbt_parser.FastParseError("Missing unsigned transaction")
+    except ValueError:
+        tx = psbt_io.load_psbt(data, 'bitcointx').unsigned_tx
+        txid = bytes(tx.GetTxid())
+    outpoints = [encode_outpoint(txin.prevout.hash, txin.prevout.n) for txin in tx.vin]
+    scripts = [bytes(txout.scriptPubKey) for txout in tx.vout]
+    return (txid, outpoints, scripts)
+
+def load_flagged_scripts(path):
+    """
+    Reads known-bad scripts from a text file, one per line as a hex
+    scriptPubKey or an address, optionally followed by a label. Blank lines
+    and lines starting with # are skipped. Returns (script, label) pairs.
+    """
+    from bitcointx.wallet import CBitcoinAddress
+    flagged = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            value, _, label = line.replace(',', ' ', 1).partition(' ')
+            try:
+                script = bytes.fromhex(value)
+            except ValueError:
+                script = bytes(CBitcoinAddress(value).to_scriptPubKey())
+            flagged.append((script, label.strip() or "flagged"))
+    return flagged
+
+def describe_transactions(rows):
+    """Turns (name, txid) rows into the "psbts" and "txids" of a report entry, the txids as block explorers show them."""
+    rows = sorted(rows)
+    return {"psbts": [name for name, _ in rows], "txids": [bytes(txid)[::-1].hex() for _, txid in rows]}
+
+class AuditIndex:
+    """
+    Persistent SQLite index of every outpoint spent and every script paid by
+    the PSBTs fed to it, for spotting double spends, address reuse and
+    payments to flagged scripts across batch audits and between runs.
+    Lookups go through primary keys, so each is a single B-tree search no
+    matter how many millions of entries are stored, and only SQLite's page
+    cache is held in memory. Entries are kept per unsigned transaction, so
+    PSBTs with the same one (e.g. the cosigners' copies) share them and never
+    conflict with each other, whatever they are called.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA cache_size=-{CACHE_KIB}")
+        self.migrate()
+        self.uncommitted = 0
+
+    def migrate(self):
+        """Creates the tables, or brings an index written by an older version up to date."""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'psbts'").fetchone() is not None
+        with self.conn:
+            if exists and version == 0:
+                for statement in MIGRATE_FROM_V0:
+                    self.conn.execute(statement)
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def psbt_row(self, name, txid):
+        """Returns the id of txid's row, registering it under name the first time it is seen."""
+        row = self.conn.execute("SELECT id FROM psbts WHERE txid = ?", (txid,)).fetchone()
+        if row is not None:
+            return row[0]
+        return self.conn.execute("INSERT INTO psbts (txid, name) VALUES (?, ?)", (txid, name)).lastrowid
+
+    def add(self, name, txid, outpoints, scripts):
+        """
+        Records a PSBT's spent outpoints and paid scripts and returns what it
+        collides with (see check). name is only a label for reports, PSBTs
+        are told apart by txid.
+        """
+        report = self.check(txid, outpoints, scripts)
+        psbt_id = self.psbt_row(name, txid)
+        self.conn.executemany("INSERT OR IGNORE INTO spends (outpoint, psbt) VALUES (?, ?)", ((outpoint, psbt_id) for outpoint in outpoints))
+        self.conn.executemany("INSERT OR IGNORE INTO payments (script_hash, psbt, vout) VALUES (?, ?, ?)",
+                              ((script_hash(script), psbt_id, vout) for vout, script in enumerate(scripts)))
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_EVERY:
+            self.commit()
+        return report
+
+    def add_psbt(self, name, data):
+        """Indexes a PSBT given as base64, hex or binary, see add."""
+        return self.add(name, *psbt_references(data))
+
+    def check(self, txid, outpoints, scripts):
+        """
+        Looks up a transaction against the index without adding it. Returns
+        {"conflicts", "reused_scripts", "flagged"}: outpoints other
+        transactions spend too, outputs paying scripts other transactions pay
+        (each with the names and txids of those transactions) and outputs
+        paying flagged scripts.
+        """
+        spenders = self.lookup_many("SELECT s.outpoint, p.name, p.txid FROM spends s JOIN psbts p ON p.id = s.psbt WHERE p.txid != ? AND s.outpoint IN ({})", outpoints, (txid,))
+        conflicts = []
+        for outpoint in outpoints:
+            others = spenders.get(outpoint)
+            if others:
+                conflicts.append({"outpoint": format_outpoint(outpoint), **describe_transactions(others)})
+
+        hashes = [script_hash(script) for script in scripts]
+        payers = self.lookup_many("SELECT s.script_hash, p.name, p.txid FROM payments s JOIN psbts p ON p.id = s.psbt WHERE p.txid != ? AND s.script_hash IN ({})", hashes, (txid,))
+        labels = self.lookup_many("SELECT script_hash, label FROM flagged_scripts WHERE script_hash IN ({})", hashes)
+        reused = []
+        flagged = []
+        for vout, (script, hashed) in enumerate(zip(scripts, hashes)):
+            others = payers.get(hashed)
+            if others:
+                reused.append({"vout": vout, "script": script.hex(), **describe_transactions(others)})
+            for (label,) in labels.get(hashed, ()):
+                flagged.append({"vout": vout, "script": script.hex(), "label": label})
+        return {"conflicts": conflicts, "reused_scripts": reused, "flagged": flagged}
+
+    def lookup_many(self, query, keys, params=()):
+        """Runs query with params followed by keys in chunks of LOOKUP_CHUNK, returns {key: set of the rows' other columns}."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            for row in self.conn.execute(query.format(",".join("?" * len(chunk))), (*params, *chunk)):
+                found.setdefault(row[0], set()).add(row[1:])
+        return found
+
+    def names(self, query, params):
+        return sorted({row[0] for row in self.conn.execute(query, params)})
+
+    def spenders(self, outpoint):
+        """Names of the PSBTs spending an outpoint, given as "txid:n" or packed."""
+        if isinstance(outpoint, str):
+            outpoint = parse_outpoint(outpoint)
+        return self.names("SELECT p.name FROM spends s JOIN psbts p ON p.id = s.psbt WHERE s.outpoint = ?", (outpoint,))
+
+    def payers(self, script):
+        """Names of the PSBTs paying a scriptPubKey."""
+        return self.names("SELECT p.name FROM payments s JOIN psbts p ON p.id = s.psbt WHERE s.script_hash = ?", (script_hash(script),))
+
+    def lookup(self, value):
+        """
+        Answers a query given as text: "txid:n" lists the PSBTs spending that
+        outpoint, a hex scriptPubKey or an address the PSBTs paying it.
+        """
+        if ':' in value:
+            return {"outpoint": value, "spent_by": self.spenders(value)}
+        try:
+            script = bytes.fromhex(value)
+        except ValueError:
+            from bitcointx.wallet import CBitcoinAddress
+            script = bytes(CBitcoinAddress(value).to_scriptPubKey())
+        row = self.conn.execute("SELECT label FROM flagged_scripts WHERE script_hash = ?", (script_hash(script),)).fetchone()
+        return {"script": script.hex(), "paid_by": self.payers(script), "flagged": row[0] if row else None}
+
+    def flag_scripts(self, flagged):
+        """Adds (script, label) pairs to the known-bad scripts outputs are checked against."""
+        self.conn.executemany("INSERT OR REPLACE INTO flagged_scripts (script_hash, label) VALUES (?, ?)",
+                              ((script_hash(script), label) for script, label in flagged))
+        self.conn.commit()
+
+    def stats(self) -> dict:
+        count = lambda table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return {"psbts": count("psbts"), "outpoints": count("spends"), "payments": count("payments"), "flagged_scripts": count("flagged_scripts")}
+
+    def commit(self):
+        self.conn.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,151 @@
+import glob
+import os
+import sys
+import time
+import console_util
+import fee_service
+import instrumentation
+import psbt_analyzer
+import psbt_io
+
+# Batch output is written to stdout, so any diagnostics go to stderr instead
+console = console_util.LazyConsole(stderr=True)
+
+def read_psbt_file(path):
+    """Reads a single PSBT from a file, as base64/hex text or raw binary bytes."""
+    return psbt_io.read_psbt(path)
+
+def iter_psbt_file(path):
+    """Yields (psbt_id, psbt) for a single PSBT file, or for every PSBT in an archive."""
+    if psbt_io.is_archive(path):
+        with psbt_io.PsbtArchive(path) as archive:
+            for i in range(len(archive)):
+                # Copied out of the map so the PSBT can outlive the archive (or go to a worker)
+                yield (f"{path}#{i}", bytes(archive[i]))
+    else:
+        yield (path, read_psbt_file(path))
+
+def iter_directory(path):
+    """Lazily yields the regular files found directly inside a directory."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                yield entry.path
+
+def iter_psbt_sources(sources, stream=None):
+    """
+    Lazily yields (psbt_id, psbt) pairs from directories, globs, files, PSBT
+    archives or newline-delimited base64 on stdin (given as "-"). Files may be
+    base64, hex or binary. Only one PSBT is held in memory at a time.
+    """
+    for source in sources:
+        if source == "-":
+            stream = stream or sys.stdin
+            for line_number, line in enumerate(stream, start=1):
+                line = line.strip()
+                if line:
+                    yield (f"stdin:{line_number}", line)
+        elif os.path.isdir(source):
+            for path in iter_directory(source):
+                yield from iter_psbt_file(path)
+        elif os.path.isfile(source):
+            yield from iter_psbt_file(source)
+        else:
+            for path in glob.iglob(source):
+                if os.path.isfile(path):
+                    yield from iter_psbt_file(path)
+
+def analyze_record(psbt_id, psbt_base64, fee_rates=None, timings=False, audit=False):
+    """
+    Analyzes one PSBT and wraps the result in a JSON-serializable record.
+    With timings the record carries the analysis' per-stage durations and counters too.
+    With audit it also carries the transaction's "references" for the audit index,
+    which write_records takes out again.
+    """
+    if timings:
+        # Added to the metrics registry by whoever collects the record, which may be another process
+        with instrumentation.tracing(registry=None) as trace:
+            record = analyze_record(psbt_id, psbt_base64, fee_rates, audit=audit)
+        record["timings"] = trace.to_dict()
+        return record
+    try:
+        analysis = psbt_analyzer.parse_psbt_input(psbt_base64, raise_errors=True, fee_rates=fee_rates)
+        record = {"id": psbt_id, "analysis": analysis, "error": None}
+    except Exception as e:
+        return {"id": psbt_id, "analysis": None, "error": str(e)}
+    if audit:
+        import audit_index
+        record["references"] = audit_index.psbt_references(psbt_base64)
+    return record
+
+def analyze_batch(psbts, fee_rates=None, timings=False, audit=False):
+    """Yields one analysis record per (psbt_id, psbt_base64) pair."""
+    for psbt_id, psbt_base64 in psbts:
+        yield analyze_record(psbt_id, psbt_base64, fee_rates, timings, audit)
+
+def write_records(records, out, audit=None, report_format='jsonl'):
+    """
+    Writes records to out in report_format (see output_util.RENDERERS, JSON
+    Lines by default) and returns (count, failed). Timed records are added to
+    the metrics registry. With an audit_index.AuditIndex every analyzed PSBT
+    is added to it and its record gets an "audit" field with the conflicts found.
+    """
+    import output_util
+    renderer = output_util.RENDERERS[report_format](out)
+    count = 0
+    failed = 0
+    for record in records:
+        references = record.pop("references", None)
+        if audit is not None and references is not None:
+            record["audit"] = audit.add(record["id"], *references)
+        renderer.write(record)
+        count += 1
+        if record["error"] is not None:
+            failed += 1
+        if "timings" in record:
+            instrumentation.default_registry.observe(record["timings"])
+    renderer.close()
+    return (count, failed)
+
+def run_batch(sources, output_path=None, workers=1, chunk_size=64, fee_rates=None, timings=False, audit=None, report_format='jsonl'):
+    """
+    Runs a non-interactive batch analysis and reports throughput on stderr.
+    With more than one worker the PSBTs are analyzed across a process pool.
+    Pass fee_rates to skip fetching the recommended fees, timings to add
+    per-stage durations and counters to every record and an
+    audit_index.AuditIndex to check every PSBT against (and add it to) it.
+    report_format picks how the records are written, see write_records.
+    """
+    # Keep the analyzer's own messages off the JSON stream
+    psbt_analyzer.console = console
+
+    start = time.perf_counter()
+    # Fetch fees once and share them across every PSBT (and worker) in the batch
+    fee_rates = fee_rates or fee_service.get_recommended_fees()
+    if workers != 1:
+        import parallel_analyzer
+        records = parallel_analyzer.analyze_parallel(iter_psbt_sources(sources), workers=workers, chunk_size=chunk_size, fee_rates=fee_rates, timings=timings, audit=audit is not None)
+    else:
+        records = analyze_batch(iter_psbt_sources(sources), fee_rates, timings, audit is not None)
+    if output_path:
+        with open(output_path, 'w') as out:
+            count, failed = write_records(records, out, audit, report_format)
+    else:
+        count, failed = write_records(records, sys.stdout, audit, report_format)
+    elapsed = time.perf_counter() - start
+
+    throughput = count / elapsed if elapsed > 0 else 0
+    console.print(f"Analyzed {count} PSBTs ({failed} failed) in {elapsed:.2f}s, {throughput:.1f} PSBTs/sec")
+    cache_stats = psbt_analyzer.script_info_cache.stats()
+    if workers == 1:
+        console.print(f"Script cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.1%} hit rate)")
+    summary = {"count": count, "failed": failed, "elapsed": elapsed, "psbts_per_sec": throughput, "script_cache": cache_stats}
+    if audit is not None:
+        audit.commit()
+        summary["audit_index"] = audit_stats = audit.stats()
+        console.print(f"Audit index: {audit_stats['psbts']} PSBTs, {audit_stats['outpoints']} outpoints and {audit_stats['payments']} payments indexed")
+    if psbt_analyzer.analysis_cache is not None:
+        summary["result_cache"] = result_stats = psbt_analyzer.analysis_cache.stats()
+        if workers == 1:
+            console.print(f"Result cache: {result_stats['hits']} hits, {result_stats['misses']} misses ({result_stats['hit_rate']:.1%} hit rate), {result_stats['size']} stored")
+    return summary
@@ -0,0 +1,65 @@
+"""
+Memory benchmark for holding many analyses at once.
+
+Compares the per-analysis footprint of the nested dicts returned by
+parse_psbt_input with the slotted analysis_model.Analysis representation,
+plus the cost of an edit copy (copy.deepcopy vs Analysis.copy).
+
+    python3 benchmarks/bench_analysis_memory.py
+"""
+import copy
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analysis_model
+import psbt_analyzer
+
+def load_example(name='example_psbt_2.psbt'):
+    with open(os.path.join(ROOT, 'tests', name)) as f:
+        return f.read().strip()
+
+def vary(parsed_data, i):
+    """Gives every copy its own amounts and addresses, like distinct real PSBTs would have."""
+    data = copy.deepcopy(parsed_data)
+    for item in data['inputs'] + data['outputs']:
+        item['amount'] += i
+        item['address'] = f"{item['address'][:-8]}{i:08d}"
+    return data
+
+def measure(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return ((after - before) / count, held)
+
+def main(count=20000):
+    fee_rates = {"fastestFee": 100, "halfHourFee": 50, "hourFee": 20, "economyFee": 5, "minimumFee": 1}
+    parsed_data = psbt_analyzer.parse_psbt_input(load_example(), fee_rates=fee_rates)
+    variants = [vary(parsed_data, i) for i in range(count)]
+
+    dict_bytes, dicts = measure(lambda i: copy.deepcopy(variants[i]), count)
+    slotted_bytes, analyses = measure(lambda i: analysis_model.Analysis.from_dict(variants[i]), count)
+
+    print(f"analyses held: {count} (2 inputs, 2 outputs each)")
+    print(f"nested dicts:   {dict_bytes:8.0f} bytes/analysis")
+    print(f"slotted model:  {slotted_bytes:8.0f} bytes/analysis ({1 - slotted_bytes / dict_bytes:.0%} smaller)")
+
+    start = time.perf_counter()
+    for data in dicts[:5000]:
+        copy.deepcopy(data)
+    deepcopy_us = (time.perf_counter() - start) / 5000 * 1e6
+    start = time.perf_counter()
+    for analysis in analyses[:5000]:
+        analysis.copy()
+    copy_us = (time.perf_counter() - start) / 5000 * 1e6
+    print(f"edit copy: copy.deepcopy {deepcopy_us:.1f} us, Analysis.copy {copy_us:.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark for the streaming PSBT parser.
+
+Builds consolidation style PSBTs whose inputs carry full non_witness_utxo
+parent transactions with many outputs, and compares decoding and the full
+analysis with python-bitcointx and with fast_psbt_parser. Also checks both
+produce the same analysis.
+
+    python3 benchmarks/bench_fast_parser.py
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bitcointx.core import CTransaction, CTxIn, CTxOut, COutPoint
+from bitcointx.core.psbt import PartiallySignedTransaction
+from bitcointx.core.script import CScript
+import fast_psbt_parser
+import fee_service
+import psbt_analyzer
+
+def p2wpkh(rng):
+    return CScript(b'\x00\x14' + rng.randbytes(20))
+
+def build_psbt(rng, inputs, parent_outputs):
+    """A PSBT spending one output of each of `inputs` parents with `parent_outputs` outputs each."""
+    parents = [CTransaction([CTxIn(COutPoint(rng.randbytes(32), 0))], [CTxOut(rng.randint(10_000, 10**8), p2wpkh(rng)) for _ in range(parent_outputs)]) for _ in range(inputs)]
+    spent = [rng.randrange(parent_outputs) for _ in parents]
+    total = sum(parent.vout[n].nValue for parent, n in zip(parents, spent))
+    tx = CTransaction([CTxIn(COutPoint(parent.GetTxid(), n)) for parent, n in zip(parents, spent)], [CTxOut(total // 2, p2wpkh(rng)), CTxOut(total // 3, p2wpkh(rng))])
+    psbt = PartiallySignedTransaction(unsigned_tx=tx)
+    for i, parent in enumerate(parents):
+        psbt.set_utxo(parent, i)
+    return psbt.serialize()
+
+def time_per_call(fn, corpus, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in corpus:
+            fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus)
+
+def main():
+    rng = random.Random(1)
+    fee_rates = fee_service.sample_response_upon_failure
+    for inputs, parent_outputs in [(2, 2), (5, 100), (20, 500)]:
+        corpus = [build_psbt(rng, inputs, parent_outputs) for _ in range(3)]
+        size = sum(len(raw) for raw in corpus) / len(corpus)
+        assert all(psbt_analyzer.parse_psbt_input(raw, True, fee_rates, 'fast') == psbt_analyzer.parse_psbt_input(raw, True, fee_rates, 'bitcointx') for raw in corpus)
+
+        full_decode = time_per_call(PartiallySignedTransaction.deserialize, corpus)
+        fast_decode = time_per_call(fast_psbt_parser.parse, corpus)
+        full_analysis = time_per_call(lambda raw: psbt_analyzer.parse_psbt_analysis(raw, True, fee_rates, 'bitcointx'), corpus)
+        fast_analysis = time_per_call(lambda raw: psbt_analyzer.parse_psbt_analysis(raw, True, fee_rates, 'fast'), corpus)
+        print(f"{inputs} inputs x {parent_outputs} parent outputs ({size / 1024:.0f} KiB):")
+        print(f"  decode:   bitcointx {full_decode * 1000:8.2f}ms  fast {fast_decode * 1000:7.2f}ms  ({full_decode / fast_decode:.0f}x)")
+        print(f"  analysis: bitcointx {full_analysis * 1000:8.2f}ms  fast {fast_analysis * 1000:7.2f}ms  ({full_analysis / fast_analysis:.0f}x)")
+
+if __name__ == "__main__":
+    main()
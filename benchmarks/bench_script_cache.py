@@ -0,0 +1,64 @@
+"""
+Benchmark for the memoized scriptPubKey -> address derivation.
+
+Replays the scriptPubKeys of a corpus where most outputs pay a small set of
+recurring scripts (hot wallets, change descriptors) and the rest are fresh,
+and compares uncached derivation with the LRU cached path.
+
+    python3 benchmarks/bench_script_cache.py
+"""
+import glob
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bitcointx.core.psbt import PartiallySignedTransaction
+from bitcointx.core.script import CScript
+import psbt_analyzer
+import script_cache
+
+TEMPLATES = [('76a914', 20, '88ac'), ('a914', 20, '87'), ('0014', 20, ''), ('0020', 32, ''), ('5120', 32, '')]
+
+def random_script(rng):
+    prefix, length, suffix = rng.choice(TEMPLATES)
+    return CScript(bytes.fromhex(prefix) + rng.randbytes(length) + bytes.fromhex(suffix))
+
+def example_scripts():
+    """Collects the scriptPubKeys found in the example PSBTs."""
+    scripts = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'tests', '*.psbt'))):
+        with open(path) as f:
+            psbt = PartiallySignedTransaction.from_base64(f.read().strip())
+        scripts.extend(txout.scriptPubKey for txout in psbt.unsigned_tx.vout)
+    return scripts
+
+def build_corpus(size, recurring=200, reuse_ratio=0.8, seed=1):
+    rng = random.Random(seed)
+    hot = example_scripts() + [random_script(rng) for _ in range(recurring)]
+    return [rng.choice(hot) if rng.random() < reuse_ratio else random_script(rng) for _ in range(size)]
+
+def time_pass(corpus, derive):
+    start = time.perf_counter()
+    for script in corpus:
+        derive(script)
+    return time.perf_counter() - start
+
+def main(size=50000):
+    corpus = build_corpus(size)
+    uncached = time_pass(corpus, psbt_analyzer.derive_script_and_address_info)
+
+    cache = script_cache.ScriptInfoCache(maxsize=4096)
+    cached = time_pass(corpus, lambda script: cache.get_or_compute(script, psbt_analyzer.derive_script_and_address_info))
+    stats = cache.stats()
+
+    print(f"scripts: {size}, hit rate: {stats['hit_rate']:.1%} ({stats['hits']} hits, {stats['misses']} misses)")
+    print(f"uncached derivation: {uncached:.2f}s ({uncached / size * 1e6:.1f} us/script)")
+    print(f"LRU cached:          {cached:.2f}s ({cached / size * 1e6:.1f} us/script)")
+    print(f"address derivation time saved: {uncached - cached:.2f}s ({(1 - cached / uncached):.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark for script classification and vbyte lookups.
+
+Compares the previous if/elif chains (five CScript predicates per script)
+against the table driven fast path in script_classifier.
+
+    python3 benchmarks/bench_script_classification.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitcointx.core.script import CScript
+import script_classifier
+
+SAMPLE_SCRIPTS = [
+    bytes.fromhex('76a914' + '11' * 20 + '88ac'),
+    bytes.fromhex('a914' + '22' * 20 + '87'),
+    bytes.fromhex('0014' + '33' * 20),
+    bytes.fromhex('0020' + '44' * 32),
+    bytes.fromhex('5120' + '55' * 32),
+    bytes.fromhex('6a0b' + '66' * 11),  # OP_RETURN
+]
+
+def legacy_get_script_type(script):
+    script = CScript(script)
+    if script.is_p2pkh():
+        return 'pubkeyhash'
+    elif script.is_p2sh():
+        return 'scripthash'
+    elif script.is_witness_v0_keyhash():
+        return 'witness_v0_keyhash'
+    elif script.is_witness_v0_scripthash():
+        return 'witness_v0_scripthash'
+    elif script.is_witness_v1_taproot():
+        return 'witness_v1_taproot'
+    return 'unknown'
+
+def legacy_input_vbytes(script_type):
+    if script_type in ['pubkeyhash', 'scripthash']:
+        return 148
+    elif script_type == 'witness_v0_keyhash':
+        return 68
+    elif script_type == 'witness_v0_scripthash':
+        return 100
+    elif script_type == 'witness_v1_taproot':
+        return 58
+    return 148
+
+def run_legacy():
+    for script in SAMPLE_SCRIPTS:
+        legacy_input_vbytes(legacy_get_script_type(script))
+
+def run_tables():
+    for script in SAMPLE_SCRIPTS:
+        script_classifier.input_vbytes(script_classifier.classify_script(script))
+
+def per_script_ns(func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / (number * len(SAMPLE_SCRIPTS)) * 1e9
+
+def main(number=20000):
+    for script in SAMPLE_SCRIPTS:
+        assert legacy_get_script_type(script) == script_classifier.classify_script(script)
+
+    legacy = per_script_ns(run_legacy, number)
+    tables = per_script_ns(run_tables, number)
+    print(f"if/elif chain + CScript predicates: {legacy:8.0f} ns/script")
+    print(f"prefix fast path + lookup tables:   {tables:8.0f} ns/script")
+    print(f"speedup: {legacy / tables:.1f}x")
+
+if __name__ == "__main__":
+    main()
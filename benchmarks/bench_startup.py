@@ -0,0 +1,74 @@
+"""
+Benchmark for the analyzer's cold start.
+
+Runs `python -X importtime` on a fresh interpreter to report which modules
+dominate importing psbt_analyzer, then times a full one-shot
+`psbt_analyzer.py --json --offline` run. The eager row imports Rich, requests
+and http.server up front the way the analyzer used to, for comparison.
+
+    python3 benchmarks/bench_startup.py
+    python3 benchmarks/bench_startup.py --budget-ms 400   # exit non-zero if a one-shot run is slower
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(ROOT, 'tests', 'example_psbt_1.psbt')
+
+LAZY_IMPORT = "import psbt_analyzer"
+EAGER_IMPORT = "import psbt_analyzer, rich.console, rich.prompt, rich.table, requests, http.server"
+
+def import_times(code):
+    """Returns {module: (self_us, cumulative_us)} from a -X importtime run of code."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+def median_wall_time(args, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=ROOT, capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def main(runs=5, top=10, budget_ms=None):
+    lazy = import_times(LAZY_IMPORT)
+    eager = import_times(EAGER_IMPORT)
+    lazy_total = sum(self_us for self_us, _ in lazy.values())
+    eager_total = sum(self_us for self_us, _ in eager.values())
+
+    print(f"import psbt_analyzer: {lazy_total / 1000:.1f}ms ({len(lazy)} modules)")
+    print(f"eager imports:        {eager_total / 1000:.1f}ms ({len(eager)} modules)")
+    print(f"\nslowest imports (cumulative):")
+    for name, (_, cumulative_us) in sorted(lazy.items(), key=lambda item: -item[1][1])[:top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+
+    interpreter = median_wall_time(['-c', 'pass'], runs)
+    one_shot = median_wall_time(['psbt_analyzer.py', '--json', '--offline', '--file', EXAMPLE], runs)
+    eager_one_shot = median_wall_time(['-c', f"{EAGER_IMPORT}; import sys; sys.argv = ['psbt_analyzer.py', '--json', '--offline', '--file', {EXAMPLE!r}]; psbt_analyzer.analyze_psbt()"], runs)
+    print(f"\nmedian of {runs} runs:")
+    print(f"  bare interpreter:          {interpreter * 1000:.0f}ms")
+    print(f"  --json --offline one-shot: {one_shot * 1000:.0f}ms")
+    print(f"  with eager imports:        {eager_one_shot * 1000:.0f}ms")
+
+    if budget_ms is not None and one_shot * 1000 > budget_ms:
+        print(f"one-shot run took {one_shot * 1000:.0f}ms, over the {budget_ms}ms budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float)
+    args = parser.parse_args()
+    main(args.runs, args.top, args.budget_ms)
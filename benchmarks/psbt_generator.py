@@ -0,0 +1,94 @@
+"""
+Synthetic PSBT generator for the benchmarks.
+
+Builds PSBTs with any number of inputs and outputs and a configurable mix of
+script types. Legacy inputs carry their full parent transaction as
+non_witness_utxo (with as many extra outputs as requested), segwit inputs a
+witness_utxo unless full parents are asked for.
+
+    from psbt_generator import generate_psbt
+    raw = generate_psbt(random.Random(1), inputs=50, outputs=2, parent_outputs=200)
+"""
+import hashlib
+import random
+from bitcointx.core import CTransaction, CTxIn, CTxOut, COutPoint, Hash160
+from bitcointx.core.psbt import PartiallySignedTransaction
+from bitcointx.core.script import CScript
+
+DEFAULT_MIX = {
+    'witness_v0_keyhash': 0.5,
+    'witness_v1_taproot': 0.2,
+    'pubkeyhash': 0.15,
+    'scripthash': 0.1,
+    'witness_v0_scripthash': 0.05,
+}
+
+LEGACY_TYPES = ('pubkeyhash', 'scripthash')
+
+def random_spend(rng, script_type):
+    """
+    Returns (scriptPubKey, redeem_script, witness_script) for a spendable output
+    of script_type. P2SH and P2WSH use hash lock scripts, as multisig scripts
+    can't be built without libsecp256k1.
+    """
+    if script_type == 'pubkeyhash':
+        return (CScript(b'\x76\xa9\x14' + rng.randbytes(20) + b'\x88\xac'), None, None)
+    if script_type == 'scripthash':
+        redeem = CScript([rng.randbytes(20), 0x87])
+        return (CScript(b'\xa9\x14' + Hash160(redeem) + b'\x87'), redeem, None)
+    if script_type == 'witness_v0_keyhash':
+        return (CScript(b'\x00\x14' + rng.randbytes(20)), None, None)
+    if script_type == 'witness_v0_scripthash':
+        witness_script = CScript([rng.randbytes(20), 0x87])
+        return (CScript(b'\x00\x20' + hashlib.sha256(witness_script).digest()), None, witness_script)
+    if script_type == 'witness_v1_taproot':
+        return (CScript(b'\x51\x20' + rng.randbytes(32)), None, None)
+    raise ValueError(f"Unknown script type: {script_type}")
+
+def choose_type(rng, mix):
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+def generate_psbt(rng, inputs=2, outputs=2, input_mix=DEFAULT_MIX, output_mix=None, parent_outputs=1, full_parents=False):
+    """
+    Returns a serialized PSBT. parent_outputs is the number of outputs of each
+    non_witness_utxo parent transaction, full_parents gives segwit inputs a
+    parent transaction too.
+    """
+    output_mix = output_mix or input_mix
+    psbt_inputs = []
+    total = 0
+    for _ in range(inputs):
+        script_type = choose_type(rng, input_mix)
+        script_pubkey, redeem_script, witness_script = random_spend(rng, script_type)
+        amount = rng.randint(10_000, 10**8)
+        total += amount
+        if script_type in LEGACY_TYPES or full_parents:
+            spent = rng.randrange(parent_outputs)
+            vout = [CTxOut(rng.randint(10_000, 10**8), random_spend(rng, choose_type(rng, output_mix))[0]) for _ in range(parent_outputs)]
+            vout[spent] = CTxOut(amount, script_pubkey)
+            parent = CTransaction([CTxIn(COutPoint(rng.randbytes(32), 0))], vout)
+            psbt_inputs.append((COutPoint(parent.GetTxid(), spent), parent, redeem_script, witness_script))
+        else:
+            psbt_inputs.append((COutPoint(rng.randbytes(32), rng.randrange(4)), CTxOut(amount, script_pubkey), redeem_script, witness_script))
+
+    # Pay somewhere between 1 and 50 sats/vB on a rough size estimate
+    fee = min(rng.randint(1, 50) * (10 + inputs * 100 + outputs * 40), total // 10)
+    weights = [rng.random() + 0.1 for _ in range(outputs)]
+    spendable = total - fee
+    amounts = [int(spendable * weight / sum(weights)) for weight in weights]
+    vout = [CTxOut(amount, random_spend(rng, choose_type(rng, output_mix))[0]) for amount in amounts]
+
+    tx = CTransaction([CTxIn(outpoint) for outpoint, _, _, _ in psbt_inputs], vout)
+    psbt = PartiallySignedTransaction(unsigned_tx=tx)
+    for i, (_, utxo, redeem_script, witness_script) in enumerate(psbt_inputs):
+        psbt.set_utxo(utxo, i)
+        if redeem_script is not None:
+            psbt.inputs[i].redeem_script = redeem_script
+        if witness_script is not None:
+            psbt.inputs[i].witness_script = witness_script
+    return psbt.serialize()
+
+def generate_corpus(count, seed=1, **options):
+    """Generates count PSBTs with the same options from a fixed seed."""
+    rng = random.Random(seed)
+    return [generate_psbt(rng, **options) for _ in range(count)]
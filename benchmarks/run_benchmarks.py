@@ -0,0 +1,201 @@
+"""
+Benchmark suite and regression gate for the analyzer's hot paths.
+
+Times PSBT parsing, address derivation, every coin selection strategy, the
+coin selection simulation, edit recomputation and the change heuristics on
+synthetic PSBTs (see
+psbt_generator.py), appends the results to a JSON history and flags any
+benchmark whose median got slower than the previous run on the same machine
+by more than the threshold. Fees come from a local stub server, so it runs
+fully offline.
+
+    python3 benchmarks/run_benchmarks.py
+    python3 benchmarks/run_benchmarks.py --filter coin_selection --threshold 0.1 --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from coin_selection import coin_selection, STRATEGIES
+import analysis_model
+import change_heuristics
+import edit_session
+import fast_psbt_parser
+import fee_service
+import psbt_analyzer
+import script_cache
+from psbt_generator import generate_corpus, random_spend, DEFAULT_MIX
+
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'history.json')
+
+def measure(fn, number, repeat):
+    """Runs fn number times per round and returns per-call timings over repeat rounds."""
+    fn()  # warm up caches and lazy imports
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(rounds), "min": min(rounds), "number": number, "repeat": repeat}
+
+def cycle(items):
+    """Returns a function handing out items round robin, so benchmarks don't replay one PSBT."""
+    state = {"i": 0}
+    def next_item():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return next_item
+
+def parse_benchmarks(fee_rates):
+    small = cycle(generate_corpus(20, seed=1, inputs=2, outputs=2))
+    large = cycle(generate_corpus(5, seed=2, inputs=20, outputs=3, parent_outputs=100))
+    return [
+        ("parse_psbt_input/fast/2x2", lambda: psbt_analyzer.parse_psbt_input(small(), True, fee_rates, 'fast'), 200),
+        ("parse_psbt_input/bitcointx/2x2", lambda: psbt_analyzer.parse_psbt_input(small(), True, fee_rates, 'bitcointx'), 50),
+        ("parse_psbt_input/fast/20x3_legacy_parents", lambda: psbt_analyzer.parse_psbt_input(large(), True, fee_rates, 'fast'), 20),
+        ("parse_psbt_input/bitcointx/20x3_legacy_parents", lambda: psbt_analyzer.parse_psbt_input(large(), True, fee_rates, 'bitcointx'), 2),
+    ]
+
+def script_benchmarks():
+    rng = random.Random(3)
+    # Mostly recurring scripts, like a wallet paying to the same change descriptors
+    hot = [random_spend(rng, script_type)[0] for script_type in DEFAULT_MIX for _ in range(20)]
+    scripts = cycle([rng.choice(hot) if rng.random() < 0.8 else random_spend(rng, rng.choice(list(DEFAULT_MIX)))[0] for _ in range(5000)])
+    cache = script_cache.ScriptInfoCache(maxsize=4096)
+    return [
+        ("get_script_and_address_info/uncached", lambda: psbt_analyzer.derive_script_and_address_info(scripts()), 2000),
+        ("get_script_and_address_info/cached", lambda: cache.get_or_compute(scripts(), psbt_analyzer.derive_script_and_address_info), 2000),
+    ]
+
+def coin_selection_benchmarks():
+    rng = random.Random(4)
+    utxos = [{'amount': rng.randint(5_000, 5_000_000), 'script_type': 'witness_v0_keyhash', 'estimated_vbytes': 68} for _ in range(500)]
+    target = sum(utxo['amount'] for utxo in utxos) // 20
+    benchmarks = []
+    for strategy in STRATEGIES:
+        number = 2 if strategy in ('branch_and_bound', 'knapsack') else 20
+        benchmarks.append((f"coin_selection/{strategy}", lambda strategy=strategy: coin_selection(utxos, target, 10, strategy, seed=1), number))
+    return benchmarks
+
+def analysis_benchmarks(fee_rates):
+    raw = generate_corpus(1, seed=5, inputs=50, outputs=4)[0]
+    analysis = psbt_analyzer.parse_psbt_analysis(raw, True, fee_rates)
+    parsed_data = analysis.to_dict()
+
+    def edit_and_finalize():
+        session = edit_session.EditSession(analysis, fee_rates)
+        for i in range(50):
+            session.add_input(100_000 + i, 'witness_v0_keyhash')
+            session.set_output_amount(i % len(session.outputs), 50_000 + i)
+        session.remove_input(0)
+        session.undo()
+        return session.finalize()
+
+    return [
+        ("simulate_coin_selection/50_inputs", lambda: psbt_analyzer.simulate_coin_selection(parsed_data, 10, seed=1), 5),
+        ("edit_session/100_edits_finalize", edit_and_finalize, 50),
+    ]
+
+def heuristics_benchmarks():
+    rng = random.Random(6)
+    address_types = ['P2WPKHBitcoinAddress', 'P2TRBitcoinAddress', 'P2PKHBitcoinAddress']
+    # Analysis records rather than a PSBT, generating a 1000 input PSBT takes far longer than the rules
+    inputs = [analysis_model.InputInfo(rng.randint(10_000, 10**8), 'witness_v0_keyhash', f"input{i}", rng.choice(address_types), 68, 272, 'estimated') for i in range(1000)]
+    outputs = [analysis_model.OutputInfo(rng.choice([1_000_000, rng.randint(10_000, 10**8)]), 'witness_v0_keyhash', f"output{i}", rng.choice(address_types), 31) for i in range(1000)]
+    psbt_outputs = [fast_psbt_parser.Output() for _ in outputs]
+    return [
+        ("change_heuristics/1000x1000", lambda: change_heuristics.evaluate_change(inputs, outputs, psbt_outputs, 10_000), 20),
+    ]
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def machine_id():
+    return f"{platform.node()}/{platform.machine()}/python{platform.python_version()}"
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_history(path, history):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+def find_regressions(results, previous, threshold):
+    """Returns (name, previous median, median) for every benchmark more than threshold slower."""
+    regressions = []
+    for name, result in results.items():
+        before = previous["results"].get(name) if previous else None
+        if before and result["median"] > before["median"] * (1 + threshold):
+            regressions.append((name, before["median"], result["median"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzer benchmark suite")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON file the results are appended to")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown of the median that counts as a regression")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per benchmark")
+    parser.add_argument("--no-record", action="store_true", help="Compare against the history without appending to it")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if anything regressed")
+    args = parser.parse_args()
+
+    # Fees come from a local stub so the suite never touches the network
+    server, url = fee_service.start_stub_server()
+    fee_service.configure(url=url)
+    fee_rates = fee_service.get_recommended_fees()
+    psbt_analyzer.console.quiet = True
+
+    benchmarks = parse_benchmarks(fee_rates) + script_benchmarks() + coin_selection_benchmarks() + analysis_benchmarks(fee_rates) + heuristics_benchmarks()
+    if args.filter:
+        benchmarks = [benchmark for benchmark in benchmarks if args.filter in benchmark[0]]
+
+    results = {}
+    for name, fn, number in benchmarks:
+        results[name] = measure(fn, number, args.repeat)
+        print(f"{name:50} {results[name]['median'] * 1000:10.3f}ms  (min {results[name]['min'] * 1000:.3f}ms)")
+    server.shutdown()
+
+    history = load_history(args.history)
+    machine = machine_id()
+    previous = next((run for run in reversed(history) if run["machine"] == machine), None)
+    regressions = find_regressions(results, previous, args.threshold)
+    if previous:
+        print(f"\nCompared with {previous['commit'] or 'unknown commit'} from {previous['timestamp']}:")
+        for name, before, after in regressions:
+            print(f"  REGRESSION {name}: {before * 1000:.3f}ms -> {after * 1000:.3f}ms (+{after / before - 1:.0%})")
+        if not regressions:
+            print(f"  no regressions beyond {args.threshold:.0%}")
+
+    if not args.no_record:
+        history.append({
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "commit": git_commit(),
+            "machine": machine,
+            "results": results,
+        })
+        save_history(args.history, history)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from collections import Counter
+
+# Amounts that are a multiple of this many sats are round, payments usually are and change rarely is
+ROUND_AMOUNT = 100_000
+
+# Score an output needs to be picked as the likely change
+CHANGE_THRESHOLD = 0.5
+
+class HeuristicContext:
+    """
+    Everything the rules compare an output against, indexed once per PSBT:
+    sets of the inputs' address types and addresses, the input totals and
+    how many outputs pay each amount. Every rule is then O(1) per output, so
+    evaluating a PSBT stays linear in its inputs plus outputs.
+    """
+    __slots__ = ('input_address_types', 'input_addresses', 'input_count', 'total_input', 'smallest_input',
+                 'fee', 'output_count', 'amount_counts', 'most_repeated_amount')
+
+    def __init__(self, inputs, outputs, fee):
+        self.input_address_types = {inp.address_type for inp in inputs}
+        self.input_addresses = {inp.address for inp in inputs}
+        self.input_count = len(inputs)
+        self.total_input = sum(inp.amount for inp in inputs)
+        self.smallest_input = min((inp.amount for inp in inputs), default=0)
+        self.fee = fee
+        self.output_count = len(outputs)
+        self.amount_counts = Counter(out.amount for out in outputs)
+        self.most_repeated_amount = max(self.amount_counts.values(), default=0)
+
+def derivation_rule(ctx, out, psbt_out):
+    # Only the wallet's own outputs come with derivation paths or scripts
+    if getattr(psbt_out, 'bip32_derivation', None) or psbt_out.redeem_script or psbt_out.witness_script:
+        return (1.0, "Has BIP32 derivation or script metadata")
+    return None
+
+def standard_output_rule(ctx, out, psbt_out):
+    if out.address_type == "Non-standard":
+        return (-1.0, "Non-standard or data carrier output")
+    return None
+
+def script_type_rule(ctx, out, psbt_out):
+    if out.address_type in ctx.input_address_types:
+        return (0.3, "Same address type as the inputs")
+    return (-0.2, "Address type not used by any input")
+
+def round_amount_rule(ctx, out, psbt_out):
+    if out.amount % ROUND_AMOUNT == 0:
+        return (-0.3, "Round amount, typical of payments")
+    return (0.2, "Non-round amount")
+
+def address_reuse_rule(ctx, out, psbt_out):
+    if out.address in ctx.input_addresses:
+        return (-0.5, "Reuses an input address, change normally goes to a fresh one")
+    return None
+
+def unnecessary_input_rule(ctx, out, psbt_out):
+    # Were this the payment, the wallet could have left its smallest input out
+    if ctx.input_count > 1 and ctx.output_count > 1 and ctx.total_input - ctx.smallest_input >= out.amount + ctx.fee:
+        return (0.3, "Paying it alone wouldn't need every input")
+    return None
+
+def equal_output_rule(ctx, out, psbt_out):
+    count = ctx.amount_counts[out.amount]
+    if count > 1:
+        return (-0.5, f"Same amount as {count - 1} other output(s), a coinjoin pattern")
+    if ctx.most_repeated_amount > 2:
+        return (0.2, "Odd amount next to equal outputs, like coinjoin change")
+    return None
+
+# Evaluated in order for every output, each returns (score, reason) or None when it doesn't apply
+RULES = [derivation_rule, standard_output_rule, script_type_rule, round_amount_rule,
+         address_reuse_rule, unnecessary_input_rule, equal_output_rule]
+
+def score_output(ctx, index, out, psbt_out, rules=RULES):
+    """
+    Runs the rules on one output. Returns its {"index", "score", "reasons"}
+    candidate and the reasons that count towards it being change.
+    """
+    score = 0.0
+    reasons = []
+    supporting = []
+    for rule in rules:
+        result = rule(ctx, out, psbt_out)
+        if result is not None:
+            score += result[0]
+            reasons.append(result[1])
+            if result[0] > 0:
+                supporting.append(result[1])
+    return ({"index": index, "score": round(score, 2), "reasons": reasons}, supporting)
+
+def evaluate_change(inputs, outputs, psbt_outputs, fee, rules=RULES, threshold=CHANGE_THRESHOLD):
+    """
+    Scores every output of a PSBT as change with the given rules. inputs and
+    outputs are the analysis' InputInfo and OutputInfo records, psbt_outputs
+    the PSBT's own outputs (for derivation paths and scripts). Returns
+    (change_index, change_reason, candidates): the highest scoring output at
+    or above threshold (-1 if none, the last one on a tie) with the reasons
+    supporting it, and the scored candidates of all outputs in order.
+    """
+    ctx = HeuristicContext(inputs, outputs, fee)
+    candidates = []
+    change_index = -1
+    change_reason = ""
+    best = threshold
+    for i, (out, psbt_out) in enumerate(zip(outputs, psbt_outputs)):
+        candidate, supporting = score_output(ctx, i, out, psbt_out, rules)
+        candidates.append(candidate)
+        if candidate["score"] >= best:
+            change_index = i
+            change_reason = "; ".join(supporting)
+            best = candidate["score"]
+    return (change_index, change_reason, candidates)
@@ -0,0 +1,279 @@
+import random
+
+DUST_THRESHOLD = 546  # dust threshold approx
+LONG_TERM_FEE_RATE = 10  # sats/vB we expect to pay to spend change later, used for the waste metric
+CHANGE_SPEND_VBYTES = 68  # cost of eventually spending a (P2WPKH) change output
+MIN_CHANGE = 50000  # change single random draw and knapsack aim for, like Bitcoin Core's CHANGE_LOWER
+MAX_TRIES = 100000  # search budget shared by branch and bound and knapsack
+
+STRATEGIES = ['largest_first', 'smallest_first', 'random', 'branch_and_bound', 'single_random_draw', 'knapsack']
+
+def varint_len(count):
+    return 1 if count < 253 else 3
+
+def estimate_tx_vsize(num_inputs, num_outputs, input_vbytes_list, output_vbytes_list):
+    """Estimate total vsize for edited PSBTs."""
+    base_size = 10  # version + locktime
+    input_varint = 1 if num_inputs < 253 else 3
+    output_varint = 1 if num_outputs < 253 else 3
+    total_input_vbytes = sum(input_vbytes_list)
+    total_output_vbytes = sum(output_vbytes_list)
+    return base_size + input_varint + output_varint + total_input_vbytes + total_output_vbytes
+
+class SelectionContext:
+    """Everything about the transaction being funded that doesn't depend on which coins are picked."""
+
+    def __init__(self, target, fee_rate, change_output_vbytes, target_output_vbytes, num_outputs, long_term_fee_rate, change_spend_vbytes):
+        self.target = target
+        self.fee_rate = fee_rate
+        self.change_output_vbytes = change_output_vbytes
+        self.num_outputs = num_outputs
+        self.long_term_fee_rate = long_term_fee_rate
+        self.target_output_vbytes_total = sum(target_output_vbytes)
+        # Fixed part of the vsize (everything but the inputs and their count) with and without change
+        self.base_no_change = 10 + varint_len(num_outputs) + self.target_output_vbytes_total
+        self.base_with_change = 10 + varint_len(num_outputs + 1) + self.target_output_vbytes_total + change_output_vbytes
+        self.cost_of_change = int(change_output_vbytes * fee_rate + change_spend_vbytes * long_term_fee_rate)
+
+    def vsize(self, num_inputs, input_vbytes, with_change):
+        base = self.base_with_change if with_change else self.base_no_change
+        return base + varint_len(num_inputs) + input_vbytes
+
+    def effective_value(self, utxo):
+        return utxo['amount'] - int(utxo['estimated_vbytes'] * self.fee_rate)
+
+    def waste(self, input_vbytes, change, excess):
+        """Bitcoin Core's waste metric: fee paid now vs later, plus the cost of change or the excess dropped to fees."""
+        timing_cost = input_vbytes * (self.fee_rate - self.long_term_fee_rate)
+        return int(timing_cost + (self.cost_of_change if change else excess))
+
+def selection_result(ctx, selected, total, input_vbytes, fee, change, vsize, excess=0):
+    return {
+        'selected': [s['amount'] for s in selected],
+        'total_input': total,
+        'fee': fee,
+        'change': change,
+        'vsize': vsize,
+        'effective_rate': fee / vsize,
+        'waste': ctx.waste(input_vbytes, change, excess),
+    }
+
+def finalize_selection(ctx, selected, force_no_change=False):
+    """Builds the result for a fixed set of coins, adding change if it isn't dust, otherwise None."""
+    total = sum(s['amount'] for s in selected)
+    input_vbytes = sum(s['estimated_vbytes'] for s in selected)
+    if not force_no_change:
+        vsize = ctx.vsize(len(selected), input_vbytes, True)
+        fee = int(vsize * ctx.fee_rate)
+        change = total - ctx.target - fee
+        if change > DUST_THRESHOLD:
+            return selection_result(ctx, selected, total, input_vbytes, fee, change, vsize)
+    vsize = ctx.vsize(len(selected), input_vbytes, False)
+    fee = int(vsize * ctx.fee_rate)
+    if total >= ctx.target + fee:
+        return selection_result(ctx, selected, total, input_vbytes, total - ctx.target, 0, vsize, excess=total - ctx.target - fee)
+    return None
+
+def greedy_selection(ctx, utxos, force_no_change):
+    """Adds coins in the given order until the target and fee are covered, keeping running totals."""
+    selected = []
+    total = 0
+    input_vbytes = 0
+    for utxo in utxos:
+        selected.append(utxo)
+        total += utxo['amount']
+        input_vbytes += utxo['estimated_vbytes']
+
+        if force_no_change:
+            # Only try no change
+            vsize = ctx.vsize(len(selected), input_vbytes, False)
+            min_fee = int(vsize * ctx.fee_rate)
+            if total >= ctx.target + min_fee:
+                # excess goes to fee
+                return selection_result(ctx, selected, total, input_vbytes, total - ctx.target, 0, vsize, excess=total - ctx.target - min_fee)
+        else:
+            # Estimate vsize with change output if needed
+            vsize = ctx.vsize(len(selected), input_vbytes, True)
+            fee = int(vsize * ctx.fee_rate)  # int for sats
+            if total >= ctx.target + fee:
+                change = total - ctx.target - fee
+                if change > DUST_THRESHOLD:
+                    return selection_result(ctx, selected, total, input_vbytes, fee, change, vsize)
+                # No change, add excess to fee if any
+                vsize = ctx.vsize(len(selected), input_vbytes, False)
+                fee = int(vsize * ctx.fee_rate)
+                if total >= ctx.target + fee:
+                    return selection_result(ctx, selected, total, input_vbytes, total - ctx.target, 0, vsize, excess=total - ctx.target - fee)
+    return None  # Insufficient funds
+
+def branch_and_bound(ctx, utxos, max_tries=MAX_TRIES):
+    """
+    Depth-first search for a changeless input set whose effective value lands in
+    [target, target + cost_of_change], keeping the one with the lowest waste.
+    Like Bitcoin Core's SelectCoinsBnB the search gives up after max_tries steps.
+    """
+    pool = sorted((u for u in utxos if ctx.effective_value(u) > 0), key=ctx.effective_value, reverse=True)
+    values = [ctx.effective_value(u) for u in pool]
+    vbytes = [u['estimated_vbytes'] for u in pool]
+    # Fee for the non-input part of a changeless transaction, input count varint assumed to be 1 byte
+    selection_target = ctx.target + int((ctx.base_no_change + 1) * ctx.fee_rate)
+    upper_bound = selection_target + ctx.cost_of_change
+    timing_rate = ctx.fee_rate - ctx.long_term_fee_rate
+
+    available = sum(values)
+    if available < selection_target:
+        return None
+
+    best = None
+    best_waste = None
+    selection = []  # indexes into pool of the coins on the current branch
+    value = 0
+    timing_waste = 0
+    index = 0
+    for _ in range(max_tries):
+        backtrack = False
+        if value + available < selection_target or value > upper_bound or (best_waste is not None and timing_rate > 0 and timing_waste > best_waste):
+            backtrack = True
+        elif value >= selection_target:
+            waste = timing_waste + (value - selection_target)
+            if best_waste is None or waste <= best_waste:
+                best = list(selection)
+                best_waste = waste
+            backtrack = True
+
+        if backtrack:
+            if not selection:
+                break
+            # Give the coins skipped since the last included one back to the lookahead, then try omitting it
+            index -= 1
+            while index > selection[-1]:
+                available += values[index]
+                index -= 1
+            last = selection.pop()
+            value -= values[last]
+            timing_waste -= vbytes[last] * timing_rate
+        else:
+            available -= values[index]
+            # Skip the inclusion branch if the previous coin is identical and was just omitted
+            if not selection or selection[-1] == index - 1 or values[index] != values[index - 1] or vbytes[index] != vbytes[index - 1]:
+                selection.append(index)
+                value += values[index]
+                timing_waste += vbytes[index] * timing_rate
+        index += 1
+
+    if best is None:
+        return None
+    return finalize_selection(ctx, [pool[i] for i in best], force_no_change=True)
+
+def single_random_draw(ctx, utxos, rng):
+    """Picks coins in random order until their effective value covers the target, fees and MIN_CHANGE."""
+    selected = []
+    value = 0
+    input_vbytes = 0
+    for utxo in rng.sample(utxos, len(utxos)):
+        effective = ctx.effective_value(utxo)
+        if effective <= 0:
+            continue
+        selected.append(utxo)
+        value += effective
+        input_vbytes += utxo['estimated_vbytes']
+        if value >= ctx.target + int(ctx.vsize(len(selected), 0, True) * ctx.fee_rate) + MIN_CHANGE:
+            return finalize_selection(ctx, selected)
+    # Couldn't reach the preferred change amount, settle for whatever covers the target
+    return finalize_selection(ctx, selected) if selected else None
+
+def knapsack(ctx, utxos, rng, max_tries=MAX_TRIES):
+    """
+    Bitcoin Core's knapsack solver: take an exact match if there is one,
+    otherwise run randomized passes of ApproximateBestSubset over the smaller
+    coins and compare with the smallest single coin that covers the target.
+    """
+    target = ctx.target + int(ctx.vsize(1, 0, True) * ctx.fee_rate)
+    smaller = []
+    lowest_larger = None
+    for utxo in utxos:
+        effective = ctx.effective_value(utxo)
+        if effective <= 0:
+            continue
+        if effective == target:
+            return finalize_selection(ctx, [utxo])
+        if effective < target + MIN_CHANGE:
+            smaller.append((effective, utxo))
+        elif lowest_larger is None or effective < ctx.effective_value(lowest_larger):
+            lowest_larger = utxo
+
+    smaller_total = sum(effective for effective, _ in smaller)
+    if smaller_total < target:
+        return finalize_selection(ctx, [lowest_larger]) if lowest_larger is not None else None
+    if smaller_total == target:
+        return finalize_selection(ctx, [utxo for _, utxo in smaller])
+
+    smaller.sort(key=lambda item: item[0], reverse=True)
+    best = approximate_best_subset(smaller, target + MIN_CHANGE, rng, max_tries)
+    best_value = sum(smaller[i][0] for i in best)
+    if best_value < target + MIN_CHANGE:
+        # Couldn't hit the preferred change, retry aiming at the bare target
+        best = approximate_best_subset(smaller, target, rng, max_tries)
+        best_value = sum(smaller[i][0] for i in best)
+
+    if lowest_larger is not None and (best_value < target or ctx.effective_value(lowest_larger) <= best_value):
+        return finalize_selection(ctx, [lowest_larger])
+    return finalize_selection(ctx, [smaller[i][1] for i in best])
+
+def approximate_best_subset(items, target, rng, max_tries):
+    """Randomized passes keeping the smallest subset total that still reaches target."""
+    count = len(items)
+    best_value = sum(value for value, _ in items)
+    best = None
+    repetitions = max(1, min(1000, max_tries // max(count, 1)))
+    for _ in range(repetitions):
+        if best_value == target:
+            break
+        included = [False] * count
+        kept = []  # only ever appended to within a repetition, so a prefix length identifies a subset
+        total = 0
+        reached = False
+        for npass in range(2):
+            if reached:
+                break
+            for i in range(count):
+                # First pass includes coins at random, the second fills in what the first skipped
+                if (rng.random() < 0.5 if npass == 0 else not included[i]):
+                    total += items[i][0]
+                    if total >= target:
+                        reached = True
+                        if total < best_value:
+                            best_value = total
+                            best = (kept, len(kept), i)
+                        total -= items[i][0]
+                    else:
+                        included[i] = True
+                        kept.append(i)
+    if best is None:
+        return list(range(count))
+    kept, length, last = best
+    return kept[:length] + [last]
+
+def coin_selection(utxos, target, fee_rate, strategy='largest_first', change_output_vbytes=34, target_output_vbytes=[34], force_no_change=False, num_outputs=0, long_term_fee_rate=LONG_TERM_FEE_RATE, seed=None, max_tries=MAX_TRIES, change_spend_vbytes=CHANGE_SPEND_VBYTES):
+    """
+    Coin selection simulation based on strategy. Every result carries the
+    Bitcoin Core waste score of the selection so strategies can be compared.
+    Pass seed for reproducible random, single_random_draw and knapsack runs.
+    """
+    ctx = SelectionContext(target, fee_rate, change_output_vbytes, target_output_vbytes, num_outputs, long_term_fee_rate, change_spend_vbytes)
+    rng = random.Random(seed) if seed is not None else random
+
+    if strategy == 'smallest_first':
+        return greedy_selection(ctx, sorted(utxos, key=lambda x: x['amount']), force_no_change)
+    elif strategy == 'largest_first':
+        return greedy_selection(ctx, sorted(utxos, key=lambda x: x['amount'], reverse=True), force_no_change)
+    elif strategy == 'random':
+        return greedy_selection(ctx, rng.sample(utxos, len(utxos)), force_no_change)
+    elif strategy == 'branch_and_bound':
+        return branch_and_bound(ctx, utxos, max_tries)
+    elif strategy == 'single_random_draw':
+        return None if force_no_change else single_random_draw(ctx, utxos, rng)
+    elif strategy == 'knapsack':
+        return None if force_no_change else knapsack(ctx, utxos, rng, max_tries)
+    else:
+        raise ValueError("Unknown strategy")
@@ -0,0 +1,103 @@
+import numpy as np
+from coin_selection import DUST_THRESHOLD
+
+SWEEP_STRATEGIES = ['largest_first', 'smallest_first', 'random']
+
+# Upper bound on the (fee rate x UTXO) cells evaluated at once, keeps memory flat for huge sweeps
+MAX_CELLS = 4_000_000
+
+def utxo_arrays(utxos):
+    """Packs UTXO dicts into contiguous amount and vbyte arrays."""
+    amounts = np.fromiter((u['amount'] for u in utxos), dtype=np.int64, count=len(utxos))
+    vbytes = np.fromiter((u['estimated_vbytes'] for u in utxos), dtype=np.int64, count=len(utxos))
+    return (amounts, vbytes)
+
+def strategy_order(amounts, strategy, rng):
+    """Returns the order in which a greedy strategy adds coins."""
+    if strategy == 'largest_first':
+        return np.argsort(-amounts, kind='stable')
+    if strategy == 'smallest_first':
+        return np.argsort(amounts, kind='stable')
+    if strategy == 'random':
+        return rng.permutation(len(amounts))
+    raise ValueError("Unknown strategy")
+
+def sweep_strategy(cum_amount, vsize_change, vsize_no_change, target, fee_rates, force_no_change):
+    """
+    Evaluates one greedy coin ordering at every fee rate, returning the index of
+    the last selected coin (-1 if unfunded), the fee, the change and the vsize.
+    Mirrors coin_selection: the first prefix that covers the target plus fee
+    wins, with change only if it is above the dust threshold.
+    """
+    rows = np.arange(len(fee_rates))
+    rates = fee_rates[:, None]
+    fee_no_change = np.floor(vsize_no_change[None, :] * rates).astype(np.int64)
+    fee_change = np.floor(vsize_change[None, :] * rates).astype(np.int64)
+    covered = cum_amount[None, :] >= target + (fee_no_change if force_no_change else fee_change)
+
+    last = np.argmax(covered, axis=1)
+    funded = covered[rows, last]
+    total = cum_amount[last]
+
+    change = total - target - fee_change[rows, last]
+    has_change = np.zeros(len(fee_rates), dtype=bool) if force_no_change else change > DUST_THRESHOLD
+
+    # Without change any excess goes to the fee
+    fee = np.where(has_change, fee_change[rows, last], total - target)
+    change = np.where(has_change, change, 0)
+    vsize = np.where(has_change, vsize_change[last], vsize_no_change[last])
+    return (np.where(funded, last, -1), fee, change, vsize)
+
+def simulate_fee_rate_grid(utxos, target, fee_rates, change_output_vbytes=34, target_output_vbytes=[34], force_no_change=False, num_outputs=0, strategies=SWEEP_STRATEGIES, seed=None):
+    """
+    Runs the greedy coin selection strategies over a whole grid of fee rates in
+    vectorized form. utxos may be a list of UTXO dicts or an (amounts, vbytes)
+    pair of arrays. Returns a columnar table with one row per (strategy, fee rate).
+    """
+    amounts, vbytes = utxos if isinstance(utxos, tuple) else utxo_arrays(utxos)
+    fee_rates = np.asarray(fee_rates, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    count = len(amounts)
+
+    input_counts = np.arange(1, count + 1)
+    input_varint = np.where(input_counts < 253, 1, 3)
+    output_vbytes = sum(target_output_vbytes)
+    base_no_change = 10 + (1 if num_outputs < 253 else 3) + output_vbytes
+    base_change = 10 + (1 if num_outputs + 1 < 253 else 3) + output_vbytes + change_output_vbytes
+
+    strategy_column = []
+    columns = {key: [] for key in ['fee_rate', 'selected_count', 'total_input', 'fee', 'change', 'vsize']}
+    block = max(1, MAX_CELLS // max(count, 1))
+    for strategy in strategies:
+        order = strategy_order(amounts, strategy, rng)
+        # Trailing zero so an unfunded row (index -1) reads as an empty selection
+        cum_amount = np.concatenate([np.cumsum(amounts[order]), [0]])
+        cum_vbytes = np.cumsum(vbytes[order])
+        vsize_change = np.concatenate([base_change + input_varint + cum_vbytes, [0]])
+        vsize_no_change = np.concatenate([base_no_change + input_varint + cum_vbytes, [0]])
+
+        for start in range(0, len(fee_rates), block):
+            rates = fee_rates[start:start + block]
+            if count:
+                last, fee, change, vsize = sweep_strategy(cum_amount[:-1], vsize_change[:-1], vsize_no_change[:-1], target, rates, force_no_change)
+            else:
+                last = np.full(len(rates), -1)
+                fee = change = vsize = np.zeros(len(rates), dtype=np.int64)
+            funded = last >= 0
+            strategy_column.extend([strategy] * len(rates))
+            columns['fee_rate'].append(rates)
+            columns['selected_count'].append(last + 1)
+            columns['total_input'].append(cum_amount[last])
+            columns['fee'].append(np.where(funded, fee, 0))
+            columns['change'].append(np.where(funded, change, 0))
+            columns['vsize'].append(np.where(funded, vsize, 0))
+
+    table = {key: np.concatenate(values) for key, values in columns.items()}
+    table['effective_rate'] = np.divide(table['fee'], table['vsize'], out=np.zeros(len(strategy_column)), where=table['vsize'] > 0)
+    table['strategy'] = strategy_column
+    return table
+
+def table_rows(table):
+    """Converts a columnar sweep table into a list of row dicts."""
+    keys = list(table.keys())
+    return [{key: table[key][i].item() if hasattr(table[key][i], 'item') else table[key][i] for key in keys} for i in range(len(table['strategy']))]
@@ -0,0 +1,25 @@
+class LazyConsole:
+    """
+    Stands in for a Rich Console and only imports Rich the first time something
+    is printed, so machine-readable runs never pay for it. Setting quiet drops
+    every message without creating the console at all.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.quiet = False
+        self._console = None
+
+    def get(self):
+        """Returns the underlying Rich Console, creating it on first use."""
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(**self.options)
+        return self._console
+
+    def print(self, *args, **kwargs):
+        if not self.quiet:
+            self.get().print(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
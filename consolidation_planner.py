@@ -0,0 +1,185 @@
+import bisect
+import csv
+import json
+import math
+import os
+from collections import namedtuple
+from coin_selection import DUST_THRESHOLD, varint_len
+import script_classifier
+
+# Largest transaction Bitcoin Core relays (MAX_STANDARD_TX_WEIGHT)
+MAX_STANDARD_TX_WEIGHT = 400_000
+
+Utxo = namedtuple('Utxo', ['id', 'wallet', 'script_type', 'amount'])
+
+class UtxoGroup:
+    """
+    The UTXOs of one wallet and script type, sorted by amount so the coins
+    worth spending at a fee rate are a suffix found by bisection. Coins are
+    consumed from the low end of that suffix through a cursor, so planning
+    never rescans the list.
+    """
+    __slots__ = ('wallet', 'script_type', 'input_vbytes', 'amounts', 'ids', 'cursor', 'planned', 'planned_value')
+
+    def __init__(self, wallet, script_type, utxos):
+        utxos = sorted(utxos, key=lambda utxo: utxo.amount)
+        self.wallet = wallet
+        self.script_type = script_type
+        self.input_vbytes = script_classifier.input_vbytes(script_type)
+        self.amounts = [utxo.amount for utxo in utxos]
+        self.ids = [utxo.id for utxo in utxos]
+        self.cursor = 0
+        self.planned = 0
+        self.planned_value = 0
+
+    def economical_start(self, fee_rate):
+        """Index of the first coin worth more than it costs to spend at fee_rate."""
+        return bisect.bisect_right(self.amounts, fee_rate * self.input_vbytes)
+
+def utxo_from_record(record, wallet, index):
+    """Builds a Utxo from a CSV row or JSON object with an amount (sats) and a script_type or script_pubkey."""
+    script_type = record.get('script_type')
+    if not script_type:
+        script_pubkey = record.get('script_pubkey') or record.get('scriptPubKey')
+        if not script_pubkey:
+            raise ValueError(f"UTXO {index} of {wallet} has neither a script_type nor a script_pubkey")
+        script_type = script_classifier.classify_script(bytes.fromhex(script_pubkey))
+    if record.get('txid') not in (None, ''):
+        utxo_id = f"{record['txid']}:{record.get('vout', 0)}"
+    else:
+        utxo_id = f"{wallet}#{index}"
+    return Utxo(utxo_id, record.get('wallet') or wallet, script_type, int(record['amount']))
+
+def load_inventory(path):
+    """
+    Loads a UTXO inventory from a CSV file with a header row or a JSON list
+    (or {"utxos": [...]}). Each UTXO has an amount in sats and a script_type or
+    script_pubkey, optionally a txid/vout and a wallet, which defaults to the
+    file name.
+    """
+    wallet = os.path.splitext(os.path.basename(path))[0]
+    with open(path, 'r', newline='') as f:
+        head = f.read(1024).lstrip()
+        f.seek(0)
+        if head.startswith(('[', '{')):
+            data = json.load(f)
+            records = data['utxos'] if isinstance(data, dict) else data
+        else:
+            records = csv.DictReader(f)
+        return [utxo_from_record(record, wallet, i) for i, record in enumerate(records)]
+
+def group_utxos(utxos):
+    """Splits UTXOs into UtxoGroups by wallet and script type, heaviest inputs first."""
+    by_key = {}
+    for utxo in utxos:
+        by_key.setdefault((utxo.wallet, utxo.script_type), []).append(utxo)
+    groups = [UtxoGroup(wallet, script_type, members) for (wallet, script_type), members in by_key.items()]
+    # Consolidating the heaviest inputs at a low rate saves the most, they go first when windows fill up
+    groups.sort(key=lambda group: (-group.input_vbytes, group.wallet, group.script_type))
+    return groups
+
+def consolidation_vsize(num_inputs, input_vbytes, output_vbytes):
+    """Vsize of a transaction spending num_inputs inputs of one type to a single output."""
+    return 10 + varint_len(num_inputs) + 1 + num_inputs * input_vbytes + output_vbytes
+
+def max_inputs_per_tx(input_vbytes, output_vbytes, max_tx_weight):
+    """How many inputs of input_vbytes fit in a consolidation transaction under max_tx_weight."""
+    max_vsize = max_tx_weight // 4
+    return max((max_vsize - 10 - 3 - 1 - output_vbytes) // input_vbytes, 0)
+
+def plan_group_transactions(group, start, end, fee_rate, output_vbytes, per_tx):
+    """
+    Splits the coins group.amounts[start:end] into as few transactions as fit,
+    balanced so the last one isn't left with a handful of inputs.
+    """
+    count = end - start
+    num_txs = math.ceil(count / per_tx)
+    transactions = []
+    for tx_index in range(num_txs):
+        tx_start = start + count * tx_index // num_txs
+        tx_end = start + count * (tx_index + 1) // num_txs
+        num_inputs = tx_end - tx_start
+        input_value = sum(group.amounts[tx_start:tx_end])
+        vsize = consolidation_vsize(num_inputs, group.input_vbytes, output_vbytes)
+        fee = math.ceil(fee_rate * vsize)
+        transactions.append({
+            'wallet': group.wallet,
+            'script_type': group.script_type,
+            'inputs': num_inputs,
+            'input_value': input_value,
+            'vsize': vsize,
+            'weight': vsize * 4,
+            'fee': fee,
+            'fee_rate': fee / vsize,
+            'output_value': input_value - fee,
+            'utxos': group.ids[tx_start:tx_end],
+        })
+    return transactions
+
+def plan_consolidation(utxos, fee_schedule, max_tx_weight=MAX_STANDARD_TX_WEIGHT, max_txs_per_window=None, output_type='witness_v0_keyhash', min_inputs=2):
+    """
+    Plans consolidation transactions for a UTXO inventory over a schedule of
+    fee rate windows. Every transaction spends coins of one wallet and script
+    type to a single output_type output and stays under max_tx_weight. Coins
+    are assigned to the cheapest window with room (max_txs_per_window, if
+    any), smallest first as they are the first to stop paying for themselves,
+    and a coin is only planned where it is worth more than its input costs.
+    Returns the windows in schedule order with their transactions, what was
+    left unplanned per group, and the totals.
+    """
+    groups = group_utxos(utxos)
+    output_vbytes = 8 + 1 + script_classifier.output_script_vbytes(output_type)
+    windows = [{'fee_rate': rate, 'transactions': []} for rate in fee_schedule]
+
+    for window in sorted(windows, key=lambda window: window['fee_rate']):
+        fee_rate = window['fee_rate']
+        room = max_txs_per_window
+        for group in groups:
+            if room is not None and room <= 0:
+                break
+            per_tx = max_inputs_per_tx(group.input_vbytes, output_vbytes, max_tx_weight)
+            # Coins below the threshold only get worse at the higher rates still to come
+            start = max(group.cursor, group.economical_start(fee_rate))
+            end = len(group.amounts)
+            if room is not None:
+                end = min(end, start + room * per_tx)
+            if end - start < max(min_inputs, 1) or per_tx == 0:
+                continue
+            transactions = plan_group_transactions(group, start, end, fee_rate, output_vbytes, per_tx)
+            # The output must not be dust, every coin covers its own input so only the overhead can cause it
+            transactions = [tx for tx in transactions if tx['output_value'] > DUST_THRESHOLD and tx['inputs'] >= min_inputs]
+            group.cursor = end
+            group.planned += sum(tx['inputs'] for tx in transactions)
+            group.planned_value += sum(tx['input_value'] for tx in transactions)
+            window['transactions'].extend(transactions)
+            if room is not None:
+                room -= len(transactions)
+
+    for window in windows:
+        transactions = window['transactions']
+        window['inputs'] = sum(tx['inputs'] for tx in transactions)
+        window['fee'] = sum(tx['fee'] for tx in transactions)
+        window['vsize'] = sum(tx['vsize'] for tx in transactions)
+
+    unplanned = []
+    for group in groups:
+        count = len(group.amounts) - group.planned
+        if count:
+            unplanned.append({
+                'wallet': group.wallet,
+                'script_type': group.script_type,
+                'count': count,
+                'value': sum(group.amounts) - group.planned_value,
+            })
+
+    all_transactions = [tx for window in windows for tx in window['transactions']]
+    totals = {
+        'utxos': sum(len(group.amounts) for group in groups),
+        'consolidated': sum(group.planned for group in groups),
+        'transactions': len(all_transactions),
+        'fee': sum(tx['fee'] for tx in all_transactions),
+        'vsize': sum(tx['vsize'] for tx in all_transactions),
+        'input_value': sum(tx['input_value'] for tx in all_transactions),
+        'output_value': sum(tx['output_value'] for tx in all_transactions),
+    }
+    return {'windows': windows, 'unplanned': unplanned, 'totals': totals}
@@ -0,0 +1,235 @@
+from collections import Counter
+import analysis_model
+import fee_service
+import psbt_analyzer
+import script_classifier
+
+DUST_THRESHOLD = 546
+
+def varint_len(count):
+    return 1 if count < 253 else 3
+
+class EditSession:
+    """
+    Programmatic editing of an analysis. Running totals of value, vbytes and
+    script type counts are updated in O(1) per edit, so resolve() can answer
+    what-if questions without rescanning the inputs and outputs. Every edit
+    is recorded so it can be undone and redone.
+    """
+
+    def __init__(self, analysis, fee_rates=None):
+        if isinstance(analysis, dict):
+            analysis = analysis_model.Analysis.from_dict(analysis)
+        self.analysis = analysis
+        self.fee_rates = fee_rates
+        self.inputs = list(analysis.inputs)
+        self.outputs = list(analysis.outputs)
+        self.input_value = sum(inp.amount for inp in self.inputs)
+        self.output_value = sum(out.amount for out in self.outputs)
+        self.input_vbytes = sum(inp.estimated_input_vbytes for inp in self.inputs)
+        self.output_vbytes = sum(out.estimated_output_vb for out in self.outputs)
+        self.script_type_counts = Counter(item.script_type for item in self.inputs + self.outputs)
+        self.undo_log = []
+        self.redo_log = []
+        self.warning = None
+        self.insufficient_funds = False
+
+    # Primitive operations, each with an exact inverse
+
+    def _insert_input(self, index, inp):
+        self.inputs.insert(index, inp)
+        self.input_value += inp.amount
+        self.input_vbytes += inp.estimated_input_vbytes
+        self.script_type_counts[inp.script_type] += 1
+
+    def _delete_input(self, index, inp):
+        del self.inputs[index]
+        self.input_value -= inp.amount
+        self.input_vbytes -= inp.estimated_input_vbytes
+        self.script_type_counts[inp.script_type] -= 1
+
+    def _insert_output(self, index, out):
+        self.outputs.insert(index, out)
+        self.output_value += out.amount
+        self.output_vbytes += out.estimated_output_vb
+        self.script_type_counts[out.script_type] += 1
+
+    def _delete_output(self, index, out):
+        del self.outputs[index]
+        self.output_value -= out.amount
+        self.output_vbytes -= out.estimated_output_vb
+        self.script_type_counts[out.script_type] -= 1
+
+    def _replace_output(self, index, old, new):
+        self._delete_output(index, old)
+        self._insert_output(index, new)
+
+    INVERSES = {
+        '_insert_input': '_delete_input',
+        '_delete_input': '_insert_input',
+        '_insert_output': '_delete_output',
+        '_delete_output': '_insert_output',
+    }
+
+    def _apply(self, op, args):
+        getattr(self, op)(*args)
+
+    def _undo_op(self, op, args):
+        if op == '_replace_output':
+            index, old, new = args
+            self._replace_output(index, new, old)
+        else:
+            getattr(self, self.INVERSES[op])(*args)
+
+    def _record(self, op, *args):
+        self._apply(op, args)
+        self.undo_log.append((op, args))
+        self.redo_log.clear()
+
+    # Public edits
+
+    def add_input(self, amount, script_type, address='edited', address_type='edited'):
+        estimated_vbytes = script_classifier.input_vbytes(script_type)
+        self._record('_insert_input', len(self.inputs), analysis_model.InputInfo(amount, script_type, address, address_type, estimated_vbytes))
+
+    def remove_input(self, index):
+        if not 0 <= index < len(self.inputs):
+            raise IndexError("Input index out of range")
+        self._record('_delete_input', index, self.inputs[index])
+
+    def add_output(self, amount, script_type, address='edited', address_type='edited'):
+        estimated_vb = script_classifier.output_script_vbytes(script_type)
+        self._record('_insert_output', len(self.outputs), analysis_model.OutputInfo(amount, script_type, address, address_type, estimated_vb))
+
+    def remove_output(self, index):
+        if not 0 <= index < len(self.outputs):
+            raise IndexError("Output index out of range")
+        self._record('_delete_output', index, self.outputs[index])
+
+    def set_output_amount(self, index, amount):
+        if not 0 <= index < len(self.outputs):
+            raise IndexError("Output index out of range")
+        old = self.outputs[index]
+        self._record('_replace_output', index, old, old.replace(amount=amount))
+
+    def undo(self):
+        """Reverts the last edit, returns False if there is nothing to undo."""
+        if not self.undo_log:
+            return False
+        op, args = self.undo_log.pop()
+        self._undo_op(op, args)
+        self.redo_log.append((op, args))
+        return True
+
+    def redo(self):
+        """Re-applies the last undone edit, returns False if there is nothing to redo."""
+        if not self.redo_log:
+            return False
+        op, args = self.redo_log.pop()
+        self._apply(op, args)
+        self.undo_log.append((op, args))
+        return True
+
+    # Results
+
+    def vsize(self, output_count=None, output_vbytes=None):
+        output_count = len(self.outputs) if output_count is None else output_count
+        output_vbytes = self.output_vbytes if output_vbytes is None else output_vbytes
+        return 10 + varint_len(len(self.inputs)) + varint_len(output_count) + self.input_vbytes + output_vbytes
+
+    def resolve(self, fee_rates=None):
+        """
+        Works out the fee and change for the current edits in O(1), the same way
+        the interactive editor always has: the last output is assumed to be
+        change and is resized to pay the hourFee rate, or dropped if it would be dust.
+        """
+        fee_rates = fee_rates or self.fee_rates or fee_service.get_recommended_fees()
+        vsize = self.vsize()
+        result = {
+            "vsize": vsize,
+            "total_input_value": self.input_value,
+            "total_output_value": self.output_value,
+            "change_index": -1,
+            "change_amount": None,
+            "drop_change": False,
+            "insufficient_funds": False,
+            "warning": None,
+        }
+
+        if len(self.outputs) <= 1:
+            # No change, excess to fee
+            result["inferred_fee"] = self.input_value - self.output_value
+            result["inferred_fee_rate"] = result["inferred_fee"] / vsize if vsize > 0 else 0
+            result["fee_suggestion"] = psbt_analyzer.fee_reasonableness_suggestion(result["inferred_fee_rate"], fee_rates)
+            return result
+
+        change = self.outputs[-1]
+        target = self.output_value - change.amount
+        fee_rate = fee_rates['hourFee']  # Use hourFee for reasonable confirmation
+        fee = int(vsize * fee_rate)
+        if self.input_value >= target + fee + DUST_THRESHOLD:
+            result.update({
+                "change_index": len(self.outputs) - 1,
+                "change_amount": self.input_value - target - fee,
+                "total_output_value": self.input_value - fee,
+                "inferred_fee": fee,
+                "inferred_fee_rate": fee_rate,
+                "fee_suggestion": psbt_analyzer.fee_reasonableness_suggestion(fee_rate, fee_rates),
+            })
+            return result
+
+        # Try without change
+        vsize_without_change = self.vsize(len(self.outputs) - 1, self.output_vbytes - change.estimated_output_vb)
+        if self.input_value >= target + int(vsize_without_change * fee_rate):
+            fee = self.input_value - target
+            result.update({
+                "vsize": vsize_without_change,
+                "drop_change": True,
+                "total_output_value": target,
+                "inferred_fee": fee,
+                "inferred_fee_rate": fee / vsize_without_change if vsize_without_change > 0 else 0,
+                "warning": "Change would be dust or negative; removing change output and adjusting fee.",
+            })
+            result["fee_suggestion"] = psbt_analyzer.fee_reasonableness_suggestion(result["inferred_fee_rate"], fee_rates)
+            return result
+
+        result.update({
+            "change_index": len(self.outputs) - 1,
+            "inferred_fee": self.input_value - self.output_value,
+            "inferred_fee_rate": 0,
+            "fee_suggestion": self.analysis.fee_suggestion,
+            "insufficient_funds": True,
+            "warning": "Insufficient funds even without change.",
+        })
+        return result
+
+    def finalize(self, fee_rates=None):
+        """Builds a new Analysis from the current edits without modifying the session."""
+        result = self.resolve(fee_rates)
+        self.warning = result["warning"]
+        self.insufficient_funds = result["insufficient_funds"]
+        outputs = list(self.outputs)
+        script_type_counts = self.script_type_counts
+        if result["drop_change"]:
+            dropped = outputs.pop()
+            script_type_counts = script_type_counts.copy()
+            script_type_counts[dropped.script_type] -= 1
+        elif result["change_index"] != -1:
+            change = outputs[-1]
+            amount = result["change_amount"] if result["change_amount"] is not None else change.amount
+            outputs[-1] = change.replace(amount=amount, reason="Assumed last output as change after edit")
+
+        return analysis_model.Analysis(
+            version=self.analysis.version,
+            inputs=self.inputs,
+            outputs=outputs,
+            inferred_fee=result["inferred_fee"],
+            inferred_fee_rate=result["inferred_fee_rate"],
+            vsize=result["vsize"],
+            change_index=result["change_index"],
+            fee_suggestion=result["fee_suggestion"],
+            total_input_value=result["total_input_value"],
+            total_output_value=result["total_output_value"],
+            script_summary=psbt_analyzer.summarize_script_types({script_type for script_type, count in script_type_counts.items() if count > 0}),
+            confirmation=self.analysis.confirmation if result["insufficient_funds"] else psbt_analyzer.confirmation_estimate(result["inferred_fee_rate"]),
+        )
@@ -0,0 +1,305 @@
+import hashlib
+import struct
+from collections import namedtuple
+from bitcointx.core.script import CScript
+import instrumentation
+import weight_engine
+
+PSBT_MAGIC = b'psbt\xff'
+
+# BIP174 key types the analysis reads, every other record is skipped by length
+PSBT_GLOBAL_UNSIGNED_TX = 0x00
+PSBT_GLOBAL_VERSION = 0xfb
+PSBT_IN_NON_WITNESS_UTXO = 0x00
+PSBT_IN_WITNESS_UTXO = 0x01
+PSBT_IN_PARTIAL_SIG = 0x02
+PSBT_IN_REDEEM_SCRIPT = 0x04
+PSBT_IN_WITNESS_SCRIPT = 0x05
+PSBT_IN_FINAL_SCRIPTSIG = 0x07
+PSBT_IN_FINAL_SCRIPTWITNESS = 0x08
+PSBT_OUT_REDEEM_SCRIPT = 0x00
+PSBT_OUT_WITNESS_SCRIPT = 0x01
+PSBT_OUT_BIP32_DERIVATION = 0x02
+
+# Taproot records are kept the way python-bitcointx exposes them, as unknown fields
+TAPROOT_INPUT_TYPES = (weight_engine.PSBT_IN_TAP_KEY_SIG, weight_engine.PSBT_IN_TAP_LEAF_SCRIPT)
+
+INT32 = struct.Struct('<i')
+UINT32 = struct.Struct('<I')
+INT64 = struct.Struct('<q')
+VARINT_SIZES = {0xfd: 2, 0xfe: 4, 0xff: 8}
+
+UnknownField = namedtuple('UnknownField', ['key_type', 'key_data', 'value'])
+
+class FastParseError(ValueError):
+    """The PSBT is malformed or uses something the fast parser doesn't handle."""
+
+class Reader:
+    """Bounds checked cursor over a memoryview, slices are views and never copies."""
+    __slots__ = ('view', 'pos')
+
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def read(self, n):
+        end = self.pos + n
+        if end > len(self.view):
+            raise FastParseError("Unexpected end of data")
+        data = self.view[self.pos:end]
+        self.pos = end
+        return data
+
+    def skip(self, n):
+        self.pos += n
+        if self.pos > len(self.view):
+            raise FastParseError("Unexpected end of data")
+
+    def unpack(self, fmt):
+        if self.pos + fmt.size > len(self.view):
+            raise FastParseError("Unexpected end of data")
+        value = fmt.unpack_from(self.view, self.pos)[0]
+        self.pos += fmt.size
+        return value
+
+    def varint(self):
+        first = self.read(1)[0]
+        if first < 0xfd:
+            return first
+        return int.from_bytes(self.read(VARINT_SIZES[first]), 'little')
+
+    def varbytes(self):
+        return self.read(self.varint())
+
+    def skip_varbytes(self):
+        self.skip(self.varint())
+
+    def at_end(self):
+        return self.pos == len(self.view)
+
+class TxOut:
+    __slots__ = ('nValue', 'scriptPubKey')
+
+    def __init__(self, nValue, scriptPubKey):
+        self.nValue = nValue
+        self.scriptPubKey = scriptPubKey
+
+class OutPoint:
+    __slots__ = ('hash', 'n')
+
+    def __init__(self, hash, n):
+        self.hash = hash
+        self.n = n
+
+class TxIn:
+    __slots__ = ('prevout',)
+
+    def __init__(self, prevout):
+        self.prevout = prevout
+
+class UnsignedTx:
+    __slots__ = ('nVersion', 'vin', 'vout', 'nLockTime')
+
+    def __init__(self, nVersion, vin, vout, nLockTime):
+        self.nVersion = nVersion
+        self.vin = vin
+        self.vout = vout
+        self.nLockTime = nLockTime
+
+class ParentTx:
+    """A non_witness_utxo reduced to the one output the PSBT spends, vout is keyed by index."""
+    __slots__ = ('vout',)
+
+    def __init__(self, vout):
+        self.vout = vout
+
+class Witness:
+    __slots__ = ('stack',)
+
+    def __init__(self, stack):
+        self.stack = stack
+
+class Input:
+    __slots__ = ('witness_utxo', 'non_witness_utxo', 'partial_sigs', 'redeem_script', 'witness_script',
+                 'final_script_sig', 'final_script_witness', 'unknown_fields')
+
+    def __init__(self):
+        self.witness_utxo = None
+        self.non_witness_utxo = None
+        self.partial_sigs = {}
+        self.redeem_script = CScript()
+        self.witness_script = CScript()
+        self.final_script_sig = CScript()
+        self.final_script_witness = None
+        self.unknown_fields = []
+
+class Output:
+    __slots__ = ('redeem_script', 'witness_script', 'bip32_derivation')
+
+    def __init__(self):
+        self.redeem_script = CScript()
+        self.witness_script = CScript()
+        self.bip32_derivation = {}
+
+class ParsedPSBT:
+    """
+    The subset of a PSBT the analysis reads, with the same attribute names as
+    python-bitcointx's PartiallySignedTransaction so either can be analyzed.
+    """
+    __slots__ = ('version', 'unsigned_tx', 'inputs', 'outputs')
+
+    def __init__(self, version, unsigned_tx, inputs, outputs):
+        self.version = version
+        self.unsigned_tx = unsigned_tx
+        self.inputs = inputs
+        self.outputs = outputs
+
+def read_txout(reader):
+    value = reader.unpack(INT64)
+    return TxOut(value, CScript(bytes(reader.varbytes())))
+
+def iter_map(reader):
+    """Yields (key_type, key_data, value) for each record of a key-value map, values are views."""
+    seen = set()
+    while True:
+        key_len = reader.varint()
+        if key_len == 0:
+            return
+        key = reader.read(key_len)
+        value = reader.varbytes()
+        key_bytes = bytes(key)
+        if key_bytes in seen:
+            raise FastParseError("Duplicate key in PSBT map")
+        seen.add(key_bytes)
+        key_reader = Reader(key)
+        key_type = key_reader.varint()
+        yield (key_type, key[key_reader.pos:], value)
+
+def parse_unsigned_tx(view):
+    reader = Reader(view)
+    version = reader.unpack(INT32)
+    vin = []
+    for _ in range(reader.varint()):
+        txid = bytes(reader.read(32))
+        n = reader.unpack(UINT32)
+        if reader.varint() != 0:
+            raise FastParseError("Unsigned transaction has a scriptSig")
+        reader.skip(4)  # sequence
+        vin.append(TxIn(OutPoint(txid, n)))
+    if not vin:
+        raise FastParseError("Unsigned transaction has no inputs or is witness serialized")
+    vout = [read_txout(reader) for _ in range(reader.varint())]
+    locktime = reader.unpack(UINT32)
+    if not reader.at_end():
+        raise FastParseError("Trailing data after unsigned transaction")
+    return UnsignedTx(version, vin, vout, locktime)
+
+def parse_spent_output(view, prevout):
+    """
+    Walks a non_witness_utxo parent transaction, materializing only the output
+    at prevout.n and hashing the non-witness parts to check it really is the
+    transaction the input spends.
+    """
+    reader = Reader(view)
+    reader.skip(4)  # version
+    segwit = len(view) > 6 and view[4] == 0 and view[5] != 0
+    body_start = 6 if segwit else 4
+    reader.pos = body_start
+    input_count = reader.varint()
+    for _ in range(input_count):
+        reader.skip(36)  # outpoint
+        reader.skip_varbytes()  # scriptSig
+        reader.skip(4)  # sequence
+    output_count = reader.varint()
+    if prevout.n >= output_count:
+        raise FastParseError("Input spends an output its non_witness_utxo doesn't have")
+    spent = None
+    for i in range(output_count):
+        if i == prevout.n:
+            spent = read_txout(reader)
+        else:
+            reader.skip(8)
+            reader.skip_varbytes()
+    body_end = reader.pos
+    if segwit:
+        for _ in range(input_count):
+            for _ in range(reader.varint()):
+                reader.skip_varbytes()
+    reader.skip(4)  # locktime
+    if not reader.at_end():
+        raise FastParseError("Trailing data after non_witness_utxo")
+
+    # The txid covers everything but the marker, flag and witnesses
+    digest = hashlib.sha256()
+    digest.update(view[:4])
+    digest.update(view[body_start:body_end])
+    digest.update(view[reader.pos - 4:reader.pos])
+    if hashlib.sha256(digest.digest()).digest() != prevout.hash:
+        raise FastParseError("non_witness_utxo doesn't match the spent outpoint")
+    return ParentTx({prevout.n: spent})
+
+def parse_input(reader, txin):
+    psbt_in = Input()
+    for key_type, key_data, value in iter_map(reader):
+        if key_type == PSBT_IN_NON_WITNESS_UTXO:
+            with instrumentation.stage("parent_tx"):
+                psbt_in.non_witness_utxo = parse_spent_output(value, txin.prevout)
+        elif key_type == PSBT_IN_WITNESS_UTXO:
+            value_reader = Reader(value)
+            psbt_in.witness_utxo = read_txout(value_reader)
+            if not value_reader.at_end():
+                raise FastParseError("Trailing data after witness_utxo")
+        elif key_type == PSBT_IN_PARTIAL_SIG:
+            psbt_in.partial_sigs[bytes(key_data)] = bytes(value)
+        elif key_type == PSBT_IN_REDEEM_SCRIPT:
+            psbt_in.redeem_script = CScript(bytes(value))
+        elif key_type == PSBT_IN_WITNESS_SCRIPT:
+            psbt_in.witness_script = CScript(bytes(value))
+        elif key_type == PSBT_IN_FINAL_SCRIPTSIG:
+            psbt_in.final_script_sig = CScript(bytes(value))
+        elif key_type == PSBT_IN_FINAL_SCRIPTWITNESS:
+            value_reader = Reader(value)
+            psbt_in.final_script_witness = Witness([bytes(value_reader.varbytes()) for _ in range(value_reader.varint())])
+        elif key_type in TAPROOT_INPUT_TYPES:
+            psbt_in.unknown_fields.append(UnknownField(key_type, bytes(key_data), bytes(value)))
+    return psbt_in
+
+def parse_output(reader):
+    psbt_out = Output()
+    for key_type, key_data, value in iter_map(reader):
+        if key_type == PSBT_OUT_REDEEM_SCRIPT:
+            psbt_out.redeem_script = CScript(bytes(value))
+        elif key_type == PSBT_OUT_WITNESS_SCRIPT:
+            psbt_out.witness_script = CScript(bytes(value))
+        elif key_type == PSBT_OUT_BIP32_DERIVATION:
+            psbt_out.bip32_derivation[bytes(key_data)] = bytes(value)
+    return psbt_out
+
+def parse(data):
+    """
+    Parses a binary PSBT in one pass over its key-value maps, skipping every
+    record the analysis doesn't use. Only structural checks are made (lengths,
+    duplicate keys, non_witness_utxo txids); signatures, keys and derivation
+    paths are not validated. Raises FastParseError for anything it can't handle.
+    """
+    reader = Reader(memoryview(data))
+    if bytes(reader.read(len(PSBT_MAGIC))) != PSBT_MAGIC:
+        raise FastParseError("Missing PSBT magic bytes")
+
+    version = 0
+    unsigned_tx = None
+    for key_type, key_data, value in iter_map(reader):
+        if key_type == PSBT_GLOBAL_UNSIGNED_TX and not key_data:
+            unsigned_tx = parse_unsigned_tx(value)
+        elif key_type == PSBT_GLOBAL_VERSION and not key_data:
+            version = UINT32.unpack(value)[0] if len(value) == 4 else -1
+            if version != 0:
+                raise FastParseError("Only version 0 PSBTs are supported")
+    if unsigned_tx is None:
+        raise FastParseError("Missing unsigned transaction")
+
+    inputs = [parse_input(reader, txin) for txin in unsigned_tx.vin]
+    outputs = [parse_output(reader) for _ in unsigned_tx.vout]
+    if not reader.at_end():
+        raise FastParseError("Trailing data after PSBT")
+    return ParsedPSBT(version, unsigned_tx, inputs, outputs)
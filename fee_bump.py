@@ -0,0 +1,194 @@
+import math
+from coin_selection import coin_selection, DUST_THRESHOLD, STRATEGIES
+import script_classifier
+
+# BIP125 rule 4: a replacement pays for its own relay at least at this rate on top of what it replaces
+INCREMENTAL_RELAY_FEE = 1
+MIN_RELAY_FEE = 1
+
+# Fixed part of a transaction's vsize: version, locktime and the input and output counts (when under 253)
+TX_OVERHEAD_VBYTES = 12
+
+def output_vbytes(script_type):
+    """Size of an output paying to script_type: amount, script length and script."""
+    return 8 + 1 + script_classifier.output_script_vbytes(script_type)
+
+def wallet_utxos(utxos):
+    """Fills in estimated_vbytes for UTXOs given as {"amount", "script_type"} dicts, so coin_selection can use them."""
+    return [{
+        'amount': utxo['amount'],
+        'script_type': utxo['script_type'],
+        'estimated_vbytes': utxo.get('estimated_vbytes') or script_classifier.input_vbytes(utxo['script_type']),
+    } for utxo in utxos]
+
+def package_totals(transactions):
+    """Sums the fee and vsize of a list of {"fee", "vsize"} transactions."""
+    return (sum(tx['fee'] for tx in transactions), sum(tx['vsize'] for tx in transactions))
+
+def select_extra_inputs(utxos, amount_needed, fee_rate, fixed_vbytes, change_vbytes, num_outputs, strategies, force_no_change=False):
+    """
+    Picks wallet coins that cover amount_needed plus fee_rate on the extra
+    inputs and everything in fixed_vbytes, one selection per strategy.
+    Yields (strategy, selected UTXOs); the caller works out the exact fee.
+    """
+    # The part of the transaction that is already decided is passed as a fixed size "output"
+    fixed = [max(fixed_vbytes - TX_OVERHEAD_VBYTES, 0)]
+    for strategy in strategies:
+        result = coin_selection(utxos, amount_needed, fee_rate, strategy, change_vbytes, fixed, force_no_change, num_outputs, seed=0)
+        if result:
+            yield (strategy, result['selected'])
+
+def pick_coins(utxos, amounts):
+    """Maps the amounts coin_selection returns back to the wallet's UTXOs."""
+    remaining = list(utxos)
+    picked = []
+    for amount in amounts:
+        utxo = next(utxo for utxo in remaining if utxo['amount'] == amount)
+        remaining.remove(utxo)
+        picked.append(utxo)
+    return picked
+
+def cheapest(plans):
+    """The plan adding the least fee, preferring fewer added inputs on ties."""
+    plans = [plan for plan in plans if plan is not None]
+    if not plans:
+        return None
+    return min(plans, key=lambda plan: (plan['added_fee'], len(plan['added_inputs'])))
+
+def plan_rbf(analysis, target_rate, utxos=(), descendants=(), strategies=STRATEGIES, incremental_relay_fee=INCREMENTAL_RELAY_FEE):
+    """
+    Cheapest BIP125 replacement paying at least target_rate. The replacement
+    keeps every input and non-change output, pays at least the fees of the
+    original and its descendants (rule 3) plus incremental_relay_fee on its own
+    size (rule 4), and takes the fee out of the change first, dropping it if it
+    would become dust, before adding wallet coins. Returns None if unfundable.
+    """
+    replaced_fee = analysis.inferred_fee + package_totals(descendants)[0]
+    change = analysis.change_output
+    change_amount = change.amount if change is not None else 0
+    change_vbytes = change.estimated_output_vb if change is not None else output_vbytes('witness_v0_keyhash')
+    vsize_without_change = analysis.vsize - (change.estimated_output_vb if change is not None else 0)
+    # Value left for fee and change once the inputs pay every other output
+    available = analysis.total_input_value - (analysis.total_output_value - change_amount)
+
+    def required_fee(vsize):
+        return max(math.ceil(target_rate * vsize), replaced_fee + incremental_relay_fee * vsize)
+
+    def plan(vsize, fee, new_change, added_inputs=(), strategy=None):
+        return {
+            'method': 'rbf',
+            'strategy': strategy,
+            'fee': fee,
+            'added_fee': fee - analysis.inferred_fee,
+            'vsize': vsize,
+            'fee_rate': fee / vsize,
+            'change': new_change,
+            'change_dropped': change is not None and new_change == 0,
+            'added_inputs': [utxo['amount'] for utxo in added_inputs],
+        }
+
+    # Paying exactly the required fee out of the existing change can't be beaten
+    plans = []
+    if change is not None:
+        fee = required_fee(analysis.vsize)
+        if available - fee > DUST_THRESHOLD:
+            return plan(analysis.vsize, fee, available - fee)
+        if available >= required_fee(vsize_without_change):
+            plans.append(plan(vsize_without_change, available, 0))
+
+    # Otherwise add wallet coins, with a (new) change output for whatever is left over
+    rule4_rate = incremental_relay_fee + replaced_fee / vsize_without_change
+    for rate in sorted({target_rate, max(target_rate, rule4_rate)}):
+        for strategy, amounts in select_extra_inputs(utxos, -available, rate, vsize_without_change, change_vbytes, len(analysis.outputs), strategies):
+            added = pick_coins(utxos, amounts)
+            added_vbytes = sum(utxo['estimated_vbytes'] for utxo in added)
+            total = available + sum(utxo['amount'] for utxo in added)
+            vsize = vsize_without_change + added_vbytes + change_vbytes
+            fee = required_fee(vsize)
+            if total - fee > DUST_THRESHOLD:
+                plans.append(plan(vsize, fee, total - fee, added, strategy))
+            elif total >= required_fee(vsize - change_vbytes):
+                plans.append(plan(vsize - change_vbytes, total, 0, added, strategy))
+    return cheapest(plans)
+
+def plan_cpfp(analysis, target_rate, utxos=(), ancestors=(), output_index=None, strategies=STRATEGIES, child_output_type='witness_v0_keyhash'):
+    """
+    Cheapest child spending one of the PSBT's outputs (its change by default)
+    that lifts the package of the PSBT, its unconfirmed ancestors and the child
+    to target_rate. The child pays to a single new output and adds wallet coins
+    when the spent output can't cover the fee. Returns None if there is no
+    output to spend or it can't be funded.
+    """
+    index = analysis.change_index if output_index is None else output_index
+    if index == -1 or index >= len(analysis.outputs):
+        return None
+    spent = analysis.outputs[index]
+    spent_vbytes = script_classifier.input_vbytes(spent.script_type)
+    child_output_vbytes = output_vbytes(child_output_type)
+    ancestor_fee, ancestor_vsize = package_totals(ancestors)
+    parent_fee = analysis.inferred_fee + ancestor_fee
+    parent_vsize = analysis.vsize + ancestor_vsize
+    # Fee the parents are short of the target rate, the child makes it up on top of paying for itself
+    deficit = target_rate * parent_vsize - parent_fee
+
+    def required_fee(child_vsize):
+        return max(math.ceil(deficit + target_rate * child_vsize), MIN_RELAY_FEE * child_vsize)
+
+    def plan(child_vsize, child_fee, child_value, added_inputs=(), strategy=None):
+        return {
+            'method': 'cpfp',
+            'strategy': strategy,
+            'spent_output': index,
+            'child_fee': child_fee,
+            'added_fee': child_fee,
+            'child_vsize': child_vsize,
+            'child_output': child_value,
+            'package_fee': parent_fee + child_fee,
+            'package_vsize': parent_vsize + child_vsize,
+            'package_rate': (parent_fee + child_fee) / (parent_vsize + child_vsize),
+            'added_inputs': [utxo['amount'] for utxo in added_inputs],
+        }
+
+    child_vsize = TX_OVERHEAD_VBYTES + spent_vbytes + child_output_vbytes
+    fee = required_fee(child_vsize)
+    if spent.amount - fee > DUST_THRESHOLD:
+        return plan(child_vsize, fee, spent.amount - fee)
+
+    # The child output has to stay above dust, so it is part of the amount the coins must cover
+    plans = []
+    amount_needed = deficit + DUST_THRESHOLD + 1 - spent.amount
+    for strategy, amounts in select_extra_inputs(utxos, amount_needed, target_rate, child_vsize, child_output_vbytes, 1, strategies, force_no_change=True):
+        added = pick_coins(utxos, amounts)
+        vsize = child_vsize + sum(utxo['estimated_vbytes'] for utxo in added)
+        total = spent.amount + sum(utxo['amount'] for utxo in added)
+        fee = required_fee(vsize)
+        if total - fee > DUST_THRESHOLD:
+            plans.append(plan(vsize, fee, total - fee, added, strategy))
+    return cheapest(plans)
+
+def plan_fee_bumps(analysis, target_rates, utxos=(), ancestors=(), descendants=(), cpfp_output=None, strategies=STRATEGIES, incremental_relay_fee=INCREMENTAL_RELAY_FEE):
+    """
+    Plans an RBF replacement and a CPFP child for every target rate and picks
+    the cheaper of the two. utxos are extra wallet coins ({"amount",
+    "script_type"}) either may add, ancestors the {"fee", "vsize"} of the
+    PSBT's unconfirmed parents and descendants those of any children a
+    replacement would evict. Returns one row per target rate, in the order given.
+    Rates the package already pays are not planned, as neither bump is needed.
+    """
+    utxos = wallet_utxos(utxos)
+    package_fee, package_vsize = package_totals(list(ancestors) + [{'fee': analysis.inferred_fee, 'vsize': analysis.vsize}])
+    current_rate = package_fee / package_vsize if package_vsize else 0
+    rows = []
+    for target_rate in target_rates:
+        already_met = target_rate <= current_rate
+        rbf = None if already_met else plan_rbf(analysis, target_rate, utxos, descendants, strategies, incremental_relay_fee)
+        cpfp = None if already_met else plan_cpfp(analysis, target_rate, utxos, ancestors, cpfp_output, strategies)
+        best = cheapest([rbf, cpfp])
+        rows.append({
+            'target_rate': target_rate,
+            'already_met': already_met,
+            'rbf': rbf,
+            'cpfp': cpfp,
+            'cheapest': best['method'] if best else None,
+        })
+    return rows
@@ -1,8 +1,13 @@
-import requests
+import json
 import os
+import threading
+import time
+import instrumentation
 
 sample_response_upon_failure = {"fastestFee": 100, "halfHourFee": 50, "hourFee": 20, "economyFee": 5, "minimumFee": 1}
 
+DEFAULT_FEES_URL = 'https://mempool.space/api/v1/fees/recommended'
+
 def get_api_key():
     """Function to read the API key from the local-secrets file"""
     secrets_file = 'local-secrets'
@@ -12,16 +17,192 @@ def get_api_key():
         api_key = f.read().strip()
     return api_key
 
+class FeeProvider:
+    """
+    Fetches recommended fees from mempool.space (or any compatible endpoint) and
+    caches them in process for ttl seconds. Once the cached value is older than
+    ttl it is still served while a background thread refreshes it, up to
+    max_stale seconds after which callers block on a fresh fetch. Failed
+    fetches are never cached: the last known fees (or the sample fees) are
+    served without counting as fresh, and the next fetch waits retry_after
+    seconds so an unreachable endpoint doesn't stall every caller.
+    If snapshot_path is given the last good response is persisted there so cold
+    starts can answer immediately.
+    """
+
+    def __init__(self, url=DEFAULT_FEES_URL, ttl=60, max_stale=3600, timeout=5, snapshot_path=None, api_key=None, session=None, retry_after=10):
+        self.url = url
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self.snapshot_path = snapshot_path
+        self.api_key = api_key
+        self._session = session
+        self.fees = None
+        self.fetched_at = 0.0
+        self.failed_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self.load_snapshot()
+
+    @property
+    def session(self):
+        """The pooled HTTP session, requests is only imported once fees are actually fetched."""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def headers(self):
+        """Builds the request headers, the API key is optional."""
+        api_key = self.api_key
+        if api_key is None:
+            try:
+                api_key = get_api_key()
+            except FileNotFoundError:
+                api_key = ""
+        return {'x-api-key': api_key} if api_key else {}
+
+    def fetch(self):
+        """Fetches fees over the pooled session, returns None on failure."""
+        import requests
+        instrumentation.count("fee_http_requests")
+        try:
+            with instrumentation.stage("fee_http"):
+                response = self.session.get(self.url, headers=self.headers(), timeout=self.timeout)
+            response.raise_for_status()  # Raise an error for bad responses (4xx or 5xx)
+            fees = response.json()
+            self.save_snapshot(fees)
+            return fees
+        except (requests.RequestException, ValueError):
+            return None
+
+    def fallback_fees(self):
+        """What is served while fees can't be fetched: the last known fees however old, or the sample fees."""
+        return self.fees or sample_response_upon_failure
+
+    def refresh(self):
+        """Fetches fresh fees and caches them. On failure the cache is left as is and the fallback fees are returned."""
+        try:
+            fees = self.fetch()
+        finally:
+            with self.lock:
+                self.refreshing = False
+        with self.lock:
+            if fees is None:
+                self.failed_at = time.time()
+                return self.fallback_fees()
+            self.fees = fees
+            self.fetched_at = time.time()
+        return fees
+
+    def retry_due(self):
+        """Whether enough time has passed since the last failed fetch to try again. Must be called with the lock held."""
+        return time.time() - self.failed_at >= self.retry_after
+
+    def refresh_in_background(self):
+        """Starts a background refresh unless one is already running. Must be called with the lock held."""
+        if not self.refreshing:
+            self.refreshing = True
+            threading.Thread(target=self.refresh, daemon=True).start()
+
+    def usable_fees(self):
+        """
+        Returns the cached fees if they can be served without blocking (starting
+        a background refresh once they expire), or None when a fetch is needed.
+        """
+        with self.lock:
+            age = time.time() - self.fetched_at
+            if self.fees is not None and age < self.ttl:
+                return self.fees
+            if self.fees is not None and age < self.ttl + self.max_stale:
+                if self.retry_due():
+                    self.refresh_in_background()
+                return self.fees
+            if not self.retry_due():
+                # The last fetch just failed, waiting on the network again would only repeat the timeout
+                return self.fallback_fees()
+        return None
+
+    def get_recommended_fees(self):
+        """Returns the cached fees, refreshing them when they are missing or expired."""
+        fees = self.usable_fees()
+        return fees if fees is not None else self.refresh()
+
+    def cached_fees(self):
+        """Returns the cached or snapshot fees (or the sample fees) without touching the network."""
+        with self.lock:
+            return self.fees or sample_response_upon_failure
+
+    def load_snapshot(self):
+        """Seeds the cache from the on-disk snapshot if there is one."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            self.fees = snapshot["fees"]
+            self.fetched_at = snapshot["fetched_at"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save_snapshot(self, fees):
+        """Atomically writes the latest fees to the on-disk snapshot."""
+        if not self.snapshot_path:
+            return
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({"fees": fees, "fetched_at": time.time()}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError:
+            pass
+
+default_provider = FeeProvider()
+
+def set_default_provider(provider):
+    """Replaces the provider used by get_recommended_fees, e.g. to point at a stub server."""
+    global default_provider
+    default_provider = provider
+
+def configure(url=None, snapshot_path=None, ttl=None):
+    """Rebuilds the default provider with a different endpoint, snapshot or TTL."""
+    set_default_provider(FeeProvider(
+        url=url or default_provider.url,
+        snapshot_path=snapshot_path or default_provider.snapshot_path,
+        ttl=ttl if ttl is not None else default_provider.ttl,
+    ))
+
 def get_recommended_fees():
     """Function to get recommended fees from mempool.space"""
-    url = 'https://mempool.space/api/v1/fees/recommended'
-    api_key = get_api_key()
-    headers = {
-        'x-api-key': api_key
-    }
-    try: 
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an error for bad responses (4xx or 5xx)
-        return response.json()
-    except:
-        return sample_response_upon_failure
+    return default_provider.get_recommended_fees()
+
+def get_cached_fees():
+    """Returns the last known fees without any network access, for offline runs."""
+    return default_provider.cached_fees()
+
+def start_stub_server(fees=None, host='127.0.0.1', port=0):
+    """
+    Serves a fixed fees response on a local port so mempool.space can be stubbed
+    out in tests. Returns the server and the URL to configure the provider with;
+    call server.shutdown() when done.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    body = json.dumps(fees or sample_response_upon_failure).encode()
+
+    class StubFeesHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StubFeesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}/api/v1/fees/recommended"
+    return (server, url)
@@ -0,0 +1,178 @@
+import contextlib
+import contextvars
+import os
+import sys
+import threading
+import time
+
+# The trace of the analysis running in the current thread (or task), None when nothing is recorded
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# Shared no-op returned by stage() while nothing is being traced, so disabled tracing costs one lookup
+NULL_STAGE = contextlib.nullcontext()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+class Trace:
+    """
+    Stage durations and counters recorded for one analysis. Stages may nest
+    (parent_tx is part of parse, fee_http of fee_fetch) and repeated stages add up.
+    """
+    __slots__ = ('stages', 'counters', 'total')
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.total = 0.0
+
+    def add_time(self, name, elapsed):
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self) -> dict:
+        """Returns the trace with durations in milliseconds."""
+        return {
+            "total_ms": self.total * 1000,
+            "stages_ms": {name: elapsed * 1000 for name, elapsed in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+class TimedStage:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add_time(self.name, time.perf_counter() - self.start)
+
+def stage(name):
+    """Times a with block as the named stage of the current trace, if any."""
+    trace = current_trace.get()
+    if trace is None:
+        return NULL_STAGE
+    return TimedStage(trace, name)
+
+def count(name, n=1):
+    """Adds n to a counter of the current trace, if any."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.count(name, n)
+
+class MetricsRegistry:
+    """
+    Thread-safe running totals of every observed trace, rendered as Prometheus
+    text or OpenMetrics for scraping.
+    """
+
+    def __init__(self, prefix='psbt_analyzer'):
+        self.prefix = prefix
+        self.analyses = 0
+        self.total = 0.0
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, timings):
+        """Adds a trace, or a trace's to_dict() (e.g. one sent back by a batch worker)."""
+        if isinstance(timings, Trace):
+            timings = timings.to_dict()
+        with self.lock:
+            self.analyses += 1
+            self.total += timings["total_ms"] / 1000
+            for name, elapsed_ms in timings["stages_ms"].items():
+                seconds, observed = self.stages.get(name, (0.0, 0))
+                self.stages[name] = (seconds + elapsed_ms / 1000, observed + 1)
+            for name, value in timings["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def render(self, openmetrics=False) -> str:
+        """Returns the totals in the Prometheus text exposition format, or as OpenMetrics."""
+        prefix = self.prefix
+        # OpenMetrics names counter families without the _total suffix their samples carry
+        analyses_family = f"{prefix}_analyses" if openmetrics else f"{prefix}_analyses_total"
+        events_family = f"{prefix}_events" if openmetrics else f"{prefix}_events_total"
+        with self.lock:
+            lines = [
+                f"# HELP {analyses_family} Analyses recorded.",
+                f"# TYPE {analyses_family} counter",
+                f"{prefix}_analyses_total {self.analyses}",
+                f"# HELP {prefix}_analysis_seconds Wall time of recorded analyses.",
+                f"# TYPE {prefix}_analysis_seconds summary",
+                f"{prefix}_analysis_seconds_sum {self.total:.9f}",
+                f"{prefix}_analysis_seconds_count {self.analyses}",
+                f"# HELP {prefix}_stage_seconds Time spent in each analysis stage.",
+                f"# TYPE {prefix}_stage_seconds summary",
+            ]
+            for name, (seconds, observed) in sorted(self.stages.items()):
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {seconds:.9f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {observed}')
+            lines.append(f"# HELP {events_family} Inputs, outputs, cache hits and other per-analysis counters.")
+            lines.append(f"# TYPE {events_family} counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self.analyses = 0
+            self.total = 0.0
+            self.stages.clear()
+            self.counters.clear()
+
+default_registry = MetricsRegistry()
+
+@contextlib.contextmanager
+def tracing(registry=default_registry):
+    """
+    Records every stage and counter inside the with block into a fresh Trace,
+    which is yielded and added to registry when the block ends (pass None to
+    keep it out of the running totals).
+    """
+    trace = Trace()
+    token = current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.total = time.perf_counter() - start
+        current_trace.reset(token)
+        if registry is not None:
+            registry.observe(trace)
+
+def write_metrics(path, registry=default_registry, openmetrics=False):
+    """Atomically writes the registry to path, e.g. for node_exporter's textfile collector."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(registry.render(openmetrics))
+    os.replace(tmp_path, path)
+
+@contextlib.contextmanager
+def profiled(path=None, limit=30):
+    """
+    Runs the with block under cProfile. The raw stats are dumped to path (for
+    snakeviz, pstats or flameprof), or the top functions by cumulative time are
+    printed to stderr when no path is given.
+    """
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path and path != '-':
+            profiler.dump_stats(path)
+        else:
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(limit)
@@ -0,0 +1,101 @@
+import bisect
+import json
+
+# Virtual size of a block, used to turn the vsize queued ahead of a transaction into blocks
+BLOCK_VSIZE = 1_000_000
+
+# Minutes between blocks on average, for the human readable estimates
+BLOCK_INTERVAL_MINUTES = 10
+
+class MempoolModel:
+    """
+    Cumulative-weight index over a mempool snapshot. The snapshot is reduced
+    once to fee rate buckets sorted from the highest rate down with the total
+    vsize paying at least each rate, after which every query is a bisection:
+    O(log n) per PSBT no matter how many are classified against it.
+    """
+
+    def __init__(self, histogram, block_vsize=BLOCK_VSIZE):
+        """histogram is an iterable of (fee_rate, vsize) buckets in any order."""
+        buckets = sorted(((float(rate), int(vsize)) for rate, vsize in histogram if vsize > 0), reverse=True)
+        self.block_vsize = block_vsize
+        # Rates are negated so bisect can search the descending order
+        self.negated_rates = [-rate for rate, _ in buckets]
+        self.cumulative_vsize = []
+        total = 0
+        for _, vsize in buckets:
+            total += vsize
+            self.cumulative_vsize.append(total)
+        self.total_vsize = total
+        self.min_rate = buckets[-1][0] if buckets else 0.0
+
+    @classmethod
+    def from_snapshot(cls, snapshot, block_vsize=BLOCK_VSIZE):
+        """
+        Builds the model from either mempool.space's projected blocks
+        (/api/v1/fees/mempool-blocks, a list of blocks with blockVSize and
+        feeRange) or a fee rate histogram (/api/mempool or Bitcoin Core style,
+        {"fee_histogram": [[rate, vsize], ...]}).
+        """
+        if isinstance(snapshot, dict) and "fee_histogram" in snapshot:
+            return cls(snapshot["fee_histogram"], block_vsize)
+        if isinstance(snapshot, list):
+            # A projected block holds everything paying at least its lowest rate that didn't fit in earlier blocks
+            return cls(((block["feeRange"][0], block["blockVSize"]) for block in snapshot if block.get("feeRange")), block_vsize)
+        raise ValueError("Unrecognized mempool snapshot, expected projected blocks or a fee_histogram")
+
+    def vsize_ahead(self, fee_rate: float) -> int:
+        """Returns the vsize of everything in the mempool paying more than fee_rate."""
+        higher = bisect.bisect_left(self.negated_rates, -fee_rate)
+        return self.cumulative_vsize[higher - 1] if higher else 0
+
+    def expected_blocks(self, fee_rate: float) -> int:
+        """Number of blocks until a transaction paying fee_rate is expected to confirm, assuming no new arrivals."""
+        return self.vsize_ahead(fee_rate) // self.block_vsize + 1
+
+    def percentile(self, fee_rate: float) -> float:
+        """Share of the mempool's vsize paying less than or the same as fee_rate, from 0 to 1."""
+        if not self.total_vsize:
+            return 1.0
+        return 1 - self.vsize_ahead(fee_rate) / self.total_vsize
+
+    def fee_rate_for_blocks(self, blocks: int) -> float:
+        """Lowest fee rate in the snapshot expected to confirm within the given number of blocks."""
+        index = bisect.bisect_left(self.cumulative_vsize, blocks * self.block_vsize)
+        if index >= len(self.negated_rates):
+            return self.min_rate
+        # Paying the rate of the bucket that overflows the window still gets ahead of that bucket
+        return -self.negated_rates[index]
+
+    def confirmation(self, fee_rate: float) -> dict:
+        """Returns the expected blocks and the mempool percentile for fee_rate."""
+        return {
+            "expected_blocks": self.expected_blocks(fee_rate),
+            "mempool_percentile": round(self.percentile(fee_rate), 4),
+        }
+
+    def suggestion(self, fee_rate: float) -> str:
+        """Describes how long fee_rate is expected to take to confirm."""
+        if fee_rate < self.min_rate:
+            return f"The fee rate of {fee_rate:.2f} sats/vB is below everything in the mempool snapshot ({self.min_rate:.2f} sats/vB), it may not confirm until the mempool clears."
+        blocks = self.expected_blocks(fee_rate)
+        if blocks == 1:
+            next_block_rate = self.fee_rate_for_blocks(1)
+            if fee_rate > next_block_rate * 2 and next_block_rate > 0:
+                return f"The fee rate of {fee_rate:.2f} sats/vB is expected to confirm in the next block, {next_block_rate:.2f} sats/vB would do. You might be overpaying."
+            return f"The fee rate of {fee_rate:.2f} sats/vB is expected to confirm in the next block."
+        return f"The fee rate of {fee_rate:.2f} sats/vB is expected to confirm in about {blocks} blocks (~{blocks * BLOCK_INTERVAL_MINUTES} minutes)."
+
+def load_snapshot(source, timeout=5):
+    """Loads a mempool snapshot from a JSON file or an http(s) URL (e.g. a stub server)."""
+    if source.startswith(('http://', 'https://')):
+        import requests
+        response = requests.get(source, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    with open(source, 'r') as f:
+        return json.load(f)
+
+def load_model(source, block_vsize=BLOCK_VSIZE):
+    """Loads a mempool snapshot and builds its MempoolModel."""
+    return MempoolModel.from_snapshot(load_snapshot(source), block_vsize)
@@ -1,12 +1,35 @@
-from rich.table import Table
-from rich.console import Console
+import csv
+import json
+import statistics
+import types
+import console_util
 
-console = Console()
+# Rich is only imported once something is displayed, so the plain text reports never pay for it
+console = console_util.LazyConsole()
+
+# Longer lists (e.g. the coins a strategy selected) are shown as their first items and a total
+MAX_LISTED_ITEMS = 10
+
+# Rows the report renderers collect before writing them out in one go
+WRITE_BUFFER_ROWS = 1000
+
+# Rows the rich and summary reports list before only counting the rest towards the totals
+MAX_REPORT_ROWS = 50
+
+REPORT_COLUMNS = ["id", "error", "inputs", "outputs", "total_input_value", "total_output_value",
+                  "inferred_fee", "inferred_fee_rate", "vsize", "change_index"]
 
 def format_sats_to_btc(sats: int) -> float:
     """Converts a value in satoshis to BTC."""
     return round(sats / 100000000, 8)
 
+def summarize_list(values: list, limit: int = MAX_LISTED_ITEMS) -> str:
+    """Formats a list in full when short, otherwise as its first limit items, how many were left out and the sum."""
+    if len(values) <= limit:
+        return str(list(values))
+    shown = ", ".join(str(value) for value in values[:limit])
+    return f"[{shown}, ... {len(values) - limit} more] ({len(values)} total, sum {sum(values)})"
+
 def display_analysis(analysis_results: dict):
     """
     Displays the analysis results in a structured format using Rich.
@@ -15,6 +38,7 @@ def display_analysis(analysis_results: dict):
         console.print("[bold red]Analysis failed. Check your PSBT input.[/bold red]")
         return
         
+    from rich.table import Table
     console.print("[bold green]PSBT Analysis Summary[/bold green]")
 
     table = Table(show_header=True, header_style="bold white")
@@ -26,6 +50,10 @@ def display_analysis(analysis_results: dict):
     table.add_row("Total Outputs", f"{format_sats_to_btc(analysis_results['total_output_value']):.8f} BTC")
     table.add_row("Inferred Fee", f"{format_sats_to_btc(analysis_results['inferred_fee']):.8f} BTC")
     table.add_row("Inferred Fee Rate", f"{analysis_results['inferred_fee_rate']:.2f} sats/vB")
+    if "vsize" in analysis_results:
+        estimated_inputs = sum(1 for inp in analysis_results["inputs"] if inp.get("weight_source") == "estimated")
+        size_note = f" ({estimated_inputs} input(s) estimated)" if estimated_inputs else ""
+        table.add_row("Transaction Size", f"{analysis_results['vsize']} vBytes{size_note}")
     
     console.print(table)
     
@@ -51,22 +79,319 @@ def display_analysis(analysis_results: dict):
 def display_coin_simulation(coin_simulation: dict):
     """
     Displays the coin simulation results in a structured format using Rich.
+    Large selections are truncated, see summarize_list.
     """
+    from rich.table import Table
     for strategy,data in coin_simulation.items():
-        table = Table(show_header=True, header_style="bold white")
         console.print("\n[bold yellow]{strategy}[/bold yellow]".format(strategy = strategy))
-        table.add_column("Metric", width=20)
-        table.add_column("Value")
-        
         if not data:
-            return
+            console.print("No result.")
+            continue
+        if "error" in data:
+            console.print(data["error"])
+            continue
 
-        table.add_row("Selected amounts", str(data["selected"]))
+        table = Table(show_header=True, header_style="bold white")
+        table.add_column("Metric", width=20)
+        table.add_column("Value")
+        table.add_row("Selected amounts", summarize_list(data["selected"]))
         table.add_row("Total inputs amounts", f"{format_sats_to_btc(data['total_input']):.8f} BTC")
         table.add_row("Inferred fee", f"{format_sats_to_btc(data['fee']):.8f} BTC")
         table.add_row("Inferred transaction size", f"{(data['vsize']):.0f} vBytes")
         table.add_row("Inferred fee rate", f"{data['effective_rate']:.2f} sats/vB")
+        if "waste" in data:
+            table.add_row("Waste score", f"{data['waste']} sats")
+        console.print(table)
+
+def display_fee_sweep(sweep: dict):
+    """
+    Displays a fee rate sweep table from simulate_coin_selection_sweep using Rich.
+    """
+    from rich.table import Table
+    table = Table(show_header=True, header_style="bold white")
+    for column in ["Strategy", "Fee rate", "Inputs", "Fee", "Change", "Size", "Effective rate"]:
+        table.add_column(column)
+
+    for i, strategy in enumerate(sweep["strategy"]):
+        if sweep["selected_count"][i] == 0:
+            table.add_row(strategy, f"{sweep['fee_rate'][i]:.2f} sats/vB", "Insufficient funds", "", "", "", "")
+            continue
+        table.add_row(
+            strategy,
+            f"{sweep['fee_rate'][i]:.2f} sats/vB",
+            str(sweep["selected_count"][i]),
+            f"{format_sats_to_btc(int(sweep['fee'][i])):.8f} BTC",
+            f"{format_sats_to_btc(int(sweep['change'][i])):.8f} BTC",
+            f"{sweep['vsize'][i]} vBytes",
+            f"{sweep['effective_rate'][i]:.2f} sats/vB",
+        )
+    console.print(table)
+
+def display_psbt_diff(psbt_id: str, diff: dict):
+    """
+    Displays a psbt_diff comparison against the baseline using Rich.
+    """
+    from rich.table import Table
+    console.print(f"\n[bold green]{psbt_id}[/bold green] vs baseline")
+    if diff["identical"]:
+        console.print("Identical to the baseline.")
+        return
+
+    table = Table(show_header=True, header_style="bold white")
+    for column in ["Metric", "Baseline", "This PSBT", "Delta"]:
+        table.add_column(column)
+    for field, total in diff["totals"].items():
+        if field == "inferred_fee_rate":
+            values = [f"{value:.2f} sats/vB" if value is not None else "" for value in (total["from"], total["to"], total["delta"])]
+        else:
+            values = [str(value) if value is not None else "" for value in (total["from"], total["to"], total["delta"])]
+        table.add_row(field, *values)
+    console.print(table)
+
+    for side, key in [("Inputs", "outpoint"), ("Outputs", "script")]:
+        entries = diff[side.lower()]
+        if not (entries["added"] or entries["removed"] or entries["changed"]):
+            continue
+        console.print(f"\n[bold yellow]{side}[/bold yellow] ({entries['unchanged']} unchanged)")
+        table = Table(show_header=True, header_style="bold white")
+        for column in ["", key.capitalize(), "Index", "Details"]:
+            table.add_column(column)
+        for entry in entries["added"]:
+            table.add_row("[green]+[/green]", entry[key], str(entry["index"]), f"{entry['amount']} sats")
+        for entry in entries["removed"]:
+            table.add_row("[red]-[/red]", entry[key], str(entry["index"]), f"{entry['amount']} sats")
+        for entry in entries["changed"]:
+            details = ", ".join(f"{field}: {change['from']} -> {change['to']}" for field, change in entry["changes"].items())
+            table.add_row("[yellow]~[/yellow]", entry[key], str(entry["index"]), details)
         console.print(table)
 
+    change = diff["change"]
+    if not change["same_output"]:
+        console.print("\n[bold yellow]Change Output Detection[/bold yellow]")
+        before = f"output {change['from']['index']} ({change['from']['address']})" if change["from"] else "none"
+        after = f"output {change['to']['index']} ({change['to']['address']})" if change["to"] else "none"
+        console.print(f"Baseline: {before}, this PSBT: {after}")
+
+def display_fee_bumps(plans: list):
+    """
+    Displays the fee_bump plans for each target rate using Rich.
+    """
+    from rich.table import Table
+    table = Table(show_header=True, header_style="bold white")
+    for column in ["Target rate", "RBF", "CPFP", "Cheapest"]:
+        table.add_column(column)
+
+    for row in plans:
+        if row["already_met"]:
+            table.add_row(f"{row['target_rate']:.2f} sats/vB", "Already met", "Already met", "NONE")
+            continue
+        cells = []
+        for plan in (row["rbf"], row["cpfp"]):
+            if plan is None:
+                cells.append("Not fundable")
+                continue
+            fee = plan["fee"] if plan["method"] == "rbf" else plan["child_fee"]
+            details = f"+{plan['added_fee']} sats (fee {fee} sats)"
+            if plan["added_inputs"]:
+                details += f", adds {len(plan['added_inputs'])} input(s)"
+            if plan.get("change_dropped"):
+                details += ", drops change"
+            cells.append(details)
+        table.add_row(f"{row['target_rate']:.2f} sats/vB", *cells, (row["cheapest"] or "none").upper())
+    console.print(table)
+
+def display_consolidation_plan(plan: dict):
+    """
+    Displays a consolidation plan using Rich, one row per fee rate window,
+    wallet and script type rather than per transaction.
+    """
+    from rich.table import Table
+    console.print("[bold green]Consolidation Plan[/bold green]")
+    table = Table(show_header=True, header_style="bold white")
+    for column in ["Fee rate", "Wallet", "Script type", "Transactions", "Inputs", "Vsize", "Fee"]:
+        table.add_column(column)
+
+    for window in plan["windows"]:
+        rows = {}
+        for tx in window["transactions"]:
+            row = rows.setdefault((tx["wallet"], tx["script_type"]), [0, 0, 0, 0])
+            row[0] += 1
+            row[1] += tx["inputs"]
+            row[2] += tx["vsize"]
+            row[3] += tx["fee"]
+        if not rows:
+            table.add_row(f"{window['fee_rate']:.2f} sats/vB", "-", "-", "0", "0", "0 vB", "0 sats")
+        for (wallet, script_type), (txs, inputs, vsize, fee) in rows.items():
+            table.add_row(f"{window['fee_rate']:.2f} sats/vB", wallet, script_type, str(txs), str(inputs), f"{vsize} vB", f"{fee} sats")
+    console.print(table)
+
+    totals = plan["totals"]
+    console.print(f"{totals['consolidated']} of {totals['utxos']} UTXOs into {totals['transactions']} transactions "
+                  f"({totals['vsize']} vB) for {totals['fee']} sats ({format_sats_to_btc(totals['fee']):.8f} BTC)")
+    for group in plan["unplanned"]:
+        console.print(f"[yellow]Left as is:[/yellow] {group['count']} {group['script_type']} UTXOs of {group['wallet']} "
+                      f"({format_sats_to_btc(group['value']):.8f} BTC), not worth consolidating or no room left in the schedule")
+
+def record_row(record: dict) -> dict:
+    """Flattens a batch record ({"id", "analysis", "error"}) to its REPORT_COLUMNS values."""
+    analysis = record["analysis"]
+    if analysis is None:
+        return {"id": record["id"], "error": record["error"]}
+    change = analysis["change_output"]
+    return {
+        "id": record["id"],
+        "error": record["error"],
+        "inputs": len(analysis["inputs"]),
+        "outputs": len(analysis["outputs"]),
+        "total_input_value": analysis["total_input_value"],
+        "total_output_value": analysis["total_output_value"],
+        "inferred_fee": analysis["inferred_fee"],
+        "inferred_fee_rate": round(analysis["inferred_fee_rate"], 2),
+        "vsize": analysis.get("vsize"),
+        "change_index": analysis["outputs"].index(change) if change else -1,
+    }
+
+class ReportTotals:
+    """Aggregates over every rendered record, including those a report doesn't list."""
+
+    def __init__(self):
+        self.count = 0
+        self.failed = 0
+        self.fee = 0
+        self.vsize = 0
+        self.fee_rates = []
+
+    def add(self, row):
+        self.count += 1
+        if row["error"] is not None:
+            self.failed += 1
+            return
+        self.fee += row["inferred_fee"]
+        self.vsize += row["vsize"] or 0
+        self.fee_rates.append(row["inferred_fee_rate"])
+
+    def summary(self) -> str:
+        text = f"{self.count} PSBTs ({self.failed} failed), {self.fee} sats in fees ({format_sats_to_btc(self.fee):.8f} BTC) over {self.vsize} vB"
+        if self.fee_rates:
+            text += (f", fee rates {min(self.fee_rates):.2f} / {statistics.median(self.fee_rates):.2f} / "
+                     f"{max(self.fee_rates):.2f} sats/vB (min / median / max)")
+        return text
+
+class ReportRenderer:
+    """
+    Base of the batch report renderers: write() takes one record at a time,
+    rendered lines are collected and written to out every WRITE_BUFFER_ROWS
+    rows, and close() writes whatever is left (without closing out).
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.pending = []
+
+    def emit(self, line):
+        self.pending.append(line)
+        if len(self.pending) >= WRITE_BUFFER_ROWS:
+            self.flush()
+
+    def flush(self):
+        self.out.write("".join(self.pending))
+        self.pending.clear()
+        self.out.flush()
+
+    def close(self):
+        self.flush()
+
+class JsonLinesRenderer(ReportRenderer):
+    """Full records as JSON Lines, the batch default."""
+
+    def write(self, record):
+        self.emit(json.dumps(record) + "\n")
+
+class CsvRenderer(ReportRenderer):
+    """One CSV row of REPORT_COLUMNS per record, under a header row."""
+
+    def __init__(self, out):
+        super().__init__(out)
+        # csv only needs something with a write() to hand each formatted line to
+        self.writer = csv.DictWriter(types.SimpleNamespace(write=self.emit), REPORT_COLUMNS, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record_row(record))
+
+class SummaryRenderer(ReportRenderer):
+    """
+    Compact plain text columns, one line per record for the first max_rows
+    records, followed by the totals over all of them.
+    """
+    widths = {"id": 32, "inputs": 7, "outputs": 7, "inferred_fee": 12, "inferred_fee_rate": 10, "vsize": 8, "change_index": 6}
+    headers = {"id": "ID", "inputs": "Inputs", "outputs": "Outputs", "inferred_fee": "Fee (sats)", "inferred_fee_rate": "sats/vB", "vsize": "vB", "change_index": "Change"}
+
+    def __init__(self, out, max_rows=MAX_REPORT_ROWS):
+        super().__init__(out)
+        self.max_rows = max_rows
+        self.totals = ReportTotals()
+        self.emit(self.format_line(self.headers))
+
+    def format_line(self, cells):
+        line = []
+        for column, width in self.widths.items():
+            text = str(cells.get(column, ""))
+            if len(text) > width:
+                text = text[:width - 3] + "..."
+            line.append(text.ljust(width) if column == "id" else text.rjust(width))
+        return " ".join(line) + "\n"
+
+    def write(self, record):
+        row = record_row(record)
+        self.totals.add(row)
+        if self.totals.count > self.max_rows:
+            return
+        if row["error"] is not None:
+            self.emit(f"{self.format_line({'id': row['id']}).rstrip()} error: {row['error']}\n")
+        else:
+            self.emit(self.format_line(row))
+
+    def close(self):
+        hidden = self.totals.count - self.max_rows
+        if hidden > 0:
+            self.emit(f"... {hidden} more\n")
+        self.emit(self.totals.summary() + "\n")
+        super().close()
+
+class RichRenderer:
+    """
+    A single Rich table for the first max_rows records and the totals over all
+    of them, rather than a table per analysis.
+    """
+
+    def __init__(self, out, max_rows=MAX_REPORT_ROWS):
+        from rich.console import Console
+        from rich.table import Table
+        self.console = Console(file=out)
+        self.table = Table(show_header=True, header_style="bold white")
+        for column in ["ID", "Inputs", "Outputs", "Fee", "Fee rate", "Size", "Change"]:
+            self.table.add_column(column)
+        self.max_rows = max_rows
+        self.totals = ReportTotals()
+
+    def write(self, record):
+        row = record_row(record)
+        self.totals.add(row)
+        if self.totals.count > self.max_rows:
+            return
+        if row["error"] is not None:
+            self.table.add_row(row["id"], f"[red]{row['error']}[/red]", "", "", "", "", "")
+            return
+        self.table.add_row(row["id"], str(row["inputs"]), str(row["outputs"]), f"{row['inferred_fee']} sats",
+                           f"{row['inferred_fee_rate']:.2f} sats/vB", f"{row['vsize']} vB" if row["vsize"] is not None else "",
+                           str(row["change_index"]) if row["change_index"] != -1 else "none")
 
+    def close(self):
+        hidden = self.totals.count - self.max_rows
+        if hidden > 0:
+            self.table.add_row(f"... {hidden} more", "", "", "", "", "", "")
+        self.console.print(self.table)
+        self.console.print(self.totals.summary())
 
+RENDERERS = {"jsonl": JsonLinesRenderer, "csv": CsvRenderer, "summary": SummaryRenderer, "rich": RichRenderer}
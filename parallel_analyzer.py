@@ -0,0 +1,98 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import batch_analyzer
+import psbt_analyzer
+
+def iter_chunks(iterable, chunk_size):
+    """Lazily splits an iterable into lists of at most chunk_size items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def worker_settings() -> dict:
+    """
+    The analyzer settings made in the parent process, which workers started
+    without fork (spawn or forkserver) would otherwise not inherit.
+    """
+    return {"mempool_model": psbt_analyzer.mempool_model, "parser": psbt_analyzer.default_parser,
+            "script_cache_size": psbt_analyzer.script_info_cache.maxsize}
+
+def init_worker(settings=None):
+    """Keeps worker output off the JSON stream written by the parent process and applies its settings."""
+    psbt_analyzer.console = batch_analyzer.console
+    if settings is not None:
+        psbt_analyzer.mempool_model = settings["mempool_model"]
+        psbt_analyzer.default_parser = settings["parser"]
+        psbt_analyzer.script_info_cache.resize(settings["script_cache_size"])
+
+def analyze_chunk(chunk, fee_rates=None, timings=False, audit=False):
+    """Analyzes a chunk of (psbt_id, psbt_base64) pairs inside a worker process."""
+    return [batch_analyzer.analyze_record(psbt_id, psbt_base64, fee_rates, timings, audit) for psbt_id, psbt_base64 in chunk]
+
+def failed_chunk_records(chunk, error):
+    """Builds error records for a chunk whose worker died before returning results."""
+    return [{"id": psbt_id, "analysis": None, "error": f"Worker failed: {error!r}"} for psbt_id, _ in chunk]
+
+def analyze_parallel(psbts, workers=None, chunk_size=64, ordered=True, max_pending_chunks=None, fee_rates=None, timings=False, audit=False):
+    """
+    Fans (psbt_id, psbt_base64) pairs out across a process pool and yields one
+    record per PSBT. PSBTs are submitted in chunks to amortize pickling and at
+    most max_pending_chunks chunks are in flight, so memory stays bounded.
+    Results come back in input order unless ordered is False, in which case
+    they are yielded as soon as they complete (each record carries its id).
+    Pass fee_rates so workers share one fee fetch instead of each making their own,
+    and timings to have every record carry its per-stage durations and counters.
+    With audit records carry the references batch_analyzer.write_records indexes
+    in the parent, so the audit index only ever has one writer.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending_chunks = max_pending_chunks or workers * 2
+    settings = worker_settings()
+    new_pool = lambda: ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(settings,))
+    pool = new_pool()
+    pending = deque()
+
+    def collect(future, chunk, submitted_to):
+        nonlocal pool
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed or out of memory), start a fresh pool for the remaining chunks
+            if submitted_to is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = new_pool()
+            return failed_chunk_records(chunk, e)
+        except Exception as e:
+            return failed_chunk_records(chunk, e)
+
+    def drain_one():
+        if ordered:
+            return collect(*pending.popleft())
+        done, _ = wait([item[0] for item in pending], return_when=FIRST_COMPLETED)
+        records = []
+        for item in list(pending):
+            if item[0] in done:
+                pending.remove(item)
+                records.extend(collect(*item))
+        return records
+
+    try:
+        for chunk in iter_chunks(psbts, chunk_size):
+            while len(pending) >= max_pending_chunks:
+                yield from drain_one()
+            try:
+                future = pool.submit(analyze_chunk, chunk, fee_rates, timings, audit)
+            except BrokenProcessPool:
+                pool = new_pool()
+                future = pool.submit(analyze_chunk, chunk, fee_rates, timings, audit)
+            pending.append((future, chunk, pool))
+        while pending:
+            yield from drain_one()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,21 +1,42 @@
 import argparse
-from rich.console import Console
-from rich.prompt import Prompt, Confirm
-from bitcointx.core.psbt import PartiallySignedTransaction
-from bitcointx.core.script import CScript
+import contextlib
+import json
+import sys
 from bitcointx.wallet import CBitcoinAddress
-import copy
+from coin_selection import coin_selection, STRATEGIES
+import analysis_model
+import change_heuristics
+import console_util
 import fee_service
-import output_util
-import random
+import instrumentation
+import psbt_io
+import script_cache
+import script_classifier
+import weight_engine
 
-script_types = ['pubkeyhash', 'scripthash', 'witness_v0_keyhash', 'witness_v0_scripthash', 'witness_v1_taproot']
+script_types = script_classifier.SCRIPT_TYPES
 
-# Initialize Rich console for pretty output
-console = Console()
+# Rich console for pretty output, Rich (and output_util) are only imported once something is shown
+console = console_util.LazyConsole()
+
+# Decoder used by parse_psbt_analysis: 'fast' extracts only what the analysis needs, 'bitcointx' fully validates
+PSBT_PARSERS = ['fast', 'bitcointx']
+default_parser = 'fast'
+
+# Shared by the interactive and batch paths, see script_cache.ScriptInfoCache.stats() for hit/miss counters
+script_info_cache = script_cache.ScriptInfoCache()
+
+# mempool_model.MempoolModel fee suggestions are based on when set, instead of the recommended fees alone
+mempool_model = None
+
+# result_cache.AnalysisCache parse_psbt_analysis serves repeated PSBTs from when set
+analysis_cache = None
 
 def get_script_and_address_info(script_pubkey):
-    script_type = CScript(script_pubkey)
+    """Returns (script_type, address, address_type), memoized on the raw script bytes."""
+    return script_info_cache.get_or_compute(script_pubkey, derive_script_and_address_info)
+
+def derive_script_and_address_info(script_pubkey):
     try:
         address_obj = CBitcoinAddress.from_scriptPubKey(script_pubkey)
         address = str(address_obj)
@@ -24,38 +45,14 @@ def get_script_and_address_info(script_pubkey):
         address = "Non-standard"
         address_type = "Non-standard"
 
-    return (get_script_type(script_type), address, address_type)
+    return (get_script_type(script_pubkey), address, address_type)
 
 def get_script_type(script):
-    if script.is_p2pkh():
-        script_type = 'pubkeyhash'
-    elif script.is_p2sh():
-        script_type = 'scripthash'
-    elif script.is_witness_v0_keyhash():
-        script_type = 'witness_v0_keyhash'
-    elif script.is_witness_v0_scripthash():
-        script_type = 'witness_v0_scripthash'
-    elif script.is_witness_v1_taproot():
-        script_type = 'witness_v1_taproot'
-    else:
-        script_type = 'unknown'
-    
-    return script_type
+    return script_classifier.classify_script(script)
 
 def estimate_input_vbytes_from_script_type(script_type):
     # Estimate input contribution to vsize based on script type
-    if script_type in ['pubkeyhash', 'scripthash']:
-        input_vb = 148
-    elif script_type == 'witness_v0_keyhash':
-        input_vb = 68
-    elif script_type == 'witness_v0_scripthash':
-        input_vb = 100
-    elif script_type == 'witness_v1_taproot':
-        input_vb = 58
-    else:
-        input_vb = 148
-
-    return input_vb
+    return script_classifier.input_vbytes(script_type)
 
 def estimate_output_vbyte_from_script(script):
     script_len = len(script)
@@ -64,41 +61,30 @@ def estimate_output_vbyte_from_script(script):
 
 def estimate_output_vbyte_from_script_type(script_type):
     # Simplified: assuming standard script lengths
-    if script_type == 'pubkeyhash':
-        return 25
-    elif script_type == 'scripthash':
-        return 23
-    elif script_type == 'witness_v0_keyhash':
-        return 22
-    elif script_type == 'witness_v0_scripthash':
-        return 34
-    elif script_type == 'witness_v1_taproot':
-        return 34
-    else:
-        return 34  # default
-
-def is_output_likely_change(psbt_out, amount, address, address_type, input_address_types, input_addresses):
-    """Does a best effort check of which output is change."""
-    is_likely_change = False
-    change_reason = ""
-    if hasattr(psbt_out, 'bip32_derivation') and psbt_out.bip32_derivation or psbt_out.redeem_script or psbt_out.witness_script:
-        is_likely_change = True
-        change_reason = "Has BIP32 derivation or script metadata"
-    else:
-        is_round = (amount % 100000 == 0)
-        if address_type in input_address_types and address not in input_addresses and 'OP_RETURN' not in address_type and not is_round:
-            is_likely_change = True
-            change_reason = "Has fresh address of matching type, non-round amount"
-    
-    return (is_likely_change, change_reason)
+    return script_classifier.output_script_vbytes(script_type)
 
 def fee_reasonableness_suggestion(rate: float, estimates: dict) -> str:
-    """Determines fee reasonableness based on calculated rate."""
+    """
+    Determines fee reasonableness based on calculated rate, from the mempool
+    snapshot when one is loaded and from the recommended fees otherwise.
+    """
+    if mempool_model is not None:
+        return mempool_model.suggestion(rate)
+    # Flag when live fees couldn't be fetched, the built-in defaults may be far off
+    note = " (Compared against the built-in default fees as live fees were unavailable.)" if estimates is fee_service.sample_response_upon_failure else ""
     if rate < estimates["halfHourFee"]:
-        return f"The fee rate of {rate:.2f} sats/vB seems low. It may take longer than 30 minutes to confirm."
+        return f"The fee rate of {rate:.2f} sats/vB seems low. It may take longer than 30 minutes to confirm.{note}"
     if rate > estimates["fastestFee"]:
-        return f"The fee rate of {rate:.2f} sats/vB is very high. You might be overpaying."
-    return f"The fee rate of {rate:.2f} sats/vB is reasonable for a fast confirmation."
+        return f"The fee rate of {rate:.2f} sats/vB is very high. You might be overpaying.{note}"
+    return f"The fee rate of {rate:.2f} sats/vB is reasonable for a fast confirmation.{note}"
+
+def analysis_fee_suggestion(fee: int, rate: float, net_value: int, estimates: dict) -> str:
+    """Fee suggestion for an analysis, net_value being the inputs minus the outputs before negative fees are zeroed."""
+    return "Invalid: negative fee" if fee == 0 and net_value < 0 else fee_reasonableness_suggestion(rate, estimates)
+
+def confirmation_estimate(rate: float):
+    """Returns the expected blocks to confirm and mempool percentile for rate, or None without a mempool snapshot."""
+    return mempool_model.confirmation(rate) if mempool_model is not None else None
 
 def format_script_type_summary(inputs: list, outputs: list) -> str:
     """Determines the script type summary based on inputs and outputs script types."""
@@ -107,6 +93,10 @@ def format_script_type_summary(inputs: list, outputs: list) -> str:
         if 'script_type' in item:
             script_types.add(item['script_type'])
 
+    return summarize_script_types(script_types)
+
+def summarize_script_types(script_types: set) -> str:
+    """Describes the efficiency and privacy of a set of script types."""
     summary = []
     if 'witness_v1_taproot' in script_types:
         summary.append("Taproot scripts are used, providing maximum efficiency and privacy.")
@@ -118,111 +108,152 @@ def format_script_type_summary(inputs: list, outputs: list) -> str:
     return " ".join(summary)
 
 
-def parse_psbt_input(psbt_base64: str):
-    """Analyzes the original PSBT input."""
-    try:
-        psbt_obj = PartiallySignedTransaction.from_base64(b64_data = psbt_base64)
-
-        parsed_data = {
-            "version": psbt_obj.version,
-            "inputs": [],
-            "outputs": [],
-        }
-
-        total_btc_input_amount = 0
-        total_btc_output_amount = 0
-        estimated_total_input_size = 0
-        estimate_output_vbytes = 0
-
-        input_address_types = []
-        input_addresses = []
-        for i, txin in enumerate(psbt_obj.unsigned_tx.vin):
-            psbt_in = psbt_obj.inputs[i]
-            if psbt_in.witness_utxo:
-                utxo = psbt_in.witness_utxo
-            elif psbt_in.non_witness_utxo:
-                prev_tx = psbt_in.non_witness_utxo
-                utxo = prev_tx.vout[txin.prevout.n]
-            else:
-                console.print(f"Input {i}: No UTXO info available")
-                continue
-            
-            (script_type, address, address_type) = get_script_and_address_info(utxo.scriptPubKey)
-            input_address_types.append(address_type)
-            input_addresses.append(address)
-
-            estimated_input_vbytes = estimate_input_vbytes_from_script_type(script_type)
-            estimated_total_input_size += estimated_input_vbytes
-            amount = utxo.nValue
-            total_btc_input_amount += amount
-
-            parsed_data["inputs"].append({
-                "amount": amount,
-                "script_type": script_type,
-                "address": address,
-                "address_type": address_type,
-                "estimated_input_vbytes": estimated_input_vbytes
-            })
-
-        likely_change_output_index = -1
-        change_reason = ""
-        for i, txout in enumerate(psbt_obj.unsigned_tx.vout):
-            psbt_out = psbt_obj.outputs[i]
-            script = txout.scriptPubKey
-
-            (script_type, address, address_type) = get_script_and_address_info(script)
-            estimated_size = estimate_output_vbyte_from_script(script)
-            estimate_output_vbytes += estimated_size
-            amount = txout.nValue
-            total_btc_output_amount += amount
-
-            parsed_data["outputs"].append({
-                "amount": amount,
-                "script_type": script_type,
-                "address": address,
-                "address_type": address_type,
-                "estimated_output_vb": estimated_size
-            })
-
-            is_likely_change, change_reason = is_output_likely_change(psbt_out, amount, address, address_type, input_address_types, input_addresses)
-            if is_likely_change:
-                likely_change_output_index = i
-
-        fee = total_btc_input_amount - total_btc_output_amount
-        input_count = len(psbt_obj.unsigned_tx.vin)
-        output_count = len(psbt_obj.unsigned_tx.vout)
-        input_varint = 1 if input_count < 253 else 3
-        output_varint = 1 if output_count < 253 else 3
-        total_estimated_vbytes = estimated_total_input_size + estimate_output_vbytes + 10 + input_varint + output_varint
-        fee_rate = fee / total_estimated_vbytes if total_estimated_vbytes > 0 else 0
-        
-        if fee < 0:
-            console.print("[bold red]Warning: Negative fee detected in parsing![/bold red]")
-            fee = 0
-            fee_rate = 0
+def set_mempool_model(source):
+    """Loads a mempool snapshot (file or URL) once for every following fee suggestion, or clears it with None."""
+    global mempool_model
+    import mempool_model as mempool
+    mempool_model = mempool.load_model(source) if source else None
 
-        parsed_data["inferred_fee"] = fee
-        parsed_data["inferred_fee_rate"] = fee_rate
-        
-        fetched_fee_rates = fee_service.get_recommended_fees()
-        fee_reasonableness = {
-            "suggestion": "Invalid: negative fee" if fee == 0 and total_btc_input_amount - total_btc_output_amount < 0 else fee_reasonableness_suggestion(fee_rate, fetched_fee_rates),
-        }
-
-        parsed_data["change_output"] = parsed_data["outputs"][likely_change_output_index] if likely_change_output_index != -1 else {}
-        if parsed_data["change_output"]:
-            parsed_data["change_output"]["reason"] = change_reason
+def set_analysis_cache(path, max_entries=100_000):
+    """Opens (or creates) the on-disk analysis cache at path for every following analysis, or closes it with None."""
+    global analysis_cache
+    import result_cache
+    if analysis_cache is not None:
+        analysis_cache.close()
+    analysis_cache = result_cache.AnalysisCache(path, max_entries) if path else None
+
+def analyze_psbt_object(psbt_obj, fee_rates: dict = None):
+    """
+    Analyzes an already loaded PSBT (from either parser) into an analysis_model.Analysis.
+    Inputs without any UTXO info are left out of the analysis.
+    """
+    inputs = []
+    outputs = []
+    total_btc_input_amount = 0
+    total_btc_output_amount = 0
+    with instrumentation.stage("weight"):
+        tx_weight = weight_engine.compute_psbt_weight(psbt_obj)
+    instrumentation.count("inputs", len(psbt_obj.unsigned_tx.vin))
+    instrumentation.count("outputs", len(psbt_obj.unsigned_tx.vout))
+
+    for i, txin in enumerate(psbt_obj.unsigned_tx.vin):
+        psbt_in = psbt_obj.inputs[i]
+        if psbt_in.witness_utxo:
+            utxo = psbt_in.witness_utxo
+        elif psbt_in.non_witness_utxo:
+            prev_tx = psbt_in.non_witness_utxo
+            utxo = prev_tx.vout[txin.prevout.n]
+        else:
+            console.print(f"Input {i}: No UTXO info available")
+            continue
         
-        parsed_data["fee_reasonableness"] = fee_reasonableness
-        parsed_data["total_input_value"] = total_btc_input_amount
-        parsed_data["total_output_value"] = total_btc_output_amount
-        parsed_data["script_summary"] = format_script_type_summary(parsed_data["inputs"], parsed_data["outputs"])
+        (script_type, address, address_type) = get_script_and_address_info(utxo.scriptPubKey)
+
+        input_weight = tx_weight["inputs"][i]
+        estimated_input_vbytes = -(-input_weight["weight"] // weight_engine.WITNESS_SCALE_FACTOR)
+        amount = utxo.nValue
+        total_btc_input_amount += amount
+
+        inputs.append(analysis_model.InputInfo(amount, script_type, address, address_type, estimated_input_vbytes, input_weight["weight"], input_weight["source"]))
+
+    for txout in psbt_obj.unsigned_tx.vout:
+        script = txout.scriptPubKey
+
+        (script_type, address, address_type) = get_script_and_address_info(script)
+        estimated_size = estimate_output_vbyte_from_script(script)
+        amount = txout.nValue
+        total_btc_output_amount += amount
 
-        return parsed_data
+        outputs.append(analysis_model.OutputInfo(amount, script_type, address, address_type, estimated_size))
+
+    fee = total_btc_input_amount - total_btc_output_amount
+    total_estimated_vbytes = tx_weight["vsize"]
+    fee_rate = fee / total_estimated_vbytes if total_estimated_vbytes > 0 else 0
+    
+    if fee < 0:
+        console.print("[bold red]Warning: Negative fee detected in parsing![/bold red]")
+        fee = 0
+        fee_rate = 0
+
+    with instrumentation.stage("fee_fetch"):
+        fetched_fee_rates = fee_rates or fee_service.get_recommended_fees()
+    suggestion = analysis_fee_suggestion(fee, fee_rate, total_btc_input_amount - total_btc_output_amount, fetched_fee_rates)
+
+    with instrumentation.stage("change_heuristics"):
+        change_index, change_reason, change_candidates = change_heuristics.evaluate_change(inputs, outputs, psbt_obj.outputs, fee)
+    if change_index != -1:
+        outputs[change_index].reason = change_reason
+
+    return analysis_model.Analysis(
+        version=psbt_obj.version,
+        inputs=inputs,
+        outputs=outputs,
+        inferred_fee=fee,
+        inferred_fee_rate=fee_rate,
+        vsize=total_estimated_vbytes,
+        change_index=change_index,
+        fee_suggestion=suggestion,
+        total_input_value=total_btc_input_amount,
+        total_output_value=total_btc_output_amount,
+        script_summary=summarize_script_types({item.script_type for item in inputs + outputs}),
+        confirmation=confirmation_estimate(fee_rate),
+        change_candidates=change_candidates,
+    )
+
+def parse_psbt_analysis(psbt_base64, raise_errors: bool = False, fee_rates: dict = None, parser: str = None):
+    """
+    Analyzes the original PSBT input into a compact analysis_model.Analysis.
+    The PSBT may be base64 or hex text, or a raw binary buffer (see psbt_io.load_psbt).
+    Errors are re-raised instead of printed if raise_errors is set.
+    Pass fee_rates to reuse already fetched recommended fees instead of asking fee_service.
+    parser picks the PSBT decoder, see PSBT_PARSERS (defaults to default_parser).
+    """
+    try:
+        if analysis_cache is not None:
+            return cached_psbt_analysis(psbt_base64, fee_rates, parser)
+        psbt_obj = psbt_io.load_psbt(psbt_base64, parser or default_parser)
+        return analyze_psbt_object(psbt_obj, fee_rates)
     except Exception as e:
+        if raise_errors:
+            raise
         console.print(f"[bold red]Error parsing PSBT with python-bitcointx:[/bold red] {e}")
         return None
 
+def cached_psbt_analysis(psbt_data, fee_rates: dict = None, parser: str = None):
+    """
+    parse_psbt_analysis through analysis_cache: a PSBT analyzed before is
+    served from the cache with only its fee suggestion and confirmation
+    estimate recomputed against the current fees, anything else is analyzed
+    and stored. Errors are raised.
+    """
+    import result_cache
+    with instrumentation.stage("result_cache"):
+        key = result_cache.psbt_key(psbt_data)
+        stored = analysis_cache.get(key)
+    if stored is None:
+        instrumentation.count("result_cache_misses")
+        analysis = analyze_psbt_object(psbt_io.load_psbt(psbt_data, parser or default_parser), fee_rates)
+        with instrumentation.stage("result_cache"):
+            analysis_cache.put(key, analysis)
+        return analysis
+
+    instrumentation.count("result_cache_hits")
+    analysis = result_cache.restore_analysis(stored)
+    with instrumentation.stage("fee_fetch"):
+        fetched_fee_rates = fee_rates or fee_service.get_recommended_fees()
+    analysis.fee_suggestion = analysis_fee_suggestion(analysis.inferred_fee, analysis.inferred_fee_rate,
+                                                      analysis.total_input_value - analysis.total_output_value, fetched_fee_rates)
+    analysis.confirmation = confirmation_estimate(analysis.inferred_fee_rate)
+    return analysis
+
+def parse_psbt_input(psbt_base64, raise_errors: bool = False, fee_rates: dict = None, parser: str = None):
+    """
+    Analyzes the original PSBT input. Errors are re-raised instead of printed if raise_errors is set.
+    Pass fee_rates to reuse already fetched recommended fees instead of asking fee_service.
+    """
+    analysis = parse_psbt_analysis(psbt_base64, raise_errors, fee_rates, parser)
+    return analysis.to_dict() if analysis is not None else None
+
 def get_utxos_from_inputs(inputs):
     """Extract UTXOs from parsed inputs for simulation."""
     utxos = []
@@ -241,91 +272,8 @@ def calculate_target_amount(parsed_data):
     else:
         return parsed_data['total_output_value']
 
-def estimate_tx_vsize(num_inputs, num_outputs, input_vbytes_list, output_vbytes_list):
-    """Estimate total vsize for edited PSBTs."""
-    base_size = 10  # version + locktime
-    input_varint = 1 if num_inputs < 253 else 3
-    output_varint = 1 if num_outputs < 253 else 3
-    total_input_vbytes = sum(input_vbytes_list)
-    total_output_vbytes = sum(output_vbytes_list)
-    return base_size + input_varint + output_varint + total_input_vbytes + total_output_vbytes
-
-def coin_selection(utxos, target, fee_rate, strategy='largest_first', change_output_vbytes=34, target_output_vbytes=[34], force_no_change=False, num_outputs=0):
-    """Basic coin selection simulation based on strategy."""
-    if strategy == 'smallest_first':
-        utxos = sorted(utxos, key=lambda x: x['amount'])
-    elif strategy == 'largest_first':
-        utxos = sorted(utxos, key=lambda x: x['amount'], reverse=True)
-    elif strategy == 'random':
-        utxos = random.sample(utxos, len(utxos))
-    else:
-        raise ValueError("Unknown strategy")
-    
-    selected = []
-    total = 0
-    selected_vbytes = []
-    
-    for utxo in utxos:
-        selected.append(utxo)
-        total += utxo['amount']
-        selected_vbytes.append(utxo['estimated_vbytes'])
-        
-        if force_no_change:
-            # Only try no change
-            output_vbytes_list = target_output_vbytes
-            vsize = estimate_tx_vsize(len(selected), num_outputs, selected_vbytes, output_vbytes_list)
-            min_fee = int(vsize * fee_rate)
-            if total >= target + min_fee:
-                actual_fee = total - target  # excess goes to fee
-                return {
-                    'selected': [s['amount'] for s in selected],
-                    'total_input': total,
-                    'fee': actual_fee,
-                    'change': 0,
-                    'vsize': vsize,
-                    'effective_rate': actual_fee / vsize
-                }
-        else:
-            # Estimate vsize with change output if needed
-            num_outputs_w_change = num_outputs + 1  # targets + change
-            output_vbytes_list = target_output_vbytes + [change_output_vbytes]
-            vsize = estimate_tx_vsize(len(selected), num_outputs_w_change, selected_vbytes, output_vbytes_list)
-            fee = int(vsize * fee_rate)  # int for sats
-            
-            if total >= target + fee:
-                change = total - target - fee
-                if change > 546:  # dust threshold approx
-                    return {
-                        'selected': [s['amount'] for s in selected],
-                        'total_input': total,
-                        'fee': fee,
-                        'change': change,
-                        'vsize': vsize,
-                        'effective_rate': fee / vsize
-                    }
-                else:
-                    # No change
-                    output_vbytes_list = target_output_vbytes
-                    vsize = estimate_tx_vsize(len(selected), num_outputs, selected_vbytes, output_vbytes_list)
-                    fee = int(vsize * fee_rate)
-                    if total >= target + fee:
-                        actual_fee = fee + (total - (target + fee))  # add excess to fee if any
-                        return {
-                            'selected': [s['amount'] for s in selected],
-                            'total_input': total,
-                            'fee': actual_fee,
-                            'change': 0,
-                            'vsize': vsize,
-                            'effective_rate': actual_fee / vsize
-                        }
-    
-    return None  # Insufficient funds
-
-def simulate_coin_selection(parsed_data, fee_rate):
-    """Simulate coin selection based on parsed data."""
-    if parsed_data['inferred_fee'] < 0:
-        return {"error": "Negative fee, simulation skipped"}
-    
+def coin_selection_params(parsed_data):
+    """Derives the UTXOs, target and output sizes a coin selection simulation needs from parsed data."""
     utxos = get_utxos_from_inputs(parsed_data['inputs'])
     target = calculate_target_amount(parsed_data)
     
@@ -335,13 +283,19 @@ def simulate_coin_selection(parsed_data, fee_rate):
     target_output_vbytes = [out['estimated_output_vb'] for out in non_change_outputs]
     
     force_no_change = not bool(parsed_data['change_output'])
+    return (utxos, target, change_output_vbytes, target_output_vbytes, force_no_change)
+
+def simulate_coin_selection(parsed_data, fee_rate, seed=None):
+    """Simulate coin selection based on parsed data. Pass seed to make the randomized strategies reproducible."""
+    if parsed_data['inferred_fee'] < 0:
+        return {"error": "Negative fee, simulation skipped"}
     
-    strategies = ['largest_first', 'smallest_first', 'random']
+    utxos, target, change_output_vbytes, target_output_vbytes, force_no_change = coin_selection_params(parsed_data)
     
     results = {}
-    for strategy in strategies:
-        # Pass a copy of utxos to each call to ensure independence
-        result = coin_selection(copy.deepcopy(utxos), target, fee_rate, strategy, change_output_vbytes, target_output_vbytes, force_no_change, len(parsed_data["outputs"]))
+    for strategy in STRATEGIES:
+        # coin_selection never mutates utxos so every strategy can share the same list
+        result = coin_selection(utxos, target, fee_rate, strategy, change_output_vbytes, target_output_vbytes, force_no_change, len(parsed_data["outputs"]), seed=seed)
         if result:
             results[strategy] = result
         else:
@@ -349,10 +303,22 @@ def simulate_coin_selection(parsed_data, fee_rate):
     
     return results
 
+def simulate_coin_selection_sweep(parsed_data, fee_rates, seed=None):
+    """
+    Runs the greedy strategies over many fee rates at once with the vectorized
+    NumPy simulator, returning a columnar table per (strategy, fee rate).
+    """
+    import coin_simulator  # numpy is only needed for fee rate sweeps
+    utxos, target, change_output_vbytes, target_output_vbytes, force_no_change = coin_selection_params(parsed_data)
+    return coin_simulator.simulate_fee_rate_grid(utxos, target, fee_rates, change_output_vbytes, target_output_vbytes, force_no_change, len(parsed_data["outputs"]), seed=seed)
+
 # For editing PSBT - since we can't easily edit the PSBT object and re-sign, we'll edit the parsed_data structure
 # and assume re-analysis on modified data
-def edit_parsed_data(parsed_data):
+def edit_parsed_data(parsed_data, fee_rates=None):
     """Creates the interface for editing the PSBT via the command line."""
+    from rich.prompt import Prompt
+    import edit_session
+    session = edit_session.EditSession(parsed_data, fee_rates)
     while True:
         console.print("\n[bold]Edit Menu:[/bold]")
         console.print("1. Add input")
@@ -360,175 +326,382 @@ def edit_parsed_data(parsed_data):
         console.print("3. Add output")
         console.print("4. Remove output")
         console.print("5. Change output amount")
-        console.print("6. Done editing")
+        console.print("6. Undo")
+        console.print("7. Redo")
+        console.print("8. Done editing")
         
-        choice = Prompt.ask("Choose an option", choices=["1","2","3","4","5","6"])
+        choice = Prompt.ask("Choose an option", choices=["1","2","3","4","5","6","7","8"])
         
         if choice == "1":
             amount = int(Prompt.ask("Enter input amount (sats)"))
             script_type = Prompt.ask("Enter script type", choices=script_types)
-            estimated_vbytes = estimate_input_vbytes_from_script_type(script_type)
-            parsed_data['inputs'].append({
-                'amount': amount,
-                'script_type': script_type,
-                'address': 'edited',
-                'address_type': 'edited',
-                'estimated_input_vbytes': estimated_vbytes
-            })
+            session.add_input(amount, script_type)
             console.print("Input added.")
         
         elif choice == "2":
             console.print("Inputs:")
-            for i, inp in enumerate(parsed_data['inputs']):
-                console.print(f"{i}: {inp['amount']} sats, {inp['script_type']}")
+            for i, inp in enumerate(session.inputs):
+                console.print(f"{i}: {inp.amount} sats, {inp.script_type}")
             idx = int(Prompt.ask("Enter index to remove"))
-            if 0 <= idx < len(parsed_data['inputs']):
-                del parsed_data['inputs'][idx]
+            if 0 <= idx < len(session.inputs):
+                session.remove_input(idx)
                 console.print("Input removed.")
         
         elif choice == "3":
             amount = int(Prompt.ask("Enter output amount (sats)"))
             script_type = Prompt.ask("Enter script type", choices=script_types)
-            estimated_vb = estimate_output_vbyte_from_script_type(script_type)
-            parsed_data['outputs'].append({
-                'amount': amount,
-                'script_type': script_type,
-                'address': 'edited',
-                'address_type': 'edited',
-                'estimated_output_vb': estimated_vb
-            })
+            session.add_output(amount, script_type)
             console.print("Output added.")
         
         elif choice == "4":
             console.print("Outputs:")
-            for i, out in enumerate(parsed_data['outputs']):
-                console.print(f"{i}: {out['amount']} sats, {out['script_type']}")
+            for i, out in enumerate(session.outputs):
+                console.print(f"{i}: {out.amount} sats, {out.script_type}")
             idx = int(Prompt.ask("Enter index to remove"))
-            if 0 <= idx < len(parsed_data['outputs']):
-                del parsed_data['outputs'][idx]
+            if 0 <= idx < len(session.outputs):
+                session.remove_output(idx)
                 console.print("Output removed.")
         
         elif choice == "5":
             console.print("Outputs:")
-            for i, out in enumerate(parsed_data['outputs']):
-                console.print(f"{i}: {out['amount']} sats, {out['script_type']}")
+            for i, out in enumerate(session.outputs):
+                console.print(f"{i}: {out.amount} sats, {out.script_type}")
             idx = int(Prompt.ask("Enter index to change"))
-            if 0 <= idx < len(parsed_data['outputs']):
+            if 0 <= idx < len(session.outputs):
                 new_amount = int(Prompt.ask("Enter new amount (sats)"))
-                parsed_data['outputs'][idx]['amount'] = new_amount
+                session.set_output_amount(idx, new_amount)
                 console.print("Amount updated.")
         
         elif choice == "6":
-            break
-    
-    # Recompute totals and vbytes
-    parsed_data['total_input_value'] = sum(inp['amount'] for inp in parsed_data['inputs'])
-    parsed_data['total_output_value'] = sum(out['amount'] for out in parsed_data['outputs'])
-    
-    estimated_total_input_size = sum(inp['estimated_input_vbytes'] for inp in parsed_data['inputs'])
-    estimate_output_vbytes = sum(out['estimated_output_vb'] for out in parsed_data['outputs'])
-    input_count = len(parsed_data['inputs'])
-    output_count = len(parsed_data['outputs'])
-    input_varint = 1 if input_count < 253 else 3
-    output_varint = 1 if output_count < 253 else 3
-    total_estimated_vbytes = estimated_total_input_size + estimate_output_vbytes + 10 + input_varint + output_varint
-    
-    # Assume last output as change after edit if multiple outputs
-    if len(parsed_data['outputs']) > 1:
-        likely_change_output_index = len(parsed_data['outputs']) - 1
-        parsed_data['change_output'] = parsed_data['outputs'][likely_change_output_index]
-        parsed_data['change_output']['reason'] = "Assumed last output as change after edit"
-    else:
-        parsed_data['change_output'] = {}
-    
-    # Adjust change output if present
-    if parsed_data['change_output']:
-        non_change_outputs = [out for out in parsed_data['outputs'] if out != parsed_data['change_output']]
-        target = sum(out['amount'] for out in non_change_outputs)
+            console.print("Edit undone." if session.undo() else "Nothing to undo.")
         
-        fetched_fee_rates = fee_service.get_recommended_fees()
-        fee_rate = fetched_fee_rates['hourFee']  # Use hourFee for reasonable confirmation
+        elif choice == "7":
+            console.print("Edit redone." if session.redo() else "Nothing to redo.")
         
-        fee = int(total_estimated_vbytes * fee_rate)
-        
-        if parsed_data['total_input_value'] >= target + fee + 546:  # dust threshold
-            new_change = parsed_data['total_input_value'] - target - fee
-            parsed_data['change_output']['amount'] = new_change
-            parsed_data['total_output_value'] = target + new_change
-            parsed_data['inferred_fee'] = fee
-            parsed_data['inferred_fee_rate'] = fee_rate
-            parsed_data['fee_reasonableness']['suggestion'] = fee_reasonableness_suggestion(fee_rate, fetched_fee_rates)
-        else:
-            # Try without change
-            vbytes_without_change = total_estimated_vbytes - parsed_data['change_output']['estimated_output_vb']
-            if output_count - 1 < 253 and output_count >= 253:
-                vbytes_without_change -= 2  # from 3 to 1
-            fee_without = int(vbytes_without_change * fee_rate)
-            if parsed_data['total_input_value'] >= target + fee_without:
-                console.print("[yellow]Change would be dust or negative; removing change output and adjusting fee.[/yellow]")
-                parsed_data['outputs'].pop(likely_change_output_index)
-                parsed_data['total_output_value'] = target
-                parsed_data['inferred_fee'] = parsed_data['total_input_value'] - target
-                parsed_data['inferred_fee_rate'] = parsed_data['inferred_fee'] / vbytes_without_change if vbytes_without_change > 0 else 0
-                parsed_data['change_output'] = {}
-                parsed_data['fee_reasonableness']['suggestion'] = fee_reasonableness_suggestion(parsed_data['inferred_fee_rate'], fetched_fee_rates)
-            else:
-                console.print("[bold red]Insufficient funds even without change.[/bold red]")
-                parsed_data['inferred_fee'] = parsed_data['total_input_value'] - parsed_data['total_output_value']
-                parsed_data['inferred_fee_rate'] = 0
-    else:
-        # No change, excess to fee
-        parsed_data['inferred_fee'] = parsed_data['total_input_value'] - parsed_data['total_output_value']
-        parsed_data['inferred_fee_rate'] = parsed_data['inferred_fee'] / total_estimated_vbytes if total_estimated_vbytes > 0 else 0
-        fetched_fee_rates = fee_service.get_recommended_fees()
-        parsed_data['fee_reasonableness']['suggestion'] = fee_reasonableness_suggestion(parsed_data['inferred_fee_rate'], fetched_fee_rates)
+        elif choice == "8":
+            break
     
-    parsed_data['script_summary'] = format_script_type_summary(parsed_data['inputs'], parsed_data['outputs'])
+    # Totals are kept up to date by the session, this only resolves change and fees
+    analysis = session.finalize()
+    if session.insufficient_funds:
+        console.print(f"[bold red]{session.warning}[/bold red]")
+    elif session.warning:
+        console.print(f"[yellow]{session.warning}[/yellow]")
     
-    return parsed_data
+    return analysis.to_dict()
+
+def print_json_result(analysis, error=None, timings=None):
+    """
+    Prints an {"analysis", "error"} record to stdout and returns the exit status for it.
+    The per-stage timings are only included when given.
+    """
+    record = {"analysis": analysis, "error": error}
+    if timings is not None:
+        record["timings"] = timings
+    print(json.dumps(record))
+    return 0 if error is None else 1
+
+def json_analysis(psbt_base64, fee_rates=None, timings=False):
+    """Analyzes a PSBT for --json output, returns (analysis, error, timings). timings is None unless asked for."""
+    if not psbt_base64:
+        return (None, "No PSBT given, use --psbt or --file.", None)
+    with instrumentation.tracing() if timings else contextlib.nullcontext() as trace:
+        try:
+            result = (parse_psbt_input(psbt_base64, raise_errors=True, fee_rates=fee_rates), None)
+        except Exception as e:
+            result = (None, str(e))
+    return result + (trace.to_dict() if trace else None,)
+
+def print_timings(timings):
+    """Prints the per-stage durations and counters of a trace with Rich."""
+    from rich.table import Table
+    table = Table(show_header=True, header_style="bold white")
+    table.add_column("Stage")
+    table.add_column("Time", justify="right")
+    for name, elapsed_ms in timings["stages_ms"].items():
+        table.add_row(name, f"{elapsed_ms:.3f} ms")
+    table.add_row("total", f"{timings['total_ms']:.3f} ms")
+    console.print("\n[bold yellow]Timings[/bold yellow]")
+    console.print(table)
+    console.print(", ".join(f"{name}: {value}" for name, value in timings["counters"].items()))
+
+def compare_psbts(source, sources, fee_rates=None, as_json=False):
+    """Diffs the PSBTs from sources against the baseline PSBT source yields, printed as JSON or with Rich."""
+    import batch_analyzer
+    import psbt_diff
+    try:
+        with source as baseline:
+            if not baseline:
+                raise ValueError("No baseline PSBT given, use --psbt or --file.")
+            comparisons = list(psbt_diff.compare_many(baseline, batch_analyzer.iter_psbt_sources(sources), fee_rates, default_parser))
+    except Exception as e:
+        error = "File not found." if isinstance(e, FileNotFoundError) else str(e)
+        if as_json:
+            print(json.dumps({"comparisons": None, "error": error}))
+            sys.exit(1)
+        console.print(f"[bold red]Error:[/bold red] {error}")
+        return
+
+    if as_json:
+        print(json.dumps({"comparisons": comparisons, "error": None}))
+        return
+    import output_util
+    for comparison in comparisons:
+        if comparison["error"] is not None:
+            console.print(f"[bold red]{comparison['id']}:[/bold red] {comparison['error']}")
+        else:
+            output_util.display_psbt_diff(comparison["id"], comparison["diff"])
+
+def fee_bump_plans(psbt_base64, target_rates, fee_rates=None, context_path=None):
+    """
+    Plans the cheapest RBF or CPFP fee bump of a PSBT for every target rate, returns (plans, error).
+    context_path is a JSON file with the wallet "utxos" and unconfirmed "ancestors"/"descendants" (see fee_bump).
+    """
+    import fee_bump
+    if not psbt_base64:
+        return (None, "No PSBT given, use --psbt or --file.")
+    try:
+        context = {}
+        if context_path:
+            with open(context_path, 'r') as f:
+                context = json.load(f)
+        analysis = parse_psbt_analysis(psbt_base64, raise_errors=True, fee_rates=fee_rates)
+        return (fee_bump.plan_fee_bumps(analysis, target_rates, context.get("utxos", ()), context.get("ancestors", ()), context.get("descendants", ()), context.get("cpfp_output")), None)
+    except Exception as e:
+        return (None, str(e))
+
+def fee_rate_sweep(psbt_base64, sweep_rates, fee_rates=None):
+    """Runs the vectorized coin selection sweep over sweep_rates for a PSBT, returns (sweep, error)."""
+    if not psbt_base64:
+        return (None, "No PSBT given, use --psbt or --file.")
+    try:
+        analysis = parse_psbt_analysis(psbt_base64, raise_errors=True, fee_rates=fee_rates)
+        return (simulate_coin_selection_sweep(analysis.to_dict(), sweep_rates), None)
+    except Exception as e:
+        return (None, str(e))
+
+def consolidation_plan(inventory_paths, fee_schedule=None, fee_rates=None, max_tx_weight=None, max_txs_per_window=None, output_type='witness_v0_keyhash'):
+    """
+    Plans consolidation transactions for the UTXOs in the inventory files over
+    a schedule of fee rates (the economy fee by default), returns (plan, error).
+    """
+    import consolidation_planner
+    try:
+        utxos = []
+        for path in inventory_paths:
+            utxos.extend(consolidation_planner.load_inventory(path))
+        if not fee_schedule:
+            fee_schedule = [(fee_rates or fee_service.get_recommended_fees())["economyFee"]]
+        return (consolidation_planner.plan_consolidation(utxos, fee_schedule, max_tx_weight or consolidation_planner.MAX_STANDARD_TX_WEIGHT, max_txs_per_window, output_type), None)
+    except Exception as e:
+        return (None, str(e))
+
+def run_audit(args, fee_rates=None):
+    """Opens the --audit-index to add --flag-scripts to, answer --audit-lookup queries from or audit a --batch with."""
+    import audit_index
+    with audit_index.AuditIndex(args.audit_index) as index:
+        if args.flag_scripts:
+            index.flag_scripts(audit_index.load_flagged_scripts(args.flag_scripts))
+        if args.audit_lookup:
+            print(json.dumps([index.lookup(value) for value in args.audit_lookup]))
+        if args.batch:
+            import batch_analyzer
+            batch_analyzer.console.quiet = args.quiet
+            batch_analyzer.run_batch(args.batch, args.output, args.workers, args.chunk_size, fee_rates, args.timings, index, args.report_format)
 
 def analyze_psbt():
     """
     Main function to handle command-line arguments and run the psbt analyzer.
     """
+    global default_parser, console
     parser = argparse.ArgumentParser(description="Bitcoin PSBT Analyzer & Optimizer")
     parser.add_argument("--psbt", type=str, help="PSBT Base64 string to analyze")
-    parser.add_argument("--file", type=str, help="Path to a PSBT file")
+    parser.add_argument("--file", type=str, help="Path to a PSBT file (base64, hex, binary or a PSBT archive)")
+    parser.add_argument("--index", type=int, default=0, help="Which PSBT to analyze when --file is a PSBT archive")
+    parser.add_argument("--batch", type=str, nargs="+", metavar="SOURCE", help="Non-interactively analyze PSBTs from directories, globs, files or '-' for newline-delimited base64 on stdin")
+    parser.add_argument("--output", type=str, help="Path to write batch JSON Lines results to (defaults to stdout)")
+    parser.add_argument("--report-format", choices=["jsonl", "csv", "summary", "rich"], default="jsonl", help="How --batch results are written: full JSON Lines records, one CSV row per PSBT, compact text columns or a Rich table (the last two list the first PSBTs and totals over all)")
+    parser.add_argument("--compare", type=str, nargs="+", metavar="SOURCE", help="Diff the PSBTs from these directories, globs or files against the --psbt/--file baseline")
+    parser.add_argument("--bump", type=float, nargs="+", metavar="RATE", help="Plan the cheapest RBF replacement or CPFP child reaching each target fee rate (sats/vB)")
+    parser.add_argument("--simulate-rates", type=float, nargs="+", metavar="RATE", help="Run the greedy coin selection strategies over each of these fee rates (sats/vB) in one vectorized sweep (needs numpy)")
+    parser.add_argument("--bump-context", type=str, metavar="FILE", help="JSON file with extra wallet \"utxos\" and the unconfirmed \"ancestors\"/\"descendants\" ({\"fee\", \"vsize\"}) for --bump")
+    parser.add_argument("--consolidate", type=str, nargs="+", metavar="INVENTORY", help="Plan consolidation transactions for the UTXOs in these CSV or JSON inventories (one per wallet)")
+    parser.add_argument("--fee-schedule", type=float, nargs="+", metavar="RATE", help="Fee rate windows (sats/vB) --consolidate may use, defaults to the current economy fee")
+    parser.add_argument("--max-tx-weight", type=int, help="Weight limit of each consolidation transaction (defaults to the 400000 standardness limit)")
+    parser.add_argument("--max-txs-per-window", type=int, help="Number of consolidation transactions each fee rate window can take")
+    parser.add_argument("--consolidate-to", choices=script_types, default='witness_v0_keyhash', help="Script type of the consolidation outputs")
+    parser.add_argument("--audit-index", type=str, metavar="PATH", help="SQLite index every --batch PSBT is checked against and added to, flagging double spends, reused addresses and flagged scripts across runs")
+    parser.add_argument("--flag-scripts", type=str, metavar="FILE", help="Add the known-bad scripts or addresses in FILE (one per line, optionally followed by a label) to --audit-index")
+    parser.add_argument("--audit-lookup", type=str, nargs="+", metavar="VALUE", help="Query --audit-index for the PSBTs spending an outpoint (txid:n) or paying a script (hex) or address")
+    parser.add_argument("--pack", type=str, metavar="ARCHIVE", help="Pack the --batch PSBTs into a single indexed PSBT archive instead of analyzing them")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for batch analysis (0 uses every core)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Number of PSBTs sent to a batch worker at a time")
+    parser.add_argument("--parser", choices=PSBT_PARSERS, default=default_parser, help="PSBT decoder, 'bitcointx' fully validates the PSBT instead of extracting only what the analysis needs")
+    parser.add_argument("--script-cache-size", type=int, default=4096, help="Number of scriptPubKeys to memoize address derivation for (0 disables the cache)")
+    parser.add_argument("--fee-url", type=str, help="Recommended fees endpoint to use instead of mempool.space")
+    parser.add_argument("--fee-snapshot", type=str, help="Path to persist the last fetched fees for fast cold starts")
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived daemon exposing analysis over a local JSON API")
+    parser.add_argument("--port", type=int, default=8335, help="Port for --serve to listen on (localhost only)")
+    parser.add_argument("--socket", type=str, help="Unix socket path for --serve to listen on instead of a port")
+    parser.add_argument("--json", action="store_true", help="Print the analysis as JSON and exit without any prompts")
+    parser.add_argument("--quiet", action="store_true", help="Suppress all Rich output, for use with --json or --batch")
+    parser.add_argument("--mempool-snapshot", type=str, metavar="SOURCE", help="JSON file or URL of a mempool snapshot (projected blocks or a fee histogram) to estimate confirmation times against")
+    parser.add_argument("--result-cache", type=str, metavar="PATH", help="SQLite file to keep analyses in, PSBTs seen before only get their fee suggestion recomputed")
+    parser.add_argument("--result-cache-size", type=int, default=100_000, help="Number of analyses --result-cache keeps before evicting the least recently used")
+    parser.add_argument("--offline", action="store_true", help="Never fetch fees, use the --fee-snapshot fees (or the built-in defaults) instead")
+    parser.add_argument("--timings", action="store_true", help="Record per-stage durations and counters and include them in the output")
+    parser.add_argument("--metrics-file", type=str, help="Write the recorded timings as Prometheus text to this file when done (implies --timings)")
+    parser.add_argument("--openmetrics", action="store_true", help="Write --metrics-file in the OpenMetrics format instead")
+    parser.add_argument("--profile", type=str, nargs="?", const="-", metavar="PATH", help="Run under cProfile and dump the stats to PATH, or print the slowest functions to stderr")
 
     args = parser.parse_args()
 
-    # Passed in string takes precedence as its both easier to pass in for the user and parse
-    psbt_data_input = None
-    if args.psbt:
-        psbt_data_input = args.psbt
-    elif args.file:
-        try:
-            with open(args.file, 'r') as f:
-                psbt_data_input = f.read().strip()
-        except FileNotFoundError:
-            console.print("[bold red]Error:[/bold red] File not found.")
+    default_parser = args.parser
+    if args.json:
+        # Keep warnings such as missing UTXO info off the JSON document on stdout
+        console = console_util.LazyConsole(stderr=True)
+    console.quiet = args.quiet
+    script_info_cache.resize(args.script_cache_size)
+    if args.fee_url or args.fee_snapshot:
+        fee_service.configure(url=args.fee_url, snapshot_path=args.fee_snapshot)
+    args.timings = args.timings or bool(args.metrics_file)
+    if args.mempool_snapshot:
+        set_mempool_model(args.mempool_snapshot)
+    if args.result_cache:
+        set_analysis_cache(args.result_cache, args.result_cache_size)
+
+    try:
+        with instrumentation.profiled(args.profile) if args.profile else contextlib.nullcontext():
+            run(args)
+    finally:
+        if args.metrics_file:
+            instrumentation.write_metrics(args.metrics_file, openmetrics=args.openmetrics)
+
+def run(args):
+    """Runs the analyzer in the mode picked by the parsed command-line arguments."""
+    fee_rates = fee_service.get_cached_fees() if args.offline else None
+
+    if args.serve:
+        import analysis_server
+        analysis_server.serve(port=args.port, socket_path=args.socket, fee_rates=fee_rates)
+        return
+
+    if args.audit_index:
+        run_audit(args, fee_rates)
+        return
+
+    if args.batch:
+        import batch_analyzer
+        batch_analyzer.console.quiet = args.quiet
+        if args.pack:
+            count = psbt_io.write_archive(args.pack, (psbt for _, psbt in batch_analyzer.iter_psbt_sources(args.batch)))
+            batch_analyzer.console.print(f"Packed {count} PSBTs into {args.pack}")
+            return
+        batch_analyzer.run_batch(args.batch, args.output, args.workers, args.chunk_size, fee_rates, args.timings, report_format=args.report_format)
+        return
+
+    if args.consolidate:
+        plan, error = consolidation_plan(args.consolidate, args.fee_schedule, fee_rates, args.max_tx_weight, args.max_txs_per_window, args.consolidate_to)
+        if args.json:
+            print(json.dumps({"consolidation": plan, "error": error}))
+            sys.exit(0 if error is None else 1)
+        if error is not None:
+            console.print(f"[bold red]Error:[/bold red] {error}")
             return
+        import output_util
+        output_util.display_consolidation_plan(plan)
+        return
+
+    # Passed in string takes precedence as its both easier to pass in for the user and parse
+    source = contextlib.nullcontext(args.psbt) if args.psbt or not args.file else psbt_io.open_psbt(args.file, args.index)
+    if args.compare:
+        compare_psbts(source, args.compare, fee_rates, args.json)
+        return
+    # Kept out of the metrics registry until the first render has been timed too
+    trace = instrumentation.tracing(registry=None) if args.timings and not args.json else contextlib.nullcontext()
+    try:
+        # Binary files are parsed straight out of the memory map, nothing refers to it once parsed
+        with source as psbt_data_input:
+            if args.bump:
+                result = fee_bump_plans(psbt_data_input, args.bump, fee_rates, args.bump_context)
+            elif args.simulate_rates:
+                result = fee_rate_sweep(psbt_data_input, args.simulate_rates, fee_rates)
+            elif args.json:
+                # Machine output never imports Rich or prompts
+                result = json_analysis(psbt_data_input, fee_rates, args.timings)
+            else:
+                with trace as timings:
+                    analysis = parse_psbt_analysis(psbt_data_input, fee_rates=fee_rates)
+    except (OSError, IndexError, ValueError) as e:
+        error = "File not found." if isinstance(e, FileNotFoundError) else str(e)
+        if args.json:
+            sys.exit(print_json_result(None, error))
+        console.print(f"[bold red]Error:[/bold red] {error}")
+        return
     
-    parsed_data = parse_psbt_input(psbt_data_input)
-    if parsed_data is None:
+    if args.bump:
+        plans, error = result
+        if args.json:
+            print(json.dumps({"bumps": plans, "error": error}))
+            sys.exit(0 if error is None else 1)
+        if error is not None:
+            console.print(f"[bold red]Error:[/bold red] {error}")
+            return
+        import output_util
+        output_util.display_fee_bumps(plans)
+        return
+
+    if args.simulate_rates:
+        sweep, error = result
+        if args.json:
+            import coin_simulator
+            print(json.dumps({"sweep": coin_simulator.table_rows(sweep) if sweep is not None else None, "error": error}))
+            sys.exit(0 if error is None else 1)
+        if error is not None:
+            console.print(f"[bold red]Error:[/bold red] {error}")
+            return
+        import output_util
+        output_util.display_fee_sweep(sweep)
+        return
+
+    if args.json:
+        sys.exit(print_json_result(*result))
+    if analysis is None:
         return
     
+    from rich.prompt import Confirm
+    import output_util
     while True:
-        output_util.display_analysis(parsed_data)
+        # to_dict() builds fresh dicts, so edits never touch the analysis they started from
+        parsed_data = analysis.to_dict()
+        if timings is not None:
+            # The first render is timed into the trace of the analysis it shows
+            token = instrumentation.current_trace.set(timings)
+            with instrumentation.stage("render"):
+                output_util.display_analysis(parsed_data)
+            instrumentation.current_trace.reset(token)
+            instrumentation.default_registry.observe(timings)
+            print_timings(timings.to_dict())
+            timings = None
+        else:
+            output_util.display_analysis(parsed_data)
         
         # Simulate coin selection
         if Confirm.ask("Run coin selection simulation?"):
-            fee_rate = parsed_data['inferred_fee_rate'] if parsed_data['inferred_fee_rate'] > 0 else fee_service.get_recommended_fees()['fastestFee']
+            fee_rate = parsed_data['inferred_fee_rate'] if parsed_data['inferred_fee_rate'] > 0 else (fee_rates or fee_service.get_recommended_fees())['fastestFee']
             sim_results = simulate_coin_selection(parsed_data, fee_rate)
             console.print("\n[bold]Coin Selection Simulation:[/bold]")
             output_util.display_coin_simulation(sim_results)
         
         # Edit
         if Confirm.ask("Edit the PSBT data?"):
-            parsed_data = edit_parsed_data(copy.deepcopy(parsed_data))  # Work on copy
+            analysis = analysis_model.Analysis.from_dict(edit_parsed_data(parsed_data, fee_rates))
         
         if not Confirm.ask("Re-run analysis?"):
             break
 
 if __name__ == "__main__":
+    # Run as a script this is __main__, so the modules importing psbt_analyzer would load a second
+    # copy that never sees the settings made here (parser, caches, mempool model)
+    sys.modules.setdefault('psbt_analyzer', sys.modules[__name__])
     analyze_psbt()
\ No newline at end of file
@@ -0,0 +1,190 @@
+from collections import defaultdict, deque, namedtuple
+import fee_service
+import psbt_analyzer
+import psbt_io
+
+InputEntry = namedtuple('InputEntry', ['index', 'outpoint', 'info'])
+OutputEntry = namedtuple('OutputEntry', ['index', 'script', 'info'])
+
+# Fields compared between aligned entries, anything else follows from these
+INPUT_FIELDS = ('amount', 'script_type', 'address', 'weight', 'weight_source')
+OUTPUT_FIELDS = ('amount', 'script_type', 'address')
+TOTAL_FIELDS = ('inferred_fee', 'inferred_fee_rate', 'vsize', 'total_input_value', 'total_output_value')
+
+class PsbtIndex:
+    """
+    A PSBT's analysis with its inputs keyed by outpoint ("txid:n") and its
+    outputs keyed by scriptPubKey, so other PSBTs can be aligned against it
+    with dictionary lookups. Outputs paying the same script are kept in order.
+    """
+    __slots__ = ('analysis', 'inputs', 'outputs')
+
+    def __init__(self, analysis, inputs, outputs):
+        self.analysis = analysis
+        self.inputs = inputs
+        self.outputs = outputs
+
+def index_psbt(psbt_data, fee_rates=None, parser=None):
+    """Loads and analyzes a PSBT (base64, hex or binary) into a PsbtIndex."""
+    psbt_obj = psbt_io.load_psbt(psbt_data, parser or psbt_analyzer.default_parser)
+    analysis = psbt_analyzer.analyze_psbt_object(psbt_obj, fee_rates)
+
+    # The analysis leaves out inputs without UTXO info, those are still aligned by outpoint
+    analyzed_inputs = iter(analysis.inputs)
+    inputs = {}
+    for i, txin in enumerate(psbt_obj.unsigned_tx.vin):
+        psbt_in = psbt_obj.inputs[i]
+        info = next(analyzed_inputs) if psbt_in.witness_utxo or psbt_in.non_witness_utxo else None
+        outpoint = f"{bytes(txin.prevout.hash)[::-1].hex()}:{txin.prevout.n}"
+        inputs[outpoint] = InputEntry(i, outpoint, info)
+
+    outputs = {}
+    for i, (txout, info) in enumerate(zip(psbt_obj.unsigned_tx.vout, analysis.outputs)):
+        script = bytes(txout.scriptPubKey)
+        outputs.setdefault(script, []).append(OutputEntry(i, script.hex(), info))
+    return PsbtIndex(analysis, inputs, outputs)
+
+def changed_fields(before, after, fields):
+    """Returns {field: {"from", "to"}} for every field that differs between two records."""
+    changes = {}
+    for field in fields:
+        old = getattr(before, field, None) if before is not None else None
+        new = getattr(after, field, None) if after is not None else None
+        if old != new:
+            changes[field] = {"from": old, "to": new}
+    return changes
+
+def input_record(entry):
+    record = {"index": entry.index, "outpoint": entry.outpoint}
+    record.update(entry.info.to_dict() if entry.info is not None else {"amount": None})
+    return record
+
+def output_record(entry):
+    record = {"index": entry.index, "script": entry.script}
+    record.update(entry.info.to_dict())
+    return record
+
+def diff_inputs(baseline, other):
+    added = []
+    changed = []
+    unchanged = 0
+    for outpoint, entry in other.inputs.items():
+        base = baseline.inputs.get(outpoint)
+        if base is None:
+            added.append(input_record(entry))
+            continue
+        fields = changed_fields(base.info, entry.info, INPUT_FIELDS)
+        if base.index != entry.index:
+            fields["index"] = {"from": base.index, "to": entry.index}
+        if fields:
+            changed.append({"outpoint": outpoint, "index": entry.index, "changes": fields})
+        else:
+            unchanged += 1
+    removed = [input_record(entry) for outpoint, entry in baseline.inputs.items() if outpoint not in other.inputs]
+    return {"added": added, "removed": removed, "changed": changed, "unchanged": unchanged}
+
+def match_outputs(baseline, other):
+    """
+    Pairs outputs paying the same script, preferring equal amounts when a
+    script is paid more than once. Returns (pairs, added, removed) entries.
+    """
+    pairs = []
+    added = []
+    removed = []
+    for script, entries in other.outputs.items():
+        bases = baseline.outputs.get(script, ())
+        by_amount = defaultdict(deque)
+        for position, base in enumerate(bases):
+            by_amount[base.info.amount].append(position)
+        matched = set()
+        unmatched = []
+        for entry in entries:
+            candidates = by_amount.get(entry.info.amount)
+            if candidates:
+                position = candidates.popleft()
+                matched.add(position)
+                pairs.append((bases[position], entry))
+            else:
+                unmatched.append(entry)
+        remaining = deque(base for position, base in enumerate(bases) if position not in matched)
+        for entry in unmatched:
+            if remaining:
+                pairs.append((remaining.popleft(), entry))
+            else:
+                added.append(entry)
+        removed.extend(remaining)
+    for script, entries in baseline.outputs.items():
+        if script not in other.outputs:
+            removed.extend(entries)
+    return (pairs, added, removed)
+
+def change_record(analysis, index):
+    if index == -1:
+        return None
+    out = analysis.outputs[index]
+    return {"index": index, "amount": out.amount, "address": out.address, "reason": out.reason}
+
+def diff_change(baseline, other, pairs):
+    """Compares which output each PSBT's change heuristic picked, by alignment rather than index."""
+    base_index = baseline.analysis.change_index
+    other_index = other.analysis.change_index
+    aligned = {base.index: entry.index for base, entry in pairs}
+    if base_index == -1 and other_index == -1:
+        same = True
+    else:
+        same = base_index != -1 and aligned.get(base_index) == other_index
+    return {"from": change_record(baseline.analysis, base_index), "to": change_record(other.analysis, other_index), "same_output": same}
+
+def diff_indexes(baseline, other):
+    """Diffs two PsbtIndexes, returning a JSON-serializable dict."""
+    inputs = diff_inputs(baseline, other)
+
+    pairs, added, removed = match_outputs(baseline, other)
+    changed = []
+    unchanged = 0
+    for base, entry in pairs:
+        fields = changed_fields(base.info, entry.info, OUTPUT_FIELDS)
+        if base.index != entry.index:
+            fields["index"] = {"from": base.index, "to": entry.index}
+        if fields:
+            changed.append({"script": entry.script, "index": entry.index, "changes": fields})
+        else:
+            unchanged += 1
+    outputs = {
+        "added": [output_record(entry) for entry in added],
+        "removed": [output_record(entry) for entry in removed],
+        "changed": changed,
+        "unchanged": unchanged,
+    }
+
+    totals = {}
+    for field in TOTAL_FIELDS:
+        old = getattr(baseline.analysis, field)
+        new = getattr(other.analysis, field)
+        totals[field] = {"from": old, "to": new, "delta": new - old if old is not None and new is not None else None}
+
+    change = diff_change(baseline, other, pairs)
+    identical = (not any(inputs[key] or outputs[key] for key in ("added", "removed", "changed"))
+                 and all(total["delta"] == 0 for total in totals.values()) and change["same_output"])
+    return {"identical": identical, "inputs": inputs, "outputs": outputs, "totals": totals, "change": change}
+
+def diff_psbts(baseline_data, other_data, fee_rates=None, parser=None):
+    """Diffs two PSBTs given as base64, hex or binary."""
+    fee_rates = fee_rates or fee_service.get_recommended_fees()
+    return diff_indexes(index_psbt(baseline_data, fee_rates, parser), index_psbt(other_data, fee_rates, parser))
+
+def compare_many(baseline_data, psbts, fee_rates=None, parser=None):
+    """
+    Diffs every (psbt_id, psbt) pair against one baseline, e.g. the cosigners'
+    copies or RBF replacements of a coordinator's PSBT. The baseline is indexed
+    once and each PSBT is aligned against it in a single pass. Yields
+    {"id", "diff", "error"} records; a PSBT that fails to parse gets an error
+    and the comparison carries on.
+    """
+    fee_rates = fee_rates or fee_service.get_recommended_fees()
+    baseline = index_psbt(baseline_data, fee_rates, parser)
+    for psbt_id, psbt_data in psbts:
+        try:
+            yield {"id": psbt_id, "diff": diff_indexes(baseline, index_psbt(psbt_data, fee_rates, parser)), "error": None}
+        except Exception as e:
+            yield {"id": psbt_id, "diff": None, "error": str(e)}
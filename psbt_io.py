@@ -0,0 +1,215 @@
+import base64
+import binascii
+import contextlib
+import mmap
+import os
+import struct
+from bitcointx.core.psbt import PartiallySignedTransaction
+import fast_psbt_parser
+import instrumentation
+
+PSBT_MAGIC = b'psbt\xff'
+HEX_MAGIC = b'70736274ff'
+
+# Archive layout: header, the raw PSBTs back to back, an index of (offset, length)
+# entries and a fixed size footer pointing at the index
+ARCHIVE_MAGIC = b'PSBTARC1'
+ARCHIVE_FOOTER_MAGIC = b'PSBTIDX1'
+INDEX_ENTRY = struct.Struct('<QI')
+ARCHIVE_FOOTER = struct.Struct('<QQ8s')
+
+WHITESPACE = b' \t\r\n'
+
+def detect_format(data):
+    """Returns 'binary', 'hex', 'base64' or 'archive' from the first bytes of a PSBT buffer."""
+    head = bytes(data[:64]).lstrip(WHITESPACE)
+    if head.startswith(PSBT_MAGIC):
+        return 'binary'
+    if head.startswith(ARCHIVE_MAGIC):
+        return 'archive'
+    if head.lower().startswith(HEX_MAGIC):
+        return 'hex'
+    return 'base64'
+
+def strip_view(data):
+    """Trims surrounding whitespace off a buffer without copying it."""
+    view = memoryview(data)
+    start, end = 0, len(view)
+    while start < end and view[start] in WHITESPACE:
+        start += 1
+    while end > start and view[end - 1] in WHITESPACE:
+        end -= 1
+    return view[start:end]
+
+def to_binary(data):
+    """Returns the raw PSBT bytes for base64 or hex text, or for a binary buffer."""
+    if isinstance(data, str):
+        data = data.strip().encode()
+    psbt_format = detect_format(data)
+    if psbt_format == 'binary':
+        return bytes(strip_view(data))
+    if psbt_format == 'hex':
+        return binascii.unhexlify(strip_view(data))
+    if psbt_format == 'archive':
+        raise ValueError("Expected a single PSBT, not an archive")
+    return base64.b64decode(strip_view(data), validate=True)
+
+def binary_view(data):
+    """Like to_binary, but binary buffers are returned as a view instead of being copied."""
+    if not isinstance(data, str) and detect_format(data) == 'binary':
+        return strip_view(data)
+    return to_binary(data)
+
+def load_psbt(data, parser='bitcointx'):
+    """
+    Deserializes a PSBT from base64 or hex text, or from a raw binary buffer
+    (bytes, memoryview or mmap). Binary buffers are parsed in place.
+    With parser='fast' only the fields the analysis needs are extracted (see
+    fast_psbt_parser), falling back to python-bitcointx for anything the fast
+    parser rejects so malformed PSBTs still get bitcointx's errors.
+    """
+    if parser == 'fast':
+        try:
+            with instrumentation.stage("decode"):
+                view = binary_view(data)
+            with instrumentation.stage("parse"):
+                return fast_psbt_parser.parse(view)
+        except ValueError:
+            pass
+    with instrumentation.stage("decode"):
+        if isinstance(data, str):
+            stripped = data.strip()
+            if stripped[:len(HEX_MAGIC)].lower() == HEX_MAGIC.decode():
+                raw = bytes.fromhex(stripped)
+            else:
+                raw = base64.b64decode(data, validate=True)
+        elif detect_format(data) == 'binary':
+            raw = data
+        else:
+            raw = to_binary(data)
+    with instrumentation.stage("parse"):
+        return PartiallySignedTransaction.deserialize(raw)
+
+def is_archive(path):
+    """Checks the magic bytes at the start of a file for a PSBT archive."""
+    with open(path, 'rb') as f:
+        return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+def read_psbt(path):
+    """
+    Reads a PSBT file in whichever format it is stored: base64 or hex text is
+    returned as a str, binary PSBTs as bytes.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    psbt_format = detect_format(data)
+    if psbt_format == 'archive':
+        raise ValueError(f"{path} is a PSBT archive, not a single PSBT")
+    if psbt_format == 'binary':
+        return data
+    return data.decode('ascii', errors='replace').strip()
+
+@contextlib.contextmanager
+def open_psbt(path, index=None):
+    """
+    Memory-maps a PSBT file and yields it ready for load_psbt: a view of the
+    mapped file for binary PSBTs (no copies), or the text for base64/hex.
+    For archives, yields the PSBT at index (default 0).
+    The view is only valid inside the with block.
+    """
+    if os.path.getsize(path) == 0:
+        yield ''
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        psbt_format = detect_format(mapped)
+        if psbt_format == 'archive':
+            with PsbtArchive(path) as archive:
+                yield archive[index or 0]
+        elif psbt_format == 'binary':
+            view = strip_view(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+        else:
+            yield bytes(strip_view(mapped)).decode('ascii', errors='replace')
+
+class PsbtArchive:
+    """
+    Random access reader for a PSBT archive. The file is memory-mapped and
+    archive[i] returns a view of the i-th raw PSBT without reading the others.
+    Views are only valid until the archive is closed, copy them with bytes()
+    to keep them around.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is not a PSBT archive")
+        if len(self._mmap) < len(ARCHIVE_MAGIC) + ARCHIVE_FOOTER.size or self._mmap[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a PSBT archive")
+        self.index_offset, self.count, footer_magic = ARCHIVE_FOOTER.unpack_from(self._mmap, len(self._mmap) - ARCHIVE_FOOTER.size)
+        if footer_magic != ARCHIVE_FOOTER_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is truncated or was not closed properly")
+        self._view = memoryview(self._mmap)
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        """Returns the (offset, length) of the i-th PSBT."""
+        if not 0 <= i < self.count:
+            raise IndexError("PSBT archive index out of range")
+        return INDEX_ENTRY.unpack_from(self._mmap, self.index_offset + i * INDEX_ENTRY.size)
+
+    def __getitem__(self, i):
+        offset, length = self.entry(i)
+        return self._view[offset:offset + length]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def close(self):
+        if getattr(self, '_view', None) is not None:
+            try:
+                self._view.release()
+                self._mmap.close()
+            except BufferError:
+                pass  # Views handed out are still alive, the map goes away with them
+        elif getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_archive(path, psbts):
+    """
+    Writes an iterable of PSBTs (base64, hex or binary) to a PSBT archive in a
+    single streaming pass and returns the number written. The file is replaced
+    atomically once the index is written.
+    """
+    tmp_path = f"{path}.tmp"
+    index = []
+    with open(tmp_path, 'wb') as f:
+        f.write(ARCHIVE_MAGIC)
+        offset = len(ARCHIVE_MAGIC)
+        for psbt in psbts:
+            raw = to_binary(psbt)
+            f.write(raw)
+            index.append(INDEX_ENTRY.pack(offset, len(raw)))
+            offset += len(raw)
+        f.write(b''.join(index))
+        f.write(ARCHIVE_FOOTER.pack(offset, len(index), ARCHIVE_FOOTER_MAGIC))
+    os.replace(tmp_path, path)
+    return len(index)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import fast_psbt_parser
+import psbt_io
+
+# Bump whenever the analysis changes, so results computed by older code are never served
+CACHE_VERSION = b'2'
+
+# Records the analysis reads (see fast_psbt_parser), everything else doesn't change the result
+GLOBAL_KEY_TYPES = (fast_psbt_parser.PSBT_GLOBAL_UNSIGNED_TX, fast_psbt_parser.PSBT_GLOBAL_VERSION)
+INPUT_KEY_TYPES = (fast_psbt_parser.PSBT_IN_NON_WITNESS_UTXO, fast_psbt_parser.PSBT_IN_WITNESS_UTXO, fast_psbt_parser.PSBT_IN_PARTIAL_SIG,
+                   fast_psbt_parser.PSBT_IN_REDEEM_SCRIPT, fast_psbt_parser.PSBT_IN_WITNESS_SCRIPT, fast_psbt_parser.PSBT_IN_FINAL_SCRIPTSIG,
+                   fast_psbt_parser.PSBT_IN_FINAL_SCRIPTWITNESS) + fast_psbt_parser.TAPROOT_INPUT_TYPES
+OUTPUT_KEY_TYPES = (fast_psbt_parser.PSBT_OUT_REDEEM_SCRIPT, fast_psbt_parser.PSBT_OUT_WITNESS_SCRIPT, fast_psbt_parser.PSBT_OUT_BIP32_DERIVATION)
+
+# Fields of an analysis that depend on the current fee rates and are recomputed on every hit
+FEE_DEPENDENT_FIELDS = ('fee_reasonableness',)
+
+# Stores between eviction passes, counting the entries on every store would scan the whole table
+EVICT_EVERY = 1000
+
+def hash_records(digest, reader, key_types):
+    """Feeds the records of one key-value map whose type is in key_types to digest, length prefixed."""
+    for key_type, key_data, value in fast_psbt_parser.iter_map(reader):
+        if key_type in key_types:
+            for part in (bytes([key_type]), key_data, value):
+                digest.update(len(part).to_bytes(4, 'little'))
+                digest.update(part)
+
+def psbt_key(data):
+    """
+    Content address of a PSBT's analysis: a hash of the unsigned transaction
+    and only the records the analysis reads, in order, so copies that differ in
+    xpubs, derivation paths of inputs or proprietary fields share an entry.
+    PSBTs the fast parser can't walk are keyed by their raw bytes instead.
+    """
+    raw = psbt_io.binary_view(data)
+    digest = hashlib.sha256(CACHE_VERSION)
+    try:
+        reader = fast_psbt_parser.Reader(memoryview(raw))
+        if bytes(reader.read(len(fast_psbt_parser.PSBT_MAGIC))) != fast_psbt_parser.PSBT_MAGIC:
+            raise fast_psbt_parser.FastParseError("Missing PSBT magic bytes")
+        unsigned_tx = None
+        for key_type, key_data, value in fast_psbt_parser.iter_map(reader):
+            if key_type in GLOBAL_KEY_TYPES and not key_data:
+                digest.update(bytes([key_type]) + len(value).to_bytes(4, 'little'))
+                digest.update(value)
+                if key_type == fast_psbt_parser.PSBT_GLOBAL_UNSIGNED_TX:
+                    unsigned_tx = fast_psbt_parser.parse_unsigned_tx(value)
+        if unsigned_tx is None:
+            raise fast_psbt_parser.FastParseError("Missing unsigned transaction")
+        for _ in unsigned_tx.vin:
+            hash_records(digest, reader, INPUT_KEY_TYPES)
+            digest.update(b'\x00')
+        for _ in unsigned_tx.vout:
+            hash_records(digest, reader, OUTPUT_KEY_TYPES)
+            digest.update(b'\x00')
+        return digest.digest()
+    except ValueError:
+        return hashlib.sha256(CACHE_VERSION + b'raw' + bytes(raw)).digest()
+
+class AnalysisCache:
+    """
+    On-disk SQLite cache of PSBT analyses keyed by psbt_key(). Only the
+    fee-independent part of each analysis is stored; the fee suggestion is
+    recomputed against the current fees on every hit. Holds about max_entries
+    analyses: every EVICT_EVERY stores the least recently used ones beyond that
+    are evicted, so it may briefly run over by that many per process. Safe to share between
+    threads and, thanks to WAL mode, between worker processes.
+    """
+
+    def __init__(self, path, max_entries=100_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        with self.connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS analyses (key BLOB PRIMARY KEY, analysis TEXT NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used)")
+        # Catches up on whatever earlier runs stored since their last eviction pass
+        self.evict()
+
+    def connection(self):
+        """Per thread (and per process, in case of a fork) connection."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Returns the stored fee-independent analysis dict for key, or None."""
+        conn = self.connection()
+        row = conn.execute("SELECT analysis FROM analyses WHERE key = ?", (key,)).fetchone()
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, analysis):
+        """Stores an analysis_model.Analysis without its fee-dependent fields, evicting old entries if full."""
+        data = analysis.to_dict()
+        for field in FEE_DEPENDENT_FIELDS:
+            data.pop(field, None)
+        # change_output is rebuilt from the index, outputs with identical contents can't be told apart otherwise
+        data["change_index"] = analysis.change_index
+        data.pop("change_output")
+        conn = self.connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO analyses (key, analysis, last_used) VALUES (?, ?, ?)", (key, json.dumps(data), time.time()))
+        with self.lock:
+            self.stores += 1
+            evict = self.stores % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Deletes the least recently used analyses beyond max_entries."""
+        conn = self.connection()
+        with conn:
+            count = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute("DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+
+    def clear(self):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM analyses")
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns this process' hit/miss counters and the number of stored analyses."""
+        size = self.connection().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": size,
+                "max_entries": self.max_entries,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+def restore_analysis(data):
+    """Rebuilds an analysis_model.Analysis from a stored dict, with an empty fee suggestion to be filled in."""
+    import analysis_model
+    data = dict(data)
+    change_index = data.pop("change_index")
+    data["change_output"] = data["outputs"][change_index] if change_index != -1 else {}
+    data["fee_reasonableness"] = {"suggestion": ""}
+    return analysis_model.Analysis.from_dict(data)
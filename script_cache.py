@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+import instrumentation
+
+class ScriptInfoCache:
+    """
+    Bounded LRU cache mapping raw scriptPubKey bytes to the derived
+    (script_type, address, address_type) tuple. Safe to share between threads;
+    each process in a worker pool keeps its own copy.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, script, compute):
+        """Returns the cached info for script, calling compute(script) on a miss."""
+        key = bytes(script)
+        with self.lock:
+            info = self.entries.get(key)
+            if info is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                instrumentation.count("script_cache_hits")
+                return info
+            self.misses += 1
+
+        instrumentation.count("script_cache_misses")
+        with instrumentation.stage("address_derivation"):
+            info = compute(script)
+        if self.maxsize > 0:
+            with self.lock:
+                self.entries[key] = info
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return info
+
+    def resize(self, maxsize):
+        """Changes the cache size, evicting the least recently used entries if needed."""
+        with self.lock:
+            self.maxsize = maxsize
+            while len(self.entries) > max(maxsize, 0):
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry and resets the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters and current size."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
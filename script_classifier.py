@@ -0,0 +1,73 @@
+from bitcointx.core.script import CScript
+
+SCRIPT_TYPES = ['pubkeyhash', 'scripthash', 'witness_v0_keyhash', 'witness_v0_scripthash', 'witness_v1_taproot']
+
+# Standard templates keyed by (script length, first opcode, second opcode)
+TEMPLATE_PREFIXES = {
+    (25, 0x76, 0xa9): 'pubkeyhash',             # OP_DUP OP_HASH160 <20> OP_EQUALVERIFY OP_CHECKSIG
+    (23, 0xa9, 0x14): 'scripthash',             # OP_HASH160 <20> OP_EQUAL
+    (22, 0x00, 0x14): 'witness_v0_keyhash',     # OP_0 <20>
+    (34, 0x00, 0x20): 'witness_v0_scripthash',  # OP_0 <32>
+    (34, 0x51, 0x20): 'witness_v1_taproot',     # OP_1 <32>
+}
+
+# Estimated input contribution to vsize by script type
+INPUT_VBYTES = {
+    'pubkeyhash': 148,
+    'scripthash': 148,
+    'witness_v0_keyhash': 68,
+    'witness_v0_scripthash': 100,
+    'witness_v1_taproot': 58,
+}
+DEFAULT_INPUT_VBYTES = 148
+
+# Standard scriptPubKey lengths by script type
+OUTPUT_SCRIPT_VBYTES = {
+    'pubkeyhash': 25,
+    'scripthash': 23,
+    'witness_v0_keyhash': 22,
+    'witness_v0_scripthash': 34,
+    'witness_v1_taproot': 34,
+}
+DEFAULT_OUTPUT_SCRIPT_VBYTES = 34
+
+def classify_script_predicates(script):
+    """Slow path that classifies a script with the CScript predicates."""
+    script = script if isinstance(script, CScript) else CScript(script)
+    if script.is_p2pkh():
+        return 'pubkeyhash'
+    if script.is_p2sh():
+        return 'scripthash'
+    if script.is_witness_v0_keyhash():
+        return 'witness_v0_keyhash'
+    if script.is_witness_v0_scripthash():
+        return 'witness_v0_scripthash'
+    if script.is_witness_v1_taproot():
+        return 'witness_v1_taproot'
+    return 'unknown'
+
+def classify_script(script):
+    """
+    Classifies a scriptPubKey from its raw bytes. Standard templates are
+    recognized from the length and opcode prefix alone and anything else
+    falls back to the CScript predicates.
+    """
+    if len(script) >= 2:
+        script_type = TEMPLATE_PREFIXES.get((len(script), script[0], script[1]))
+        if script_type == 'pubkeyhash':
+            if script[2] == 0x14 and script[23] == 0x88 and script[24] == 0xac:
+                return script_type
+        elif script_type == 'scripthash':
+            if script[22] == 0x87:
+                return script_type
+        elif script_type is not None:
+            return script_type
+    return classify_script_predicates(script)
+
+def input_vbytes(script_type):
+    """Looks up the estimated input vbytes for a script type."""
+    return INPUT_VBYTES.get(script_type, DEFAULT_INPUT_VBYTES)
+
+def output_script_vbytes(script_type):
+    """Looks up the standard scriptPubKey length for a script type."""
+    return OUTPUT_SCRIPT_VBYTES.get(script_type, DEFAULT_OUTPUT_SCRIPT_VBYTES)
@@ -0,0 +1,68 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audit_index
+import batch_analyzer
+import fee_service
+from bitcointx.core.psbt import PartiallySignedTransaction
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def example_psbt(name):
+    with open(os.path.join(TESTS_DIR, name)) as f:
+        return f.read().strip()
+
+def respent_psbt(psbt_base64):
+    """Another transaction spending the same inputs, paying one sat less to the first output."""
+    psbt = PartiallySignedTransaction.from_base64(psbt_base64)
+    tx = psbt.unsigned_tx.to_mutable()
+    tx.vout[0].nValue -= 1
+    psbt.unsigned_tx = tx.to_immutable()
+    return psbt.to_base64()
+
+def audit_stdin_batch(index, psbts):
+    """Runs a --batch - audit of psbts against index and returns its records."""
+    stream = io.StringIO("".join(psbt + "\n" for psbt in psbts))
+    records = batch_analyzer.analyze_batch(batch_analyzer.iter_psbt_sources(["-"], stream), fee_service.sample_response_upon_failure, audit=True)
+    out = io.StringIO()
+    batch_analyzer.write_records(records, out, index)
+    index.commit()
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+class AuditIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "audit.db")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_double_spend_across_stdin_batches(self):
+        original = example_psbt("example_psbt_2.psbt")
+        with audit_index.AuditIndex(self.path) as index:
+            first, = audit_stdin_batch(index, [original])
+        with audit_index.AuditIndex(self.path) as index:
+            # Same positional id (stdin:1) as the first run, but a different transaction
+            second, = audit_stdin_batch(index, [respent_psbt(original)])
+            self.assertEqual(first["id"], second["id"])
+            self.assertEqual(first["audit"]["conflicts"], [])
+            self.assertEqual(len(second["audit"]["conflicts"]), 2)
+            self.assertEqual(second["audit"]["conflicts"][0]["psbts"], ["stdin:1"])
+            self.assertEqual(index.stats()["psbts"], 2)
+
+    def test_copies_of_a_transaction_never_conflict(self):
+        original = example_psbt("example_psbt_2.psbt")
+        with audit_index.AuditIndex(self.path) as index:
+            records = audit_stdin_batch(index, [original, original])
+            audit_stdin_batch(index, [original])
+            self.assertEqual([record["audit"]["conflicts"] for record in records], [[], []])
+            self.assertEqual(index.stats()["psbts"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+from bitcointx.core.script import CScript, CScriptInvalidError
+import script_classifier
+
+WITNESS_SCALE_FACTOR = 4
+
+# Worst-case sizes used when the PSBT doesn't carry the final signatures yet
+MAX_ECDSA_SIG_SIZE = 72  # DER signature including the sighash byte
+MAX_SCHNORR_SIG_SIZE = 65  # 64 byte signature plus an explicit sighash byte
+COMPRESSED_PUBKEY_SIZE = 33
+
+# PSBT input key types (BIP371) that python-bitcointx exposes as unknown fields
+PSBT_IN_TAP_KEY_SIG = 0x13
+PSBT_IN_TAP_LEAF_SCRIPT = 0x15
+
+OP_CHECKSIG = 0xac
+OP_CHECKSIGVERIFY = 0xad
+OP_CHECKMULTISIG = 0xae
+OP_CHECKSIGADD = 0xba
+
+def varint_size(n):
+    """Size in bytes of a Bitcoin CompactSize integer."""
+    if n < 0xfd:
+        return 1
+    if n <= 0xffff:
+        return 3
+    if n <= 0xffffffff:
+        return 5
+    return 9
+
+def push_size(data_len):
+    """Size of a script push of data_len bytes including its opcode(s)."""
+    if data_len < 0x4c:
+        return 1 + data_len
+    if data_len <= 0xff:
+        return 2 + data_len
+    if data_len <= 0xffff:
+        return 3 + data_len
+    return 5 + data_len
+
+def witness_size(item_sizes):
+    """Serialized size of a witness stack given the size of each item."""
+    return varint_size(len(item_sizes)) + sum(varint_size(size) + size for size in item_sizes)
+
+def input_weight(script_sig_size, witness_items=None):
+    """BIP141 weight of an input from its scriptSig size and witness item sizes."""
+    non_witness = 32 + 4 + varint_size(script_sig_size) + script_sig_size + 4  # outpoint, scriptSig, sequence
+    witness = witness_size(witness_items) if witness_items is not None else 0
+    return non_witness * WITNESS_SCALE_FACTOR + witness
+
+def output_weight(script_pubkey_size):
+    """BIP141 weight of an output from its scriptPubKey size."""
+    return (8 + varint_size(script_pubkey_size) + script_pubkey_size) * WITNESS_SCALE_FACTOR
+
+def signature_sizes(psbt_in, required, max_size=MAX_ECDSA_SIG_SIZE):
+    """Uses the partial signatures we already have, padding with worst-case sizes for the missing ones."""
+    sizes = sorted((len(sig) for sig in psbt_in.partial_sigs.values()), reverse=True)[:required]
+    return sizes + [max_size] * (required - len(sizes))
+
+def parse_multisig(script):
+    """Returns m for an OP_m <pubkeys> OP_n OP_CHECKMULTISIG script, otherwise None."""
+    if len(script) >= 3 and script[-1] == OP_CHECKMULTISIG and 0x51 <= script[0] <= 0x60 and 0x51 <= script[-2] <= 0x60:
+        return script[0] - 0x50
+    return None
+
+def is_single_key(script):
+    """Checks for a <pubkey> OP_CHECKSIG script."""
+    return (len(script) == 35 and script[0] == 33 or len(script) == 67 and script[0] == 65) and script[-1] == OP_CHECKSIG
+
+def count_signature_ops(script):
+    """Counts the signature checking opcodes in a script, or returns None if it can't be parsed."""
+    try:
+        return sum(1 for opcode, _, _ in CScript(script).raw_iter() if opcode in (OP_CHECKSIG, OP_CHECKSIGVERIFY, OP_CHECKSIGADD))
+    except CScriptInvalidError:
+        return None
+
+def script_satisfaction(psbt_in, script):
+    """
+    Returns the stack item sizes needed to satisfy script (excluding the script itself)
+    and whether it matched a known template.
+    """
+    required = parse_multisig(script)
+    if required is not None:
+        # The extra empty item works around the CHECKMULTISIG off-by-one bug
+        return ([0] + signature_sizes(psbt_in, required), True)
+    if is_single_key(script):
+        return (signature_sizes(psbt_in, 1), True)
+    # Unknown script, assume a single signature is enough
+    return (signature_sizes(psbt_in, 1), False)
+
+def taproot_witness(psbt_in):
+    """Returns the taproot witness item sizes for the key path signature or the most expensive leaf script."""
+    leaves = [field for field in psbt_in.unknown_fields if field.key_type == PSBT_IN_TAP_LEAF_SCRIPT]
+    key_sigs = [field for field in psbt_in.unknown_fields if field.key_type == PSBT_IN_TAP_KEY_SIG]
+    if key_sigs or not leaves:
+        return [len(key_sigs[0].value) if key_sigs else MAX_SCHNORR_SIG_SIZE]
+
+    worst = None
+    for leaf in leaves:
+        control_block = leaf.key_data
+        leaf_script = leaf.value[:-1]  # the last byte is the leaf version
+        sig_ops = count_signature_ops(leaf_script)
+        if sig_ops is None:
+            return None
+        items = [MAX_SCHNORR_SIG_SIZE] * max(sig_ops, 1) + [len(leaf_script), len(control_block)]
+        if worst is None or witness_size(items) > witness_size(worst):
+            worst = items
+    return worst
+
+def estimate_input(psbt_in, utxo):
+    """
+    Returns (weight, has_witness, source) for a single input. source is "exact"
+    when the PSBT has the final scriptSig/witness, "computed" when the spend was
+    reconstructed from the scripts in the PSBT using worst-case signature sizes,
+    and "estimated" when only a fixed per-type estimate was possible.
+    """
+    final_witness = psbt_in.final_script_witness
+    final_items = [len(item) for item in final_witness.stack] if final_witness is not None and len(final_witness.stack) else None
+    if psbt_in.final_script_sig or final_items:
+        return (input_weight(len(psbt_in.final_script_sig), final_items), final_items is not None, "exact")
+
+    script_type = script_classifier.classify_script(utxo.scriptPubKey) if utxo is not None else 'unknown'
+
+    if script_type == 'pubkeyhash':
+        script_sig = sum(push_size(size) for size in signature_sizes(psbt_in, 1) + [COMPRESSED_PUBKEY_SIZE])
+        return (input_weight(script_sig), False, "computed")
+
+    if script_type == 'witness_v0_keyhash':
+        return (input_weight(0, signature_sizes(psbt_in, 1) + [COMPRESSED_PUBKEY_SIZE]), True, "computed")
+
+    if script_type == 'witness_v0_scripthash' and psbt_in.witness_script:
+        items, known = script_satisfaction(psbt_in, psbt_in.witness_script)
+        return (input_weight(0, items + [len(psbt_in.witness_script)]), True, "computed" if known else "estimated")
+
+    if script_type == 'scripthash' and psbt_in.redeem_script:
+        redeem = psbt_in.redeem_script
+        redeem_type = script_classifier.classify_script(redeem)
+        if redeem_type == 'witness_v0_keyhash':
+            return (input_weight(push_size(len(redeem)), signature_sizes(psbt_in, 1) + [COMPRESSED_PUBKEY_SIZE]), True, "computed")
+        if redeem_type == 'witness_v0_scripthash' and psbt_in.witness_script:
+            items, known = script_satisfaction(psbt_in, psbt_in.witness_script)
+            return (input_weight(push_size(len(redeem)), items + [len(psbt_in.witness_script)]), True, "computed" if known else "estimated")
+        items, known = script_satisfaction(psbt_in, redeem)
+        # Empty items are pushed with a single OP_0
+        script_sig = sum(push_size(size) if size else 1 for size in items) + push_size(len(redeem))
+        return (input_weight(script_sig), False, "computed" if known else "estimated")
+
+    if script_type == 'witness_v1_taproot':
+        items = taproot_witness(psbt_in)
+        if items is not None:
+            return (input_weight(0, items), True, "computed")
+
+    # Not enough data in the PSBT, fall back to the fixed per-type estimate
+    has_witness = script_type in ('witness_v0_keyhash', 'witness_v0_scripthash', 'witness_v1_taproot')
+    return (script_classifier.input_vbytes(script_type) * WITNESS_SCALE_FACTOR, has_witness, "estimated")
+
+def compute_psbt_weight(psbt_obj):
+    """
+    Computes the BIP141 weight of the transaction a PSBT will produce in a
+    single pass over its inputs and outputs, without serializing it.
+    Returns the total weight, the vsize and the weight and source of every input.
+    """
+    tx = psbt_obj.unsigned_tx
+    inputs = []
+    witness_inputs = 0
+    total = (4 + 4 + varint_size(len(tx.vin)) + varint_size(len(tx.vout))) * WITNESS_SCALE_FACTOR  # version, locktime, counts
+    for i, txin in enumerate(tx.vin):
+        psbt_in = psbt_obj.inputs[i]
+        if psbt_in.witness_utxo:
+            utxo = psbt_in.witness_utxo
+        elif psbt_in.non_witness_utxo:
+            utxo = psbt_in.non_witness_utxo.vout[txin.prevout.n]
+        else:
+            utxo = None
+        weight, has_witness, source = estimate_input(psbt_in, utxo)
+        witness_inputs += has_witness
+        inputs.append({"weight": weight, "source": source})
+        total += weight
+
+    for txout in tx.vout:
+        total += output_weight(len(txout.scriptPubKey))
+
+    if witness_inputs:
+        # Segwit marker and flag, plus an empty witness for every non-witness input
+        total += 2 + (len(tx.vin) - witness_inputs)
+
+    vsize = (total + WITNESS_SCALE_FACTOR - 1) // WITNESS_SCALE_FACTOR
+    return {"weight": total, "vsize": vsize, "inputs": inputs}